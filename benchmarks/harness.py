@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Runs the benchmarks and compares them with stored baselines.
+
+Each benchmark is run once to warm caches and then a number of times while being measured.
+The queries of the last run are counted, not including savepoints, and the median wall
+time is taken. Memory is the growth in the peak resident size of the process over the
+measured runs. It is reported, but as the peak only ever grows it is too coarse to fail on.
+
+A benchmark fails if it issues more queries than its baseline, or if its median time is
+more than the threshold times its baseline.
+"""
+from __future__ import unicode_literals
+import json
+import resource
+import time
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class BenchmarkResult(object):
+    """
+    The measurements of a benchmark.
+    """
+    def __init__(self, name, queries, seconds, memory_kb):
+        """
+        :type name: unicode
+        :type queries: int
+        :type seconds: float
+        :type memory_kb: int
+        """
+        super(BenchmarkResult, self).__init__()
+        self.name = name
+        self.queries = queries
+        self.seconds = seconds
+        self.memory_kb = memory_kb
+
+    def as_baseline(self):
+        """
+        :rtype: {}
+        """
+        return {'queries': self.queries, 'seconds': round(self.seconds, 4)}
+
+    def __unicode__(self):
+        return '{0}: {1} queries, {2:.1f}ms, {3}KB'.format(
+            self.name, self.queries, self.seconds * 1000, self.memory_kb
+        )
+
+
+class BenchmarkSuite(object):
+    """
+    A registry of benchmarks. A benchmark is a function taking a test client logged in as the
+    world's user and the SeededWorld.
+    """
+    def __init__(self):
+        super(BenchmarkSuite, self).__init__()
+        self.benchmarks = []
+
+    def register(self, name):
+        """
+        Decorator that adds a function to the suite.
+
+        :type name: unicode
+        """
+        def decorator(func):
+            self.benchmarks.append((name, func))
+            return func
+        return decorator
+
+    def run(self, client, world, repeats=5, names=None):
+        """
+        Runs the benchmarks.
+
+        :type client: Client
+        :type world: SeededWorld
+        :type repeats: int
+        :param names: Only run the benchmarks with these names
+        :type names: list[unicode]
+        :rtype: list[BenchmarkResult]
+        """
+        results = []
+        for name, func in self.benchmarks:
+            if names and name not in names:
+                continue
+            results.append(self.measure(name, func, client, world, repeats))
+        return results
+
+    @staticmethod
+    def measure(name, func, client, world, repeats):
+        """
+        Warms and measures a single benchmark.
+
+        :rtype: BenchmarkResult
+        """
+        func(client, world)
+        timings = []
+        peak_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        for i in range(repeats):
+            with CaptureQueriesContext(connection) as context:
+                started = time.time()
+                func(client, world)
+                timings.append(time.time() - started)
+        peak_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        queries = [query for query in context.captured_queries if 'SAVEPOINT' not in query['sql']]
+        timings.sort()
+        return BenchmarkResult(name, len(queries), timings[len(timings) // 2], peak_after - peak_before)
+
+
+def load_baselines(path, scale_name):
+    """
+    Returns the baselines stored for a scale, by benchmark name.
+
+    :type path: unicode
+    :type scale_name: unicode
+    :rtype: {}
+    """
+    try:
+        with open(path) as baseline_file:
+            return json.load(baseline_file).get(scale_name, {})
+    except IOError:
+        return {}
+
+
+def save_baselines(path, scale_name, results):
+    """
+    Stores the results as the baselines for a scale, keeping those of other scales.
+
+    :type path: unicode
+    :type scale_name: unicode
+    :type results: list[BenchmarkResult]
+    """
+    try:
+        with open(path) as baseline_file:
+            baselines = json.load(baseline_file)
+    except IOError:
+        baselines = {}
+    baselines[scale_name] = dict((result.name, result.as_baseline()) for result in results)
+    with open(path, 'w') as baseline_file:
+        json.dump(baselines, baseline_file, indent=4, separators=(',', ': '), sort_keys=True)
+        baseline_file.write('\n')
+
+
+def find_regressions(results, baselines, threshold):
+    """
+    Compares the results with the baselines. Benchmarks without a baseline are not compared.
+
+    :type results: list[BenchmarkResult]
+    :type baselines: {}
+    :param threshold: How many times slower than its baseline a benchmark may be
+    :type threshold: float
+    :return: A description of each regression
+    :rtype: list[unicode]
+    """
+    regressions = []
+    for result in results:
+        baseline = baselines.get(result.name)
+        if baseline is None:
+            continue
+        if result.queries > baseline['queries']:
+            regressions.append('{0} issued {1} queries, the baseline is {2}.'.format(
+                result.name, result.queries, baseline['queries']
+            ))
+        if result.seconds > baseline['seconds'] * threshold:
+            regressions.append('{0} took {1:.1f}ms, the baseline is {2:.1f}ms.'.format(
+                result.name, result.seconds * 1000, baseline['seconds'] * 1000
+            ))
+    return regressions
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Seeds a test database and runs the view benchmarks against it, failing if any have regressed
+from their baselines.
+"""
+import os
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from benchmarks.harness import find_regressions, load_baselines, save_baselines
+from benchmarks.seed import SCALES, WorldSeeder
+from benchmarks.suite import suite
+from tasks import app
+
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'baselines.json')
+
+
+class Command(BaseCommand):
+    """
+    Runs the benchmarks.
+    """
+    help = 'Runs the view benchmarks against a seeded test database and compares them with the baselines.'
+    args = '[benchmark ...]'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--scale',
+            dest='scale',
+            default='full',
+            choices=sorted(SCALES),
+            help='The size of the world to seed. Defaults to full.',
+        ),
+        make_option(
+            '--repeats',
+            dest='repeats',
+            type='int',
+            default=5,
+            help='How many measured runs of each benchmark to take the median of.',
+        ),
+        make_option(
+            '--threshold',
+            dest='threshold',
+            type='float',
+            default=1.5,
+            help='How many times slower than its baseline a benchmark may be before it fails.',
+        ),
+        make_option(
+            '--update-baselines',
+            action='store_true',
+            dest='update_baselines',
+            default=False,
+            help='Store the results as the new baselines instead of comparing with them.',
+        ),
+    )
+
+    def handle(self, *args, **options):
+        """
+        :type args: []
+        :type options: {}
+        """
+        setup_test_environment()
+        eager = app.conf.CELERY_ALWAYS_EAGER
+        app.conf.CELERY_ALWAYS_EAGER = True
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = self.run_suite(options, list(args))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            app.conf.CELERY_ALWAYS_EAGER = eager
+            teardown_test_environment()
+
+        for result in results:
+            self.stdout.write(unicode(result))
+        if options['update_baselines']:
+            save_baselines(BASELINES_PATH, options['scale'], results)
+            self.stdout.write('Baselines updated.')
+            return
+        regressions = find_regressions(results, load_baselines(BASELINES_PATH, options['scale']), options['threshold'])
+        for regression in regressions:
+            self.stderr.write(regression)
+        if regressions:
+            raise CommandError('{0} benchmarks regressed.'.format(len(regressions)))
+
+    @staticmethod
+    def run_suite(options, names):
+        """
+        Seeds the world and runs the benchmarks.
+
+        :type options: {}
+        :type names: list[unicode]
+        :rtype: list[BenchmarkResult]
+        """
+        world = WorldSeeder(SCALES[options['scale']]).seed()
+        client = Client()
+        if not client.login(username=world.user.email, password=world.password):
+            raise CommandError('Could not log in as the benchmark user.')
+        return suite.run(client, world, repeats=options['repeats'], names=names)
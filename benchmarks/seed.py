@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Seeds a database with a world of the size the benchmarks run against.
+
+Rows are created with bulk_create wherever possible, so signals do not fire. The state
+they would have maintained is rebuilt afterwards with the same methods the rebuild
+management commands use.
+"""
+from __future__ import unicode_literals
+import random
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from characters.models import Character, CharacterProfile
+from quests.models import Post, PostNotification, Quest, QuestCharacter, QuestLocation, QuestProfile
+from search.index import search_index
+from world.gazetteer import gazetteer
+from world.models import Continent, Location, LocationActivity, Race
+
+
+class Scale(object):
+    """
+    How much of everything to create.
+    """
+    def __init__(self, users, continents, locations_per_continent, quests, characters_per_quest, posts_per_quest,
+                 followers_per_quest, message_threads, messages_per_thread):
+        super(Scale, self).__init__()
+        self.users = users
+        self.continents = continents
+        self.locations_per_continent = locations_per_continent
+        self.quests = quests
+        self.characters_per_quest = characters_per_quest
+        self.posts_per_quest = posts_per_quest
+        self.followers_per_quest = followers_per_quest
+        self.message_threads = message_threads
+        self.messages_per_thread = messages_per_thread
+
+
+SCALES = {
+    'small': Scale(
+        users=50, continents=2, locations_per_continent=3, quests=5, characters_per_quest=3, posts_per_quest=30,
+        followers_per_quest=5, message_threads=10, messages_per_thread=2,
+    ),
+    'full': Scale(
+        users=2000, continents=5, locations_per_continent=8, quests=200, characters_per_quest=5, posts_per_quest=20,
+        followers_per_quest=20, message_threads=500, messages_per_thread=3,
+    ),
+}
+
+
+class SeededWorld(object):
+    """
+    The objects the benchmarks act on.
+    """
+    def __init__(self, user, password, quest, location, posting_character):
+        """
+        :param user: The user the benchmarks are logged in as
+        :type user: RpgUser
+        :type password: unicode
+        :param quest: A quest the user is GM of, with their character on it
+        :type quest: Quest
+        :param location: A location with quests at it
+        :type location: Location
+        :param posting_character: The user's character on the quest
+        :type posting_character: Character
+        """
+        super(SeededWorld, self).__init__()
+        self.user = user
+        self.password = password
+        self.quest = quest
+        self.location = location
+        self.posting_character = posting_character
+
+
+class WorldSeeder(object):
+    """
+    Creates a world of the given scale. The same seed always creates the same world.
+    """
+    password = 'benchmark'
+    batch_size = 500
+
+    def __init__(self, scale, seed=0):
+        """
+        :type scale: Scale
+        :type seed: int
+        """
+        super(WorldSeeder, self).__init__()
+        self.scale = scale
+        self.random = random.Random(seed)
+
+    def seed(self):
+        """
+        :rtype: SeededWorld
+        """
+        locations, races = self.create_world()
+        users = self.create_users()
+        characters = self.create_characters(users, locations, races)
+        quests = self.create_quests(users, locations, characters)
+        self.create_posts(quests)
+        self.create_followers(users, quests)
+        self.create_messages(users)
+        LocationActivity.objects.rebuild()
+        search_index.reindex(full=True)
+        user = users[0]
+        quest = quests[0]
+        return SeededWorld(
+            user=user,
+            password=self.password,
+            quest=quest,
+            location=quest.current_location,
+            posting_character=Character.objects.get(character_profile__user=user, current_quest=quest),
+        )
+
+    def create_world(self):
+        """
+        :rtype: (list[Location], list[Race])
+        """
+        Race.objects.bulk_create([
+            Race(name='Benchmark Race {0}'.format(i), slug='benchmark-race-{0}'.format(i), description='Race')
+            for i in range(3)
+        ])
+        Continent.objects.bulk_create([
+            Continent(name='Benchmark Continent {0}'.format(i), slug='benchmark-continent-{0}'.format(i),
+                      description='Continent')
+            for i in range(self.scale.continents)
+        ])
+        continents = list(Continent.objects.filter(slug__startswith='benchmark-continent-'))
+        Location.objects.bulk_create([
+            Location(
+                name='Benchmark Location {0} {1}'.format(continent.pk, i),
+                slug='benchmark-location-{0}-{1}'.format(continent.pk, i),
+                description='Location',
+                continent=continent,
+            )
+            for continent in continents for i in range(self.scale.locations_per_continent)
+        ])
+        gazetteer.invalidate()
+        return (
+            list(Location.objects.filter(slug__startswith='benchmark-location-')),
+            list(Race.objects.filter(slug__startswith='benchmark-race-')),
+        )
+
+    def create_users(self):
+        """
+        Creates the users. Only the first can log in, as hashing every password is slow.
+
+        :rtype: list[RpgUser]
+        """
+        user_model = get_user_model()
+        users = [
+            user_model(pen_name='Benchmark {0}'.format(i), email='benchmark{0}@example.com'.format(i), is_active=True)
+            for i in range(self.scale.users)
+        ]
+        for user in users:
+            user.set_unusable_password()
+        users[0].password = make_password(self.password)
+        user_model.objects.bulk_create_users(users, batch_size=self.batch_size)
+        users = list(user_model.objects.filter(email__startswith='benchmark').order_by('pk'))
+        CharacterProfile.objects.filter(user=users[0]).update(slots=2)
+        return users
+
+    def create_characters(self, users, locations, races):
+        """
+        Creates a character for each user, and a spare for the first so they have one available.
+
+        :rtype: list[Character]
+        """
+        profiles = dict(CharacterProfile.objects.values_list('user_id', 'pk'))
+        owners = users + users[:1]
+        Character.objects.bulk_create([
+            Character(
+                name='Benchmark Character {0}'.format(i),
+                character_profile_id=profiles[user.pk],
+                home_town=self.random.choice(locations),
+                race=self.random.choice(races),
+                physical_description='Tall',
+                personality='Brave',
+                skills='Swords',
+                full_biography='Born in a village.',
+            )
+            for i, user in enumerate(owners)
+        ], batch_size=self.batch_size)
+        return list(Character.objects.filter(name__startswith='Benchmark Character ').order_by('pk'))
+
+    def create_quests(self, users, locations, characters):
+        """
+        Creates the quests with their locations and characters. The first user is GM of the
+        first quest, and their first character is on it.
+
+        :rtype: list[Quest]
+        """
+        quest_profiles = dict(QuestProfile.objects.values_list('user_id', 'pk'))
+        Quest.objects.bulk_create([
+            Quest(
+                title='Benchmark Quest {0}'.format(i),
+                name='Benchmark Quest {0}'.format(i),
+                slug='benchmark-quest-{0}'.format(i),
+                description='A quest',
+                gm_id=quest_profiles[users[i % len(users)].pk],
+            )
+            for i in range(self.scale.quests)
+        ], batch_size=self.batch_size)
+        quests = list(Quest.objects.filter(slug__startswith='benchmark-quest-').order_by('pk'))
+        QuestLocation.objects.bulk_create([
+            QuestLocation(quest=quest, location=self.random.choice(locations)) for quest in quests
+        ], batch_size=self.batch_size)
+        pool = iter(characters[:len(users)])
+        QuestCharacter.objects.bulk_create([
+            QuestCharacter(quest=quest, character=character)
+            for quest in quests for character in [next(pool, None) for i in range(self.scale.characters_per_quest)]
+            if character is not None
+        ], batch_size=self.batch_size)
+        Quest.objects.rebuild_current_state()
+        return list(Quest.objects.filter(pk__in=[quest.pk for quest in quests]).select_related('current_location'))
+
+    def create_posts(self, quests):
+        """
+        Creates the posts on each quest by the characters on it.
+        """
+        rosters = {}
+        for character in Character.objects.filter(current_quest__isnull=False):
+            rosters.setdefault(character.current_quest_id, []).append(character)
+        posts = []
+        for quest in quests:
+            for i in range(self.scale.posts_per_quest):
+                posts.append(Post(
+                    quest=quest,
+                    character=self.random.choice(rosters[quest.pk]),
+                    location=quest.current_location,
+                    content='Post {0} on {1}. The party travels on.'.format(i, quest.title),
+                ))
+        Post.objects.bulk_create(posts, batch_size=self.batch_size)
+
+    def create_followers(self, users, quests):
+        """
+        Has users follow each quest and notifies them of its latest post.
+        """
+        through = QuestProfile.following_quests.through
+        quest_profiles = dict(QuestProfile.objects.values_list('user_id', 'pk'))
+        follows = set()
+        for quest in quests:
+            follows.add((quest_profiles[users[0].pk], quest.pk))
+            for user in self.random.sample(users, min(self.scale.followers_per_quest, len(users))):
+                follows.add((quest_profiles[user.pk], quest.pk))
+        through.objects.bulk_create([
+            through(questprofile_id=profile_pk, quest_id=quest_pk) for profile_pk, quest_pk in sorted(follows)
+        ], batch_size=self.batch_size)
+        for quest in quests:
+            PostNotification.objects.notify_followers(quest.posts.order_by('-pk')[0])
+
+    def create_messages(self, users):
+        """
+        Creates message threads, a tenth of them with the first user.
+        """
+        for i in range(self.scale.message_threads):
+            sender = users[0] if i % 10 == 0 else self.random.choice(users)
+            receiver = self.random.choice([user for user in users[1:20] if user != sender])
+            for j in range(self.scale.messages_per_thread):
+                sender.message_profile.send_message(message_profile=receiver.message_profile, message='Hello')
+                sender, receiver = receiver, sender
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of the views players use most.
+"""
+from __future__ import unicode_literals
+from django.core.urlresolvers import reverse
+from benchmarks.harness import BenchmarkSuite
+
+
+suite = BenchmarkSuite()
+
+
+def assert_status(response, status_code=200):
+    """
+    Fails the benchmark if a view did not respond as expected, so a broken view cannot look fast.
+
+    :type response: HttpResponse
+    :type status_code: int
+    """
+    if response.status_code != status_code:
+        raise AssertionError('Expected status {0}, got {1}'.format(status_code, response.status_code))
+
+
+@suite.register('quest_detail')
+def quest_detail(client, world):
+    """
+    Loads the page of a quest with a seeded timeline.
+
+    :type client: Client
+    :type world: SeededWorld
+    """
+    assert_status(client.get(reverse('quests:quest_detail', kwargs={'slug': world.quest.slug})))
+
+
+@suite.register('quest_detail_not_modified')
+def quest_detail_not_modified(client, world):
+    """
+    Reloads the quest page with the ETag of an earlier response, which should be a 304.
+
+    :type client: Client
+    :type world: SeededWorld
+    """
+    url = reverse('quests:quest_detail', kwargs={'slug': world.quest.slug})
+    if not hasattr(world, 'quest_etag'):
+        world.quest_etag = client.get(url)['ETag']
+    assert_status(client.get(url, HTTP_IF_NONE_MATCH=world.quest_etag), 304)
+
+
+@suite.register('post_create')
+def post_create(client, world):
+    """
+    Posts to the quest as the user's character on it.
+
+    :type client: Client
+    :type world: SeededWorld
+    """
+    assert_status(client.post(
+        reverse('quests:create_post', kwargs={'quest_slug': world.quest.slug}),
+        {'character': world.posting_character.pk, 'content': 'The party rests.'},
+    ), 302)
+
+
+@suite.register('select_location')
+def select_location(client, world):
+    """
+    Loads the list of locations a quest can start in.
+
+    :type client: Client
+    :type world: SeededWorld
+    """
+    assert_status(client.get(reverse('quests:select_location')))
+
+
+@suite.register('select_character')
+def select_character(client, world):
+    """
+    Loads the user's characters that can start a quest at a location.
+
+    :type client: Client
+    :type world: SeededWorld
+    """
+    assert_status(client.get(reverse('quests:select_character', kwargs={'location_slug': world.location.slug})))
+
+
+@suite.register('inbox')
+def inbox(client, world):
+    """
+    Reads the first page of the user's message threads, without a request.
+
+    :type client: Client
+    :type world: SeededWorld
+    """
+    del client
+    world.user.message_profile.get_message_thread_page()
+
+
+@suite.register('notification_list')
+def notification_list(client, world):
+    """
+    Loads the notification list from the API.
+
+    :type client: Client
+    :type world: SeededWorld
+    """
+    assert_status(client.get('/api/notifications/'))
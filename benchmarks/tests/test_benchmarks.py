@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Runs the benchmarks on the small world and checks none issue more queries than their baselines.
+Timings are not checked here, as they depend on the machine running the tests.
+"""
+from django.test import TestCase
+from benchmarks.harness import BenchmarkResult, find_regressions, load_baselines
+from benchmarks.management.commands.run_benchmarks import BASELINES_PATH
+from benchmarks.seed import SCALES, WorldSeeder
+from benchmarks.suite import suite
+
+
+class BenchmarkTestCase(TestCase):
+    """
+    Tests the benchmark suite.
+    """
+    def setUp(self):
+        super(BenchmarkTestCase, self).setUp()
+        self.world = WorldSeeder(SCALES['small']).seed()
+        self.assertTrue(self.client.login(username=self.world.user.email, password=self.world.password))
+
+    def test_query_counts_do_not_exceed_baselines(self):
+        """
+        Every benchmark has a baseline and none issue more queries than it.
+        """
+        baselines = load_baselines(BASELINES_PATH, 'small')
+        results = suite.run(self.client, self.world, repeats=1)
+        self.assertEquals(set(result.name for result in results), set(baselines))
+        self.assertEquals(find_regressions(results, baselines, threshold=float('inf')), [])
+
+    def test_regressions_are_reported(self):
+        """
+        Extra queries, or a time over the threshold, are reported as regressions.
+        """
+        baselines = {'quest_detail': {'queries': 5, 'seconds': 0.01}}
+        self.assertEquals(find_regressions([BenchmarkResult('quest_detail', 5, 0.014, 0)], baselines, 1.5), [])
+        self.assertEquals(len(find_regressions([BenchmarkResult('quest_detail', 6, 0.016, 0)], baselines, 1.5)), 2)
@@ -1,3 +1,3 @@
 #!/bin/bash
 export DJANGO_SETTINGS_MODULE=soj.settings_development
-celery -A tasks worker --loglevel=info
+celery -A tasks worker --beat --loglevel=info
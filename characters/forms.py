@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Forms for creating characters.
+"""
+from django import forms
+from characters.models import Character
+from world.forms import GazetteerChoiceField
+from world.gazetteer import gazetteer
+from world.models import Location, Race
+
+
+class CharacterCreateForm(forms.ModelForm):
+    """
+    Form used to create a character. The home town and race choices come from the gazetteer.
+    """
+    home_town = GazetteerChoiceField(Location.objects.all(), lambda: gazetteer.locations)
+    race = GazetteerChoiceField(Race.objects.all(), lambda: gazetteer.races)
+
+    class Meta(object):
+        """
+        Meta properties
+        """
+        fields = ['name', 'home_town', 'race', 'physical_description', 'personality', 'skills', 'full_biography']
+        model = Character
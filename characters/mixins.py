@@ -3,8 +3,8 @@
 Mixins that can be used for classes that need some default character behaviour.
 """
 from __future__ import unicode_literals
-from django.shortcuts import get_object_or_404
 from characters.models import Character
+from soj.request_cache import RequestObjectCache
 
 
 class CharacterFromRequestMixin(object):
@@ -13,7 +13,7 @@ class CharacterFromRequestMixin(object):
 
     If the character is invalid then a 404 is raised.
     """
-    character_queryset = Character.objects.all()
+    character_queryset = Character.objects.select_related('race', 'home_town')
 
     def __init__(self):
         super(CharacterFromRequestMixin, self).__init__()
@@ -38,9 +38,11 @@ class CharacterFromRequestMixin(object):
 
     def get_character(self):
         """
-        Gets the location based on the location_slug.
+        Gets the character based on the character_pk. The character is only loaded once per request.
         """
-        return get_object_or_404(self.get_character_queryset(), pk=self.character_pk)
+        return RequestObjectCache.for_request(self.request).get(
+            'character', self.get_character_queryset(), pk=self.character_pk
+        )
 
     def get_context_data(self, **kwargs):
         """
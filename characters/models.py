@@ -3,11 +3,10 @@
 Characters are owned by users and participate within the game.
 """
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
-from django.db.models import Q, QuerySet
-from django.db.models.signals import post_save
+from django.db.models import QuerySet
 from model_utils.managers import PassThroughManager
+from rpg_auth.provisioning import profile_provisioner
 from world.models import Race, Location
 
 
@@ -48,20 +47,10 @@ class CharacterProfile(models.Model):
         """
         Returns True if the user has available characters.
         """
-        return self.available_characters.count() > 0
+        return self.available_characters.exists()
 
 
-def create_character_profile(sender, **kwargs):
-    """
-    Catches users being created and creates a character profile for the user.
-
-    :type sender: RpgUser
-    :type kwargs: {}
-    """
-    del sender
-    if kwargs['created']:
-        CharacterProfile.objects.create(user=kwargs['instance'])
-post_save.connect(create_character_profile, sender=settings.AUTH_USER_MODEL)
+profile_provisioner.register(CharacterProfile)
 
 
 class CharacterManager(QuerySet):
@@ -72,7 +61,7 @@ class CharacterManager(QuerySet):
         """
         Filters characters currently on a quest.
         """
-        return self.filter(questcharacter__date_departed__isnull=True)
+        return self.filter(current_quest__isnull=False)
 
     def filter_departed(self):
         """
@@ -82,11 +71,10 @@ class CharacterManager(QuerySet):
 
     def filter_available(self):
         """
-        Returns characters not currently on a quest.
+        Returns characters not currently on a quest. The current quest is stored on the
+        character, so this does not need to join the quest history.
         """
-        return self.filter(
-            Q(questcharacter__date_departed__isnull=False) | Q(questcharacter__isnull=True)
-        )
+        return self.filter(current_quest__isnull=True)
 
     def filter_by_character_profile(self, character_profile):
         """
@@ -110,19 +98,11 @@ class Character(models.Model):
     full_biography = models.TextField(blank=True, null=True)
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
+    current_quest = models.ForeignKey(
+        'quests.Quest', null=True, blank=True, related_name='active_characters', on_delete=models.SET_NULL
+    )
 
     objects = PassThroughManager.for_queryset_class(CharacterManager)()
 
     def __unicode__(self):
         return self.name
-
-    @property
-    def current_quest(self):
-        """
-        Returns the characters current quest
-        :return: Quest
-        """
-        try:
-            return self.quests.get_current_quest()
-        except ObjectDoesNotExist:
-            return None
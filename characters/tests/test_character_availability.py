@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Tests which characters are available to join quests.
+"""
+from django.core.urlresolvers import reverse
+from mock import patch
+from characters.models import Character
+from characters.tests.utils import CharacterUtils
+from quests.models import CharacterUnavailable, Quest
+from rpg_auth.tests.utils import CreateUserMixin
+from world.models import Location
+
+
+class CharacterAvailabilityTestCase(CreateUserMixin):
+    """
+    Tests character availability.
+    """
+    fixtures = ['world-test-data.json']
+
+    def setUp(self):
+        super(CharacterAvailabilityTestCase, self).setUp()
+        self.character = CharacterUtils.create_character(self.user)
+        self.quest1 = Quest.objects.create(title=u'Quest 1', gm=self.user.quest_profile)
+        self.quest2 = Quest.objects.create(title=u'Quest 2', gm=self.user.quest_profile)
+
+    def test_departed_character_on_another_quest_is_not_available(self):
+        """
+        A character that left one quest and joined another is not available.
+        """
+        self.quest1.add_character(self.character)
+        self.quest1.remove_character(self.character)
+        self.quest2.add_character(self.character)
+        self.assertEquals(list(Character.objects.filter_available()), [])
+        self.assertEquals(list(Character.objects.filter_active()), [self.character])
+
+    def test_characters_that_left_many_quests_are_listed_once(self):
+        """
+        Leaving several quests does not list the character more than once.
+        """
+        for quest in (self.quest1, self.quest2):
+            quest.add_character(self.character)
+            quest.remove_character(self.character)
+        self.assertEquals(list(self.user.character_profile.available_characters), [self.character])
+
+    def test_has_available_characters_is_one_query(self):
+        """
+        Checking for available characters is a single query.
+        """
+        profile = self.user.character_profile
+        with self.assertNumQueries(1):
+            self.assertTrue(profile.has_available_characters)
+
+    def test_character_cannot_join_two_quests(self):
+        """
+        A character on a quest cannot be added to another, even through a stale instance.
+        """
+        stale = Character.objects.get(pk=self.character.pk)
+        self.quest1.add_character(self.character)
+        self.assertRaises(CharacterUnavailable, self.quest2.add_character, stale)
+        self.assertEquals(Character.objects.get(pk=self.character.pk).current_quest, self.quest1)
+        self.assertEquals(self.quest2.questcharacter_set.count(), 0)
+
+    def test_failed_initialise_is_rolled_back(self):
+        """
+        If the first character is unavailable the quest is not created.
+        """
+        self.quest1.add_character(self.character)
+        quest = Quest(title=u'Quest 3')
+        self.assertRaises(
+            CharacterUnavailable,
+            quest.initialise,
+            gm=self.user.quest_profile,
+            first_post=u'First post',
+            location=Location.objects.get(pk=1),
+            character=self.character,
+        )
+        self.assertFalse(Quest.objects.filter(title=u'Quest 3').exists())
+
+    @patch('quests.views.QuestCreateView.get_character_queryset')
+    def test_creating_quest_with_unavailable_character_shows_error(self, patched_get_character_queryset):
+        """
+        If the character joins another quest before the form is submitted, an error is shown.
+        """
+        patched_get_character_queryset.return_value = Character.objects.all()
+        location = Location.objects.get(pk=1)
+        self.quest1.add_character(self.character)
+        response = self.client.post(
+            reverse(
+                'quests:create_quest', kwargs={'location_slug': location.slug, 'character_pk': self.character.pk}
+            ),
+            data={'title': u'Title', 'description': u'Description', 'first_post': u'First post'},
+        )
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response.context['form'].non_field_errors())
+        self.assertFalse(Quest.objects.filter(title=u'Title').exists())
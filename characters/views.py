@@ -8,6 +8,7 @@ from django.core.urlresolvers import reverse
 from django.http import Http404
 from django.utils.functional import lazy
 from django.views.generic import CreateView, ListView
+from characters.forms import CharacterCreateForm
 from characters.models import Character
 
 
@@ -28,7 +29,7 @@ class CharacterCreateView(LoginRequiredMixin, CreateView):
     Character creation form.
     """
     model = Character
-    fields = ['name', 'home_town', 'race', 'physical_description', 'personality', 'skills', 'full_biography']
+    form_class = CharacterCreateForm
     success_url = lazy(reverse, str)('characters:dashboard')
 
     def __init__(self):
@@ -4,6 +4,51 @@ Adds unseen notifications to the context.
 """
 
 
+class LazyUnseenNotifications(object):
+    """
+    Stands in for a user's unseen notifications in the context.
+
+    Its length comes from the cached unseen count, so showing a badge does not query the
+    notifications. They are only loaded if a template iterates over them.
+    """
+    def __init__(self, notification_profile):
+        """
+        :type notification_profile: NotificationProfile
+        """
+        super(LazyUnseenNotifications, self).__init__()
+        self.notification_profile = notification_profile
+        self._notifications = None
+
+    @property
+    def count(self):
+        """
+        The number of unseen notifications.
+        :rtype: int
+        """
+        return self.notification_profile.unseen_notification_count
+
+    @property
+    def notifications(self):
+        """
+        The unseen notifications, loaded the first time they are needed.
+        """
+        if self._notifications is None:
+            self._notifications = list(self.notification_profile.unseen_notifications)
+        return self._notifications
+
+    def __iter__(self):
+        return iter(self.notifications)
+
+    def __len__(self):
+        return self.count
+
+    def __nonzero__(self):
+        return self.count > 0
+
+    def __getitem__(self, item):
+        return self.notifications[item]
+
+
 def unseen_notifications(request):
     """
     Adds unseen notifications to the request.
@@ -11,6 +56,6 @@ def unseen_notifications(request):
     :return: {}
     """
     if request.user.is_authenticated():
-        return {'unseen_notifications': request.user.notification_profile.unseen_notifications}
+        return {'unseen_notifications': LazyUnseenNotifications(request.user.notification_profile)}
     else:
         return {'unseen_notifications': []}
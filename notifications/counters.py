@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Keeps a count of each user's unseen notifications in the cache so pages that only show a
+badge do not need to query the notifications.
+
+The count is incremented when a notification is sent and decremented when one is seen.
+Anything that changes notifications in bulk, or deletes an unseen notification, invalidates
+the count instead, and it is counted again from the database the next time it is asked for.
+
+The cache used is the one named by settings.NOTIFICATIONS_CACHE, which defaults to
+'default'. It must be shared by every process that sends or reads notifications, including
+Celery workers, or counts changed in one are not seen in the others. If that cache is not
+configured a local memory cache is used.
+"""
+from django.conf import settings
+from django.core.cache import caches, InvalidCacheBackendError
+from django.core.cache.backends.locmem import LocMemCache
+
+
+class UnseenNotificationCounter(object):
+    """
+    Cached count of unseen notifications per NotificationProfile.
+    """
+    key_template = 'notifications:unseen:{0}'
+    timeout = 60 * 60 * 24
+
+    def __init__(self, cache_alias=None):
+        """
+        :type cache_alias: unicode
+        """
+        super(UnseenNotificationCounter, self).__init__()
+        self.cache_alias = cache_alias
+        self._fallback_cache = None
+
+    @property
+    def cache(self):
+        """
+        The configured cache, or a local memory cache if it does not exist.
+        """
+        try:
+            return caches[self.cache_alias or getattr(settings, 'NOTIFICATIONS_CACHE', 'default')]
+        except InvalidCacheBackendError:
+            if self._fallback_cache is None:
+                self._fallback_cache = LocMemCache('notifications', {})
+            return self._fallback_cache
+
+    def get_key(self, notification_profile_pk):
+        """
+        :type notification_profile_pk: int
+        :rtype: unicode
+        """
+        return self.key_template.format(notification_profile_pk)
+
+    def get(self, notification_profile):
+        """
+        Returns the number of unseen notifications, counting them if they are not cached.
+
+        :type notification_profile: NotificationProfile
+        :rtype: int
+        """
+        key = self.get_key(notification_profile.pk)
+        count = self.cache.get(key)
+        if count is None:
+            count = notification_profile.notifications.filter_unseen().count()
+            self.cache.add(key, count, self.timeout)
+        return count
+
+    def increment(self, notification_profile_pk, delta=1):
+        """
+        Adds to the count if it is cached. If it is not it will be counted when next asked for.
+
+        :type notification_profile_pk: int
+        :type delta: int
+        """
+        key = self.get_key(notification_profile_pk)
+        try:
+            if self.cache.incr(key, delta) < 0:
+                self.cache.delete(key)
+        except ValueError:
+            pass
+
+    def decrement(self, notification_profile_pk, delta=1):
+        """
+        Takes from the count if it is cached.
+
+        :type notification_profile_pk: int
+        :type delta: int
+        """
+        self.increment(notification_profile_pk, -delta)
+
+    def invalidate(self, notification_profile_pks):
+        """
+        Forgets the count for each profile so it is counted again when next asked for.
+
+        :type notification_profile_pks: list[int]
+        """
+        self.cache.delete_many([self.get_key(pk) for pk in notification_profile_pks])
+
+
+unseen_notification_counter = UnseenNotificationCounter()
@@ -10,15 +10,20 @@ be sent as the first parameter of send_notification on NotificationProfile. The
 be any of the attributes on the sub-class.
 
 In order to control how notifications are displayed to users a notification should have a
-render method. The render method should user render_to_string if it is to return HTML.
+render method. The render method should use notifications.rendering.render_to_string if it is
+to return HTML. Any related objects the render method uses should be listed in
+render_prefetch_related so they can be loaded for a whole page of notifications at once.
 """
-from operator import methodcaller
 from django.conf import settings
 from django.core.urlresolvers import reverse
 from django.db import models
-from django.db.models.signals import post_save
+from django.db.models.query import prefetch_related_objects
+from django.db.models.signals import post_delete
 from django.utils import timezone
 from model_utils.managers import PassThroughManagerMixin, InheritanceQuerySetMixin, InheritanceManager
+from notifications.counters import unseen_notification_counter
+from notifications.pubsub import notification_broker
+from rpg_auth.provisioning import profile_provisioner
 
 
 class NotificationProfile(models.Model):
@@ -34,6 +39,14 @@ class NotificationProfile(models.Model):
         """
         return self.notifications.filter_unseen().select_subclasses()
 
+    @property
+    def unseen_notification_count(self):
+        """
+        Returns the number of unseen notifications, from the cache where possible.
+        :rtype: int
+        """
+        return unseen_notification_counter.get(self)
+
     def send_notification(self, notification_model, **kwargs):
         """
         Adds a notification to the notification profile.
@@ -44,17 +57,7 @@ class NotificationProfile(models.Model):
         return notification_model.objects.create(notification_profile=self, **kwargs)
 
 
-def create_notification_profile(sender, **kwargs):
-    """
-    Catches users being created and creates a notification profile for the user.
-
-    :type sender: RpgUser
-    :type kwargs: {}
-    """
-    del sender
-    if kwargs['created']:
-        NotificationProfile.objects.create(user=kwargs['instance'])
-post_save.connect(create_notification_profile, sender=settings.AUTH_USER_MODEL)
+profile_provisioner.register(NotificationProfile)
 
 
 class PassThroughInheritanceManager(PassThroughManagerMixin, InheritanceManager):
@@ -73,9 +76,18 @@ class NotificationQuerySet(InheritanceQuerySetMixin):
 
     def set_as_seen(self):
         """
-        Sets all Notifications as seen.
+        Sets all unseen Notifications in the queryset as seen with a single update. The cached
+        unseen counts of the profiles affected are invalidated.
+
+        :return: The number of notifications set as seen.
+        :rtype: int
         """
-        map(methodcaller('set_as_seen'), self.all())
+        unseen = self.filter(date_seen__isnull=True)
+        notification_profile_pks = list(unseen.order_by().values_list('notification_profile_id', flat=True).distinct())
+        count = unseen.update(date_seen=timezone.now())
+        unseen_notification_counter.invalidate(notification_profile_pks)
+        notification_broker.publish(notification_profile_pks)
+        return count
 
 
 class Notification(models.Model):
@@ -85,15 +97,37 @@ class Notification(models.Model):
     notification_profile = models.ForeignKey(NotificationProfile, related_name='notifications')
     date_created = models.DateTimeField(auto_now_add=True)
     date_seen = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Identifies the rows of a bulk insert while the rows of subclasses are inserted from them.
+    batch = models.CharField(max_length=32, null=True, blank=True, editable=False, db_index=True)
 
     objects = PassThroughInheritanceManager.for_queryset_class(NotificationQuerySet)()
 
+    render_prefetch_related = ()
+
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        """
+        Overrides the save method to count, and publish, new unseen notifications.
+        :type force_insert: bool
+        :type force_update: bool
+        :type using: Database
+        :type update_fields: [] | ()
+        """
+        created = self.pk is None
+        super(Notification, self).save(force_insert, force_update, using, update_fields)
+        if created and self.date_seen is None:
+            unseen_notification_counter.increment(self.notification_profile_id)
+            notification_broker.publish([self.notification_profile_id])
+
     def set_as_seen(self):
         """
         Sets the seen date as now.
         """
+        was_unseen = self.date_seen is None
         self.date_seen = timezone.now()
         self.save()
+        if was_unseen:
+            unseen_notification_counter.decrement(self.notification_profile_id)
+            notification_broker.publish([self.notification_profile_id])
 
     def render(self):
         """
@@ -102,6 +136,16 @@ class Notification(models.Model):
         """
         raise NotImplementedError('Notification must be sub-classed and you must implement a render method')
 
+    @classmethod
+    def prefetch_for_rendering(cls, notifications):
+        """
+        Loads the related objects listed in render_prefetch_related for all the notifications at once.
+
+        :type notifications: list[Notification]
+        """
+        if cls.render_prefetch_related:
+            prefetch_related_objects(notifications, cls.render_prefetch_related)
+
     def set_as_seen_url(self):
         """
         Returns the URL in the API to set the notification as seen.
@@ -121,3 +165,20 @@ class GenericNotification(Notification):
         :rtype: unicode
         """
         return self.text
+
+
+def invalidate_unseen_count(sender, **kwargs):
+    """
+    Catches unseen notifications being deleted, including those deleted with the post, quest or
+    message they are about, and invalidates the owner's cached count. Deleting a subclass also
+    deletes its Notification row, so this catches every kind of notification.
+
+    :type sender: Notification
+    :type kwargs: {}
+    """
+    del sender
+    notification = kwargs['instance']
+    if notification.date_seen is None:
+        unseen_notification_counter.invalidate([notification.notification_profile_id])
+        notification_broker.publish([notification.notification_profile_id])
+post_delete.connect(invalidate_unseen_count, sender=Notification)
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Tells waiting clients when a user's notifications change, so they do not need to poll the
+database to find out.
+
+Each notification profile has a version, which is bumped whenever a notification is sent to
+it, updated or seen. A client holds the version it last saw as its cursor and waits for it to
+change. Waiting never touches the database.
+
+The broker used is the one named by settings.NOTIFICATIONS_BROKER, CacheNotificationBroker by
+default. It keeps versions in the cache named by settings.NOTIFICATIONS_CACHE and wakes clients in
+any process sharing that cache, including changes published by Celery workers fanning out post
+notifications, so it refuses a local memory cache unless tasks run in process. LocalNotificationBroker only wakes clients waiting in the same process, so it can
+only be used with a single process server that runs its tasks in process.
+"""
+import threading
+import time
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from notifications.counters import unseen_notification_counter
+
+
+class BaseNotificationBroker(object):
+    """
+    Publishes changes to notification profiles and waits for them.
+    """
+    def publish(self, notification_profile_pks):
+        """
+        Bumps the version of each profile, waking clients waiting on them.
+
+        :type notification_profile_pks: list[int]
+        """
+        raise NotImplementedError()
+
+    def get_version(self, notification_profile_pk):
+        """
+        :type notification_profile_pk: int
+        :rtype: unicode
+        """
+        raise NotImplementedError()
+
+    def wait(self, notification_profile_pk, since, timeout):
+        """
+        Waits until the profile's version is not since, or the timeout passes.
+
+        :type notification_profile_pk: int
+        :param since: The version the client last saw
+        :type since: unicode
+        :type timeout: float
+        :return: The current version
+        :rtype: unicode
+        """
+        raise NotImplementedError()
+
+
+class LocalNotificationBroker(BaseNotificationBroker):
+    """
+    Keeps versions in memory and wakes waiting threads directly.
+
+    Versions bumped in other processes are never seen, so it refuses to be used unless Celery tasks run
+    in process. Each process must not be one of several serving the site either, as a cursor from one
+    process's versions would never match another's.
+    """
+    def __init__(self):
+        super(LocalNotificationBroker, self).__init__()
+        if not getattr(settings, 'CELERY_ALWAYS_EAGER', False):
+            raise ImproperlyConfigured(
+                'LocalNotificationBroker cannot see notifications sent by Celery workers. Use '
+                'notifications.pubsub.CacheNotificationBroker or set CELERY_ALWAYS_EAGER.'
+            )
+        self.condition = threading.Condition()
+        self.versions = {}
+
+    def publish(self, notification_profile_pks):
+        with self.condition:
+            for pk in notification_profile_pks:
+                self.versions[pk] = self.versions.get(pk, 0) + 1
+            self.condition.notify_all()
+
+    def get_version(self, notification_profile_pk):
+        return unicode(self.versions.get(notification_profile_pk, 0))
+
+    def wait(self, notification_profile_pk, since, timeout):
+        ends = time.time() + timeout
+        with self.condition:
+            while self.get_version(notification_profile_pk) == since and time.time() < ends:
+                self.condition.wait(ends - time.time())
+            return self.get_version(notification_profile_pk)
+
+
+class CacheNotificationBroker(BaseNotificationBroker):
+    """
+    Keeps versions in the cache. Waiting clients check the cache every poll_interval seconds.
+    """
+    key_template = 'notifications:version:{0}'
+    poll_interval = 0.5
+
+    def __init__(self):
+        super(CacheNotificationBroker, self).__init__()
+        if isinstance(self.cache, LocMemCache) and not getattr(settings, 'CELERY_ALWAYS_EAGER', False):
+            raise ImproperlyConfigured(
+                'CacheNotificationBroker cannot see notifications sent by Celery workers through a local memory '
+                'cache. Set NOTIFICATIONS_CACHE to a cache every process shares, or set CELERY_ALWAYS_EAGER.'
+            )
+
+    @property
+    def cache(self):
+        return unseen_notification_counter.cache
+
+    def get_key(self, notification_profile_pk):
+        """
+        :type notification_profile_pk: int
+        :rtype: unicode
+        """
+        return self.key_template.format(notification_profile_pk)
+
+    def publish(self, notification_profile_pks):
+        for pk in notification_profile_pks:
+            key = self.get_key(pk)
+            try:
+                self.cache.incr(key)
+            except ValueError:
+                if not self.cache.add(key, 1, None):
+                    self.cache.incr(key)
+
+    def get_version(self, notification_profile_pk):
+        return unicode(self.cache.get(self.get_key(notification_profile_pk), 0))
+
+    def wait(self, notification_profile_pk, since, timeout):
+        ends = time.time() + timeout
+        version = self.get_version(notification_profile_pk)
+        while version == since and time.time() < ends:
+            time.sleep(min(self.poll_interval, max(ends - time.time(), 0)))
+            version = self.get_version(notification_profile_pk)
+        return version
+
+
+class NotificationBrokerProxy(object):
+    """
+    Passes calls to the configured broker, creating it when first used.
+    """
+    def __init__(self):
+        super(NotificationBrokerProxy, self).__init__()
+        self.broker = None
+        self.broker_path = None
+
+    def get_broker(self):
+        """
+        :rtype: BaseNotificationBroker
+        """
+        broker_path = getattr(settings, 'NOTIFICATIONS_BROKER', 'notifications.pubsub.CacheNotificationBroker')
+        if self.broker is None or broker_path != self.broker_path:
+            self.broker = import_string(broker_path)()
+            self.broker_path = broker_path
+        return self.broker
+
+    def publish(self, notification_profile_pks):
+        self.get_broker().publish(notification_profile_pks)
+
+    def get_version(self, notification_profile_pk):
+        return self.get_broker().get_version(notification_profile_pk)
+
+    def wait(self, notification_profile_pk, since, timeout):
+        return self.get_broker().wait(notification_profile_pk, since, timeout)
+
+
+notification_broker = NotificationBrokerProxy()
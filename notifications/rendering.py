@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Renders notifications in batches.
+
+Rendering a page of notifications one at a time loads each notification's related objects,
+and its template, separately. Instead the notifications are grouped by class and each class
+prefetches the related objects its render method uses for the whole group, so a page costs
+a query per related object per class rather than per notification. Templates are compiled
+once and kept in a registry.
+"""
+from django.template import Context
+from django.template.loader import get_template
+
+
+class TemplateRegistry(object):
+    """
+    Keeps compiled templates by name.
+    """
+    def __init__(self):
+        super(TemplateRegistry, self).__init__()
+        self.templates = {}
+
+    def get_template(self, template_name):
+        """
+        Returns the compiled template, loading it the first time it is asked for.
+
+        :type template_name: unicode
+        """
+        try:
+            return self.templates[template_name]
+        except KeyError:
+            template = self.templates[template_name] = get_template(template_name)
+            return template
+
+    def clear(self):
+        """
+        Forgets all compiled templates.
+        """
+        self.templates.clear()
+
+
+template_registry = TemplateRegistry()
+
+
+def render_to_string(template_name, dictionary):
+    """
+    Renders a template from the registry. Notifications should use this in their render method.
+
+    :type template_name: unicode
+    :type dictionary: {}
+    :rtype: unicode
+    """
+    return template_registry.get_template(template_name).render(Context(dictionary))
+
+
+def prefetch_for_rendering(notifications):
+    """
+    Groups the notifications by class and lets each class prefetch what it needs to render.
+
+    :type notifications: list[Notification]
+    :return: The notifications
+    :rtype: list[Notification]
+    """
+    groups = {}
+    for notification in notifications:
+        groups.setdefault(type(notification), []).append(notification)
+    for notification_class, group in groups.items():
+        notification_class.prefetch_for_rendering(group)
+    return notifications
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Tests that notifications are rendered in batches.
+"""
+import json
+from django.contrib.auth import get_user_model
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from notifications.models import GenericNotification
+from notifications.rendering import TemplateRegistry, prefetch_for_rendering
+from rpg_auth.tests.utils import CreateUserMixin
+
+
+class BatchRenderingTestCase(CreateUserMixin):
+    """
+    Tests the cost of rendering does not grow with the number of notifications.
+    """
+    def send_messages(self, count):
+        """
+        Sends messages from the user to new users. Each creates a notification in a new thread.
+        :type count: int
+        """
+        start = get_user_model().objects.count()
+        for i in range(start, start + count):
+            other_user = get_user_model().objects.create_user(
+                pen_name='User {0}'.format(i), email='user{0}@example.com'.format(i), password='password'
+            )
+            self.user.message_profile.send_message(message_profile=other_user.message_profile, message='Message')
+            self.user.notification_profile.send_notification(GenericNotification, text='Test {0}'.format(i))
+
+    def count_list_queries(self):
+        """
+        Returns the number of queries used to list the notifications, and the notifications listed.
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('notification-list'))
+        return len(context.captured_queries), json.loads(response.content)
+
+    def test_list_query_count_is_constant(self):
+        """
+        Listing more notifications does not use more queries.
+        """
+        self.send_messages(2)
+        few_queries, few_notifications = self.count_list_queries()
+        self.send_messages(4)
+        many_queries, many_notifications = self.count_list_queries()
+        self.assertEquals(len(few_notifications), 4)
+        self.assertEquals(len(many_notifications), 12)
+        self.assertEquals(few_queries, many_queries)
+
+    def test_prefetched_notifications_render_without_queries(self):
+        """
+        Once prefetched, notifications render without going to the database.
+        """
+        self.send_messages(3)
+        notifications = prefetch_for_rendering(list(self.user.notification_profile.unseen_notifications))
+        with self.assertNumQueries(0):
+            for notification in notifications:
+                notification.render()
+
+    def test_templates_are_compiled_once(self):
+        """
+        The registry returns the same compiled template each time.
+        """
+        registry = TemplateRegistry()
+        template = registry.get_template('private_messages/notifications/message_notification.html')
+        self.assertIs(registry.get_template('private_messages/notifications/message_notification.html'), template)
+        registry.clear()
+        self.assertEquals(registry.templates, {})
@@ -2,8 +2,8 @@
 """
 A notification profile is associated to a user and provides meta data about their notifications.
 """
-from mock import patch, PropertyMock
-from notifications.context_processors import unseen_notifications
+from notifications.context_processors import unseen_notifications, LazyUnseenNotifications
+from notifications.models import GenericNotification
 from rpg_auth.tests.utils import CreateUserMixin
 from soj.tests.utils import MockRequest
 
@@ -12,16 +12,31 @@ class ContextProcessorTestCase(CreateUserMixin):
     """
     Tests that the notification profile model behaves correctly.
     """
+    def setUp(self):
+        super(ContextProcessorTestCase, self).setUp()
+        self.notification = self.user.notification_profile.send_notification(GenericNotification, text='Test')
 
-    @patch('notifications.models.NotificationProfile.unseen_notifications')
-    def test_context_processor_has_unseen_notifications(self, patched_unseen_notifications):
+    def test_context_processor_has_unseen_notifications(self):
         """
         A context processor should returns the user's unseen notifications.
         """
-        patched_unseen_notifications.__get__ = PropertyMock(return_value={'test': 'test'})
         mock_request = MockRequest()
         mock_request.user = self.user
-        self.assertEquals(unseen_notifications(mock_request), {'unseen_notifications': {'test': 'test'}})
+        context = unseen_notifications(mock_request)
+        self.assertIsInstance(context['unseen_notifications'], LazyUnseenNotifications)
+        self.assertEquals(list(context['unseen_notifications']), [self.notification])
+
+    def test_length_does_not_load_notifications(self):
+        """
+        Once the count is cached, the length of the unseen notifications does not hit the database.
+        """
+        mock_request = MockRequest()
+        mock_request.user = self.user
+        context = unseen_notifications(mock_request)
+        self.assertEquals(len(context['unseen_notifications']), 1)
+        with self.assertNumQueries(0):
+            self.assertEquals(len(context['unseen_notifications']), 1)
+            self.assertTrue(context['unseen_notifications'])
 
     def test_if_user_is_not_logged_in_returns_empty_list(self):
         """
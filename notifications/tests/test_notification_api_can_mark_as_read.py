@@ -112,3 +112,55 @@ class MarkAsReadTestCase(CreateUserMixin):
         self.client.login(username='other_user@example.com', password='password')
         response = self.client.post(self.set_as_notified_url)
         self.assertEquals(response.status_code, 404)
+
+
+class MarkAllAsReadTestCase(CreateUserMixin):
+    """
+    Tests that all notifications can be marked as read through the API at once.
+    """
+    def setUp(self):
+        super(MarkAllAsReadTestCase, self).setUp()
+        self.notifications = [
+            self.user.notification_profile.send_notification(GenericNotification, text='Test {0}'.format(i))
+            for i in range(3)
+        ]
+        self.set_all_as_seen_url = reverse('notification-set-all-as-seen')
+
+    def test_can_set_all_as_seen(self):
+        """
+        Posting sets every unseen notification as seen and returns the count.
+        """
+        response = self.client.post(self.set_all_as_seen_url)
+        self.assertEquals(json.loads(response.content), {'status': 'ok', 'count': 3})
+        self.assertEquals(self.user.notification_profile.unseen_notifications.count(), 0)
+
+    def test_can_set_as_seen_up_to_pk(self):
+        """
+        Only notifications up to the given pk are set as seen.
+        """
+        response = self.client.post(self.set_all_as_seen_url, {'up_to': self.notifications[1].pk})
+        self.assertEquals(json.loads(response.content)['count'], 2)
+        self.assertEquals(
+            [notification.pk for notification in self.user.notification_profile.unseen_notifications],
+            [self.notifications[2].pk]
+        )
+
+    def test_invalid_pk_is_bad_request(self):
+        """
+        A non-numeric pk is rejected.
+        """
+        response = self.client.post(self.set_all_as_seen_url, {'up_to': 'abc'})
+        self.assertEquals(response.status_code, 400)
+
+    def test_only_sets_own_as_seen(self):
+        """
+        Other users' notifications are left unseen.
+        """
+        self.client.logout()
+        get_user_model().objects.create_user(
+            pen_name='pen name 2', email='other_user@example.com', password='password', is_active=True
+        )
+        self.client.login(username='other_user@example.com', password='password')
+        response = self.client.post(self.set_all_as_seen_url)
+        self.assertEquals(json.loads(response.content)['count'], 0)
+        self.assertEquals(self.user.notification_profile.unseen_notifications.count(), 3)
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Tests clients waiting on the poll endpoint are woken when their notifications change.
+"""
+import json
+import threading
+import time
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from characters.tests.utils import CharacterUtils
+from notifications.models import GenericNotification, Notification
+from notifications.pubsub import CacheNotificationBroker, LocalNotificationBroker, notification_broker
+from quests.models import Post
+from quests.tests.utils import QuestUtils
+from rpg_auth.tests.utils import CreateUserMixin
+
+
+class NotificationBrokerTestCase(TestCase):
+    """
+    Tests the brokers.
+    """
+    def setUp(self):
+        super(NotificationBrokerTestCase, self).setUp()
+        cache.clear()
+
+    def check_broker(self, broker):
+        """
+        Waiting returns at once if the version has changed, wakes when it changes, and otherwise
+        times out without using the database.
+        """
+        since = broker.get_version(1)
+        broker.publish([1])
+        self.assertNotEquals(broker.wait(1, since, 5), since)
+
+        since = broker.get_version(1)
+        timer = threading.Timer(0.05, broker.publish, args=([1], ))
+        timer.start()
+        started = time.time()
+        version = broker.wait(1, since, 5)
+        timer.join()
+        self.assertNotEquals(version, since)
+        self.assertLess(time.time() - started, 2)
+
+        with self.assertNumQueries(0):
+            self.assertEquals(broker.wait(1, version, 0.01), version)
+        self.assertEquals(broker.get_version(2), broker.get_version(3))
+
+    def test_local_broker(self):
+        """
+        The local broker wakes waiting threads.
+        """
+        self.check_broker(LocalNotificationBroker())
+
+    @override_settings(CELERY_ALWAYS_EAGER=False)
+    def test_local_broker_needs_tasks_in_process(self):
+        """
+        The local broker cannot see changes made by Celery workers, so refuses to be used without them.
+        """
+        self.assertRaises(ImproperlyConfigured, LocalNotificationBroker)
+
+    @override_settings(CELERY_ALWAYS_EAGER=False)
+    def test_cache_broker_needs_shared_cache(self):
+        """
+        The cache broker cannot see changes made by Celery workers through a local memory cache, so refuses it
+        unless tasks run in process.
+        """
+        self.assertRaises(ImproperlyConfigured, CacheNotificationBroker)
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            CacheNotificationBroker()
+
+    def test_cache_broker_sees_other_processes(self):
+        """
+        A client waiting on one cache broker is woken by a change published through another, as it would be
+        by a Celery worker.
+        """
+        waiting = CacheNotificationBroker()
+        waiting.poll_interval = 0.01
+        since = waiting.get_version(1)
+        timer = threading.Timer(0.05, CacheNotificationBroker().publish, args=([1], ))
+        timer.start()
+        version = waiting.wait(1, since, 5)
+        timer.join()
+        self.assertNotEquals(version, since)
+
+    def test_cache_broker(self):
+        """
+        The cache broker wakes clients polling the cache.
+        """
+        broker = CacheNotificationBroker()
+        broker.poll_interval = 0.01
+        self.check_broker(broker)
+
+
+class NotificationPublishingTestCase(CreateUserMixin):
+    """
+    Tests changes to notifications are published to the profile they belong to.
+    """
+    fixtures = ['world-test-data.json']
+
+    def setUp(self):
+        super(NotificationPublishingTestCase, self).setUp()
+        self.notification_profile = self.user.notification_profile
+
+    def assertPublishes(self, func):
+        """
+        Asserts calling func changes the version of the user's notification profile.
+        """
+        since = notification_broker.get_version(self.notification_profile.pk)
+        func()
+        self.assertNotEquals(notification_broker.get_version(self.notification_profile.pk), since)
+
+    def test_sending_and_seeing_publish(self):
+        """
+        Sending notifications and setting them as seen are published.
+        """
+        self.assertPublishes(lambda: self.notification_profile.send_notification(GenericNotification, text='Test'))
+        notification = Notification.objects.get()
+        self.assertPublishes(notification.set_as_seen)
+        self.notification_profile.send_notification(GenericNotification, text='Test')
+        self.assertPublishes(self.notification_profile.notifications.set_as_seen)
+
+    def test_post_fan_out_publishes(self):
+        """
+        Followers are told of new notifications, and of notifications updated to point at a new post.
+        """
+        author = get_user_model().objects.create_user(pen_name='Author', password='password', email='a@example.com')
+        character = CharacterUtils.create_character(author)
+        quest = QuestUtils.create_quest(author, character)
+        self.user.quest_profile.follow_quest(quest)
+
+        def create_post():
+            Post.objects.create(quest=quest, character=character, location=quest.current_location, content='Post')
+        self.assertPublishes(create_post)
+        self.assertPublishes(create_post)
+        self.assertEquals(self.notification_profile.notifications.count(), 1)
+
+    def test_coalesced_messages_publish(self):
+        """
+        A message updating an existing unseen notification is published.
+        """
+        other = get_user_model().objects.create_user(pen_name='Other', password='password', email='o@example.com')
+
+        def send_message():
+            self.user.message_profile.send_message(message_profile=other.message_profile, message='Hello')
+        self.assertPublishes(send_message)
+        self.assertPublishes(send_message)
+        self.assertEquals(self.notification_profile.notifications.count(), 1)
+
+
+class NotificationPollTestCase(CreateUserMixin):
+    """
+    Tests the poll endpoint.
+    """
+    def setUp(self):
+        super(NotificationPollTestCase, self).setUp()
+        self.url = reverse('notification-poll')
+
+    def poll(self, **params):
+        """
+        Polls with the given query parameters.
+        """
+        return self.client.get(self.url, params)
+
+    def test_without_cursor_lists_at_once(self):
+        """
+        A first poll lists the unseen notifications along with the cursor to wait on.
+        """
+        self.user.notification_profile.send_notification(GenericNotification, text='Test')
+        data = json.loads(self.poll(timeout=5).content)
+        self.assertEquals(len(data['notifications']), 1)
+        self.assertEquals(data['cursor'], notification_broker.get_version(self.user.notification_profile.pk))
+
+    def test_unchanged_times_out(self):
+        """
+        Nothing is listed if nothing has changed by the timeout.
+        """
+        cursor = json.loads(self.poll().content)['cursor']
+        self.assertEquals(self.poll(since=cursor, timeout=0.01).status_code, 204)
+
+    def test_changed_lists_new_notifications(self):
+        """
+        Polling with an old cursor lists the notifications sent since.
+        """
+        cursor = json.loads(self.poll().content)['cursor']
+        self.user.notification_profile.send_notification(GenericNotification, text='Test')
+        data = json.loads(self.poll(since=cursor, timeout=5).content)
+        self.assertNotEquals(data['cursor'], cursor)
+        self.assertEquals([notification['rendered'] for notification in data['notifications']], ['Test'])
+
+    def test_invalid_timeout(self):
+        """
+        A timeout that is not a number is rejected.
+        """
+        self.assertEquals(self.poll(timeout='soon').status_code, 400)
@@ -108,10 +108,27 @@ class MarkAsSeenTestCase(CreateUserMixin):
         self.assertEquals(self.notification1.date_seen, timezone.now())
 
     @freeze_time('2000-01-01T00:00:00+00:00')
-    @patch('notifications.models.Notification.set_as_seen')
-    def test_can_mark_query_set_as_unseen(self, mock_set_as_seen):
+    def test_can_mark_query_set_as_unseen(self):
         """
         A whole queryset should be able to be set as seen.
         """
-        self.user.notification_profile.unseen_notifications.set_as_seen()
-        self.assertEquals(mock_set_as_seen.call_count, 2)
+        self.assertEquals(self.user.notification_profile.unseen_notifications.set_as_seen(), 2)
+        self.assertEquals(self.user.notification_profile.unseen_notifications.count(), 0)
+        self.assertEquals(Notification.objects.get(pk=self.notification1.pk).date_seen, timezone.now())
+
+    def test_marking_query_set_as_seen_is_one_query(self):
+        """
+        Setting a queryset as seen is a single update however many notifications there are, plus
+        a query for the profiles whose cached counts need invalidating.
+        """
+        with self.assertNumQueries(2):
+            self.user.notification_profile.unseen_notifications.set_as_seen()
+
+    def test_marking_query_set_as_seen_leaves_seen_alone(self):
+        """
+        Notifications that were already seen keep the date they were seen.
+        """
+        with freeze_time('2000-01-01T00:00:00+00:00'):
+            self.notification1.set_as_seen()
+        self.assertEquals(self.user.notification_profile.notifications.set_as_seen(), 1)
+        self.assertEquals(Notification.objects.get(pk=self.notification1.pk).date_seen, self.notification1.date_seen)
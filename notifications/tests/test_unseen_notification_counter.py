@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the cached count of unseen notifications.
+"""
+from django.core.cache import cache
+from notifications.counters import UnseenNotificationCounter, unseen_notification_counter
+from notifications.models import GenericNotification, Notification
+from rpg_auth.tests.utils import CreateUserMixin
+
+
+class UnseenNotificationCounterTestCase(CreateUserMixin):
+    """
+    Tests the counter is kept up to date.
+    """
+    def setUp(self):
+        super(UnseenNotificationCounterTestCase, self).setUp()
+        self.notification_profile = self.user.notification_profile
+
+    def send(self):
+        """
+        Sends a notification to the user.
+        """
+        return self.notification_profile.send_notification(GenericNotification, text='Test')
+
+    def test_count_is_backfilled(self):
+        """
+        The count is read from the database the first time and from the cache after.
+        """
+        self.send()
+        self.send()
+        self.assertEquals(self.notification_profile.unseen_notification_count, 2)
+        with self.assertNumQueries(0):
+            self.assertEquals(self.notification_profile.unseen_notification_count, 2)
+
+    def test_sending_increments(self):
+        """
+        Sending a notification increments a cached count.
+        """
+        self.assertEquals(self.notification_profile.unseen_notification_count, 0)
+        self.send()
+        with self.assertNumQueries(0):
+            self.assertEquals(self.notification_profile.unseen_notification_count, 1)
+
+    def test_seeing_decrements(self):
+        """
+        Setting a notification as seen decrements the count.
+        """
+        notification = self.send()
+        self.assertEquals(self.notification_profile.unseen_notification_count, 1)
+        notification.set_as_seen()
+        notification.set_as_seen()
+        with self.assertNumQueries(0):
+            self.assertEquals(self.notification_profile.unseen_notification_count, 0)
+
+    def test_setting_queryset_as_seen_invalidates(self):
+        """
+        Setting a queryset as seen resets the count.
+        """
+        self.send()
+        self.send()
+        self.assertEquals(self.notification_profile.unseen_notification_count, 2)
+        self.notification_profile.notifications.set_as_seen()
+        self.assertEquals(self.notification_profile.unseen_notification_count, 0)
+
+    def test_deleting_invalidates(self):
+        """
+        Deleting an unseen notification, directly or through its parent row, resets the count.
+        """
+        notification = self.send()
+        self.send()
+        self.assertEquals(self.notification_profile.unseen_notification_count, 2)
+        notification.delete()
+        self.assertEquals(self.notification_profile.unseen_notification_count, 1)
+        Notification.objects.filter(notification_profile=self.notification_profile).delete()
+        self.assertEquals(self.notification_profile.unseen_notification_count, 0)
+
+    def test_increment_without_cached_count_does_nothing(self):
+        """
+        Incrementing a count that is not cached leaves it to be counted later.
+        """
+        unseen_notification_counter.increment(self.notification_profile.pk)
+        self.assertIsNone(cache.get(unseen_notification_counter.get_key(self.notification_profile.pk)))
+
+    def test_missing_cache_falls_back_to_local_memory(self):
+        """
+        If the configured cache does not exist a local memory cache is used.
+        """
+        counter = UnseenNotificationCounter(cache_alias='does-not-exist')
+        self.send()
+        self.assertEquals(counter.get(self.notification_profile), 1)
+        self.assertIs(counter.cache, counter.cache)
@@ -3,13 +3,39 @@
 API views for notifications.
 """
 from __future__ import unicode_literals
-from rest_framework import viewsets
+from rest_framework import status, viewsets
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max
 from django.shortcuts import get_object_or_404
-from rest_framework.decorators import detail_route
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.decorators import detail_route, list_route
 from rest_framework.exceptions import ParseError
 from rest_framework.response import Response
-from notifications.models import Notification
+from notifications.models import Notification, NotificationProfile
+from notifications.pubsub import notification_broker
+from notifications.rendering import prefetch_for_rendering
 from notifications.serializers import NotificationSerializer
+from soj.conditional import make_etag
+from soj.replicas import replica_reads
+
+
+def unseen_notifications_etag(request, *args, **kwargs):
+    """
+    The ETag of the user's unseen notifications, from the newest one's id, how many there are and
+    the profile's version in the notification broker, which changes when an unseen notification is
+    pointed at something new. Takes one aggregate query rather than loading the notifications.
+
+    :type request: Request
+    :rtype: unicode | None
+    """
+    del args, kwargs
+    if not request.user.is_authenticated():
+        return None
+    notification_profile = request.user.notification_profile
+    unseen = notification_profile.notifications.filter_unseen().aggregate(last_pk=Max('pk'), count=Count('pk'))
+    return make_etag(unseen['last_pk'], unseen['count'], notification_broker.get_version(notification_profile.pk))
 
 
 class NotificationViewSet(viewsets.ViewSet):
@@ -21,8 +47,16 @@ class NotificationViewSet(viewsets.ViewSet):
     def get_queryset(self):
         return self.request.user.notification_profile.unseen_notifications
 
+    @method_decorator(replica_reads)
+    @method_decorator(condition(etag_func=unseen_notifications_etag))
     def list(self, request):
-        serializer = NotificationSerializer(self.get_queryset(), many=True, context={'request': request})
+        """
+        Lists the unseen notifications, prefetching what they need to render for the whole list.
+        Answers 304 if they have not changed since the client's copy. Reads from a replica.
+        :type request: Request
+        """
+        notifications = prefetch_for_rendering(list(self.get_queryset()))
+        serializer = NotificationSerializer(notifications, many=True, context={'request': request})
         return Response(serializer.data)
 
     def retrieve(self, request, pk=None):
@@ -38,6 +72,39 @@ class NotificationViewSet(viewsets.ViewSet):
         serializer = NotificationSerializer(notification, context={'request': request})
         return Response(serializer.data)
 
+    @list_route(methods=['get'])
+    def poll(self, request):
+        """
+        Waits for the user's notifications to change and then lists the unseen notifications.
+
+        Clients pass the cursor from their last response as `since`. If the notifications have
+        changed since then they are listed straight away. Otherwise the request waits, for up to
+        `timeout` seconds capped at settings.NOTIFICATIONS_POLL_TIMEOUT, without using the
+        database. If nothing changes 204 is returned and the client should poll again with the
+        same cursor.
+
+        :type request: Request
+        """
+        max_timeout = getattr(settings, 'NOTIFICATIONS_POLL_TIMEOUT', 25)
+        try:
+            timeout = min(float(request.QUERY_PARAMS.get('timeout', max_timeout)), max_timeout)
+        except ValueError:
+            raise ParseError
+        since = request.QUERY_PARAMS.get('since')
+        notification_profile_pk = NotificationProfile.objects.filter(user=request.user).values_list(
+            'pk', flat=True
+        ).get()
+        version = notification_broker.get_version(notification_profile_pk)
+        if version == since:
+            if not connection.in_atomic_block:
+                connection.close()
+            version = notification_broker.wait(notification_profile_pk, since, max(timeout, 0))
+            if version == since:
+                return Response(status=status.HTTP_204_NO_CONTENT)
+        notifications = prefetch_for_rendering(list(self.get_queryset()))
+        serializer = NotificationSerializer(notifications, many=True, context={'request': request})
+        return Response({'cursor': version, 'notifications': serializer.data})
+
     @detail_route(methods=['post'])
     def set_as_seen(self, request, pk):
         del request
@@ -48,3 +115,20 @@ class NotificationViewSet(viewsets.ViewSet):
         notification = get_object_or_404(self.get_queryset(), pk=pk)
         notification.set_as_seen()
         return Response({'status': 'ok'})
+
+    @list_route(methods=['post'])
+    def set_all_as_seen(self, request):
+        """
+        Sets every unseen notification as seen, optionally only those with a pk up to and including
+        the `up_to` parameter, so a client only clears the notifications it has displayed.
+
+        :type request: Request
+        """
+        queryset = self.request.user.notification_profile.notifications.all()
+        up_to = request.DATA.get('up_to')
+        if up_to is not None:
+            try:
+                queryset = queryset.filter(pk__lte=int(up_to))
+            except (TypeError, ValueError):
+                raise ParseError
+        return Response({'status': 'ok', 'count': queryset.set_as_seen()})
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+Moves private messages from the duplicated layout, where each user's thread holds a copy of
+every message, to the single copy layout where each message is stored once per conversation.
+"""
+from django.core.management.base import BaseCommand
+from private_messages.models import Conversation
+
+
+class Command(BaseCommand):
+    """
+    Converts message threads to conversations.
+    """
+    help = 'Stores each private message once per conversation instead of once per thread.'
+
+    def handle(self, *args, **options):
+        """
+        :type args: []
+        :type options: {}
+        """
+        converted = Conversation.objects.convert_duplicated_threads()
+        self.stdout.write('Created {0} conversations.'.format(converted))
+        self.stdout.write('Set PRIVATE_MESSAGES_SINGLE_COPY = True to read and write messages this way.')
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+"""
+Recalculates the message count and last message of every message thread.
+"""
+from django.core.management.base import BaseCommand
+from private_messages.models import MessageThread
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds message thread summaries.
+    """
+    help = 'Recalculates the message count and last message of every message thread from its messages.'
+
+    def handle(self, *args, **options):
+        """
+        :type args: []
+        :type options: {}
+        """
+        count = MessageThread.objects.rebuild_summaries()
+        self.stdout.write('Rebuilt {0} message threads.'.format(count))
@@ -1,13 +1,23 @@
 # -*- coding: utf-8 -*-
 """
 Private message models
+
+Messages can be stored in one of two ways. By default each message is stored twice, once in the
+sender's MessageThread and once in the receiver's. If settings.PRIVATE_MESSAGES_SINGLE_COPY is
+True each message is stored once against a Conversation, and the two MessageThreads only hold
+each user's state for the conversation: when they last read it, whether they archived it and
+when they last deleted its messages. The convert_to_single_copy_messages command moves existing
+messages from the duplicated layout.
 """
 from django.conf import settings
-from django.db import models
-from django.db.models import Count, Max
-from django.db.models.signals import post_save
-from django.template.loader import render_to_string
-from notifications.models import Notification
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q
+from django.utils import timezone
+from notifications.models import Notification, NotificationProfile
+from notifications.pubsub import notification_broker
+from notifications.rendering import render_to_string
+from rpg_auth.provisioning import profile_provisioner
+from soj.cursors import DateCursor
 
 
 class MessageNotification(Notification):
@@ -16,6 +26,8 @@ class MessageNotification(Notification):
     """
     private_message = models.ForeignKey('PrivateMessage')
 
+    render_prefetch_related = ('private_message', )
+
     def render(self):
         """
         Renders the notification.
@@ -32,10 +44,16 @@ class MessageProfile(models.Model):
     """
     user = models.OneToOneField(settings.AUTH_USER_MODEL, related_name='message_profile')
 
+    @transaction.atomic
     def send_message(self, message_profile, message):
         """
         Sends a message to another user
 
+        The whole send happens in one transaction. Both threads are locked while the message is
+        added, so two users messaging each other at the same time are handled one after the other.
+        An unseen notification for the thread is pointed at the new message with a single update,
+        and a notification is only created if there was none to update.
+
         :type message_profile: MessageProfile
         :type message: unicode
 
@@ -46,17 +64,21 @@ class MessageProfile(models.Model):
             to_message_profile=message_profile,
             message=message
         )
-        try:
-            message_notification = self.user.notification_profile.unseen_notifications.get(
-                messagenotification__private_message__message_thread=received_message.message_thread
+        if received_message.conversation_id is None:
+            thread_lookup = {'private_message__message_thread': received_message.message_thread_id}
+        else:
+            thread_lookup = {'private_message__conversation': received_message.conversation_id}
+        updated = MessageNotification.objects.filter(
+            notification_profile__user=self.user_id, date_seen__isnull=True, **thread_lookup
+        ).update(private_message=received_message)
+        if updated:
+            notification_broker.publish(
+                NotificationProfile.objects.filter(user=self.user_id).values_list('pk', flat=True)
             )
-        except Notification.DoesNotExist:
-            self.user.notification_profile.send_notification(
+        else:
+            NotificationProfile.objects.get(user=self.user_id).send_notification(
                 MessageNotification, private_message=received_message
             )
-        else:
-            message_notification.private_message = received_message
-            message_notification.save()
         return received_message, sent_message
 
     @property
@@ -66,6 +88,24 @@ class MessageProfile(models.Model):
         """
         return self.threads.filter_message_thread_list()
 
+    def get_message_thread_page(self, before=None, page_size=20):
+        """
+        Returns a page of the user's message threads, most recently updated first, and the cursor
+        to pass as before to get the next page. The cursor is None on the last page.
+
+        :param before: The cursor returned with the previous page
+        :type before: unicode
+        :type page_size: int
+        :rtype: (list[MessageThread], unicode)
+        """
+        threads = self.message_threads.filter(last_message_at__isnull=False)
+        if before is not None:
+            threads = threads.filter(InboxCursor.decode(before).before_q())
+        threads = list(threads.select_related('other_message_profile__user')[:page_size + 1])
+        if len(threads) > page_size:
+            return threads[:page_size], InboxCursor.for_object(threads[page_size - 1]).encode()
+        return threads, None
+
     @property
     def received_messages(self):
         """
@@ -85,17 +125,7 @@ class MessageProfile(models.Model):
         return PrivateMessage.objects.filter_sent_by_message_profile(message_profile=self)
 
 
-def create_message_profile(sender, **kwargs):
-    """
-    Catches users being created and creates a profile for the user.
-
-    :type sender: RpgUser
-    :type kwargs: {}
-    """
-    del sender
-    if kwargs['created']:
-        MessageProfile.objects.create(user=kwargs['instance'])
-post_save.connect(create_message_profile, sender=settings.AUTH_USER_MODEL)
+profile_provisioner.register(MessageProfile)
 
 
 class MessageThreadManager(models.Manager):
@@ -104,65 +134,298 @@ class MessageThreadManager(models.Manager):
     """
     def filter_message_thread_list(self):
         """
-        Prepares the threads for listing to the user. Annotates the number
-        of messages in the thread and orders by the last post date in the thread.
+        Prepares the threads for listing to the user, ordered by the last message date in the thread.
+        """
+        return self.order_by('-last_message_at', '-pk')
+
+    def get_or_create_pair(self, message_profile, other_message_profile):
+        """
+        Returns the threads between two users, one owned by each, locking them for the rest of the
+        transaction. Missing threads are created, in order of their owner's pk so that two users
+        messaging each other for the first time at once lock them in the same order. If another
+        transaction creates a thread first the unique constraint on the owner and other user is
+        caught and the existing thread is used.
+
+        :type message_profile: MessageProfile
+        :type other_message_profile: MessageProfile
+        :return: The thread owned by message_profile and the thread owned by other_message_profile.
+        :rtype: (MessageThread, MessageThread)
+        """
+        threads = dict(
+            (thread.owner_id, thread) for thread in self.select_for_update().filter(
+                Q(owner=message_profile, other_message_profile=other_message_profile) |
+                Q(owner=other_message_profile, other_message_profile=message_profile)
+            )
+        )
+        pair = sorted(
+            [(message_profile, other_message_profile), (other_message_profile, message_profile)],
+            key=lambda owner_and_other: owner_and_other[0].pk
+        )
+        for owner, other in pair:
+            if owner.pk not in threads:
+                try:
+                    with transaction.atomic():
+                        threads[owner.pk] = self.create(owner=owner, other_message_profile=other)
+                except IntegrityError:
+                    threads[owner.pk] = self.select_for_update().get(owner=owner, other_message_profile=other)
+        return threads[message_profile.pk], threads[other_message_profile.pk]
+
+    def record_message(self, thread_pks, private_message):
+        """
+        Updates the summaries of the threads for a message that has just been added to them.
+
+        :type thread_pks: list[int]
+        :type private_message: PrivateMessage
         """
-        return self.annotate(
-            message_count=Count('messages'), last_updated=Max('messages__date_created')
-        ).order_by(
-            '-last_updated'
+        self.filter(pk__in=thread_pks).update(
+            message_count=F('message_count') + 1,
+            last_message_at=private_message.date_created,
+            last_message=private_message,
         )
 
+    def rebuild_summaries(self):
+        """
+        Recalculates the summary of every thread from its messages.
+
+        :return: The number of threads rebuilt.
+        :rtype: int
+        """
+        count = 0
+        for thread in self.all().iterator():
+            thread.rebuild_summary()
+            count += 1
+        return count
+
+
+def single_copy_enabled():
+    """
+    Returns True if messages are stored once per conversation rather than once per thread.
+    :rtype: bool
+    """
+    return getattr(settings, 'PRIVATE_MESSAGES_SINGLE_COPY', False)
+
+
+class ConversationManager(models.Manager):
+    """
+    Manages the Conversation model.
+    """
+    def convert_duplicated_threads(self):
+        """
+        Moves every pair of threads still using the duplicated layout to a conversation.
+
+        :return: The number of conversations created.
+        :rtype: int
+        """
+        converted = 0
+        for thread_pk in list(MessageThread.objects.filter(conversation__isnull=True).values_list('pk', flat=True)):
+            if self.convert_thread(MessageThread(pk=thread_pk)) is not None:
+                converted += 1
+        return converted
+
+    @transaction.atomic
+    def convert_thread(self, thread):
+        """
+        Creates a conversation for a thread and the other user's matching thread, keeping one copy
+        of each message. A message in the other thread is a copy if it has the same sender and text
+        as a message in this thread; any message without a copy is kept. Notifications about a copy
+        are moved to the message that is kept.
+
+        :type thread: MessageThread
+        :return: The conversation, or None if the thread has already been converted.
+        :rtype: Conversation
+        """
+        thread = MessageThread.objects.select_for_update().get(pk=thread.pk)
+        if thread.conversation_id is not None:
+            return None
+        other_thread, _ = MessageThread.objects.select_for_update().get_or_create(
+            owner=thread.other_message_profile_id, other_message_profile=thread.owner_id
+        )
+        conversation = self.create()
+        unmatched = {}
+        for pk, sender_pk, message in thread.messages.order_by('date_created', 'pk').values_list(
+            'pk', 'sender', 'message'
+        ):
+            unmatched.setdefault((sender_pk, message), []).append(pk)
+        kept_pks = {}
+        for pk, sender_pk, message in other_thread.messages.order_by('date_created', 'pk').values_list(
+            'pk', 'sender', 'message'
+        ):
+            if unmatched.get((sender_pk, message)):
+                kept_pks[pk] = unmatched[(sender_pk, message)].pop(0)
+        for notification_pk, private_message_pk in MessageNotification.objects.filter(
+            private_message__in=kept_pks.keys()
+        ).values_list('pk', 'private_message'):
+            MessageNotification.objects.filter(pk=notification_pk).update(private_message=kept_pks[private_message_pk])
+        PrivateMessage.objects.filter(pk__in=kept_pks.keys()).delete()
+        PrivateMessage.objects.filter(message_thread__in=[thread, other_thread]).update(
+            conversation=conversation, message_thread=None
+        )
+        MessageThread.objects.filter(pk__in=[thread.pk, other_thread.pk]).update(conversation=conversation)
+        for converted_thread in MessageThread.objects.filter(pk__in=[thread.pk, other_thread.pk]):
+            converted_thread.rebuild_summary()
+        return conversation
+
+
+class Conversation(models.Model):
+    """
+    A conversation holds the single copy of the messages between 2 users. Each user has a
+    MessageThread pointing at it.
+    """
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    objects = ConversationManager()
+
 
 class MessageThread(models.Model):
     """
     A message thread is a conversation between 2 users.
+
+    In the duplicated layout the thread holds the owner's copy of the messages. In the single copy
+    layout the messages belong to the conversation and the thread holds the owner's state.
     """
     owner = models.ForeignKey(MessageProfile, related_name='threads', db_index=True)
     other_message_profile = models.ForeignKey(MessageProfile, related_name='other_message_profile', db_index=True)
+    conversation = models.ForeignKey(Conversation, related_name='threads', null=True, blank=True)
+    last_read = models.DateTimeField(null=True, blank=True)
+    archived = models.BooleanField(default=False)
+    deleted_before = models.DateTimeField(null=True, blank=True)
+    message_count = models.IntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message = models.ForeignKey(
+        'PrivateMessage', related_name='+', null=True, blank=True, on_delete=models.SET_NULL
+    )
 
     objects = MessageThreadManager()
 
+    class Meta(object):
+        """
+        Meta properties
+        """
+        index_together = [('owner', 'last_message_at')]
+        unique_together = [('owner', 'other_message_profile')]
+
+    def rebuild_summary(self):
+        """
+        Recalculates message_count, last_message_at and last_message from the messages in the thread.
+        """
+        messages = self.visible_messages.order_by('-date_created', '-pk')
+        self.message_count = messages.count()
+        self.last_message = messages.first()
+        self.last_message_at = None if self.last_message is None else self.last_message.date_created
+        self.save(update_fields=['message_count', 'last_message', 'last_message_at'])
+
+    @property
+    def visible_messages(self):
+        """
+        Returns the messages in the thread the owner has not deleted.
+
+        :rtype: QuerySet
+        """
+        if self.conversation_id is None:
+            messages = self.messages.all()
+        else:
+            messages = self.conversation.messages.all()
+        if self.deleted_before is not None:
+            messages = messages.filter(date_created__gt=self.deleted_before)
+        return messages
+
+    def mark_read(self):
+        """
+        Records that the owner has read the thread.
+        """
+        self.last_read = timezone.now()
+        self.save(update_fields=['last_read'])
+
+    def archive(self):
+        """
+        Archives the thread for the owner.
+        """
+        self.archived = True
+        self.save(update_fields=['archived'])
+
+    @transaction.atomic
+    def delete_messages(self):
+        """
+        Hides every message currently in the thread from the owner without affecting the other user,
+        and rebuilds the summary from the messages still visible. The thread is locked first so a
+        message sent at the same time is not counted twice.
+        """
+        MessageThread.objects.select_for_update().filter(pk=self.pk).exists()
+        self.deleted_before = timezone.now()
+        self.save(update_fields=['deleted_before'])
+        self.rebuild_summary()
+
 
 class PrivateMessageManager(models.Manager):
     """
     Managers the PrivateMessage model
     """
+    @transaction.atomic
     def create_private_message(self, from_message_profile, to_message_profile, message):
         """
         Creates a private message. First, it will look for a thread between the from user
         and the to user. If the thread does not exist it will be created for both users.
         The message will then be duplicated in to both threads so both users retain a copy.
 
+        If single copy messages are enabled the message is instead stored once, and is returned
+        as both the received and sent message.
+
         :type from_message_profile: MessageProfile
         :type to_message_profile: MessageProfile
         :type message: unicode
         :return: list[MessageProfile]
         """
+        sender_thread, receiver_thread = MessageThread.objects.get_or_create_pair(
+            from_message_profile, to_message_profile
+        )
+        if single_copy_enabled():
+            return self._create_single_copy_message(from_message_profile, sender_thread, receiver_thread, message)
+
         # The receiver's version
-        receiver_thread, _ = to_message_profile.threads.get_or_create(other_message_profile=from_message_profile)
         received_message = self.create(
             sender=from_message_profile,
             message_thread=receiver_thread,
             message=message
         )
+        MessageThread.objects.record_message([receiver_thread.pk], received_message)
 
         # The sender's version
-        sender_thread, _ = from_message_profile.threads.get_or_create(other_message_profile=to_message_profile)
         sent_message = self.create(
             sender=from_message_profile,
             message_thread=sender_thread,
             message=message
         )
+        MessageThread.objects.record_message([sender_thread.pk], sent_message)
         return received_message, sent_message
 
+    def _create_single_copy_message(self, from_message_profile, sender_thread, receiver_thread, message):
+        """
+        Stores a message once in the conversation between the two users, creating the
+        conversation if needed.
+
+        :type from_message_profile: MessageProfile
+        :type sender_thread: MessageThread
+        :type receiver_thread: MessageThread
+        :type message: unicode
+        :return: list[MessageProfile]
+        """
+        conversation_id = sender_thread.conversation_id or receiver_thread.conversation_id
+        if conversation_id is None:
+            conversation_id = Conversation.objects.create().pk
+        MessageThread.objects.filter(
+            pk__in=[sender_thread.pk, receiver_thread.pk], conversation__isnull=True
+        ).update(conversation=conversation_id)
+        private_message = self.create(sender=from_message_profile, conversation_id=conversation_id, message=message)
+        MessageThread.objects.record_message([sender_thread.pk, receiver_thread.pk], private_message)
+        return private_message, private_message
+
     def filter_received_by_message_profile(self, message_profile):
         """
         Returns all received messages (regardless of thread) for a given user.
 
         :type message_profile: MessageProfile
         """
-        return self.filter(message_thread__owner=message_profile).exclude(sender=message_profile)
+        return self.filter_visible_to_message_profile(message_profile).exclude(sender=message_profile)
 
     def filter_sent_by_message_profile(self, message_profile):
         """
@@ -170,17 +433,39 @@ class PrivateMessageManager(models.Manager):
 
         :type message_profile: MessageProfile
         """
-        return self.filter(message_thread__owner=message_profile, sender=message_profile)
+        return self.filter_visible_to_message_profile(message_profile).filter(sender=message_profile)
+
+    def filter_visible_to_message_profile(self, message_profile):
+        """
+        Returns all messages in the user's threads that they have not deleted.
+
+        :type message_profile: MessageProfile
+        """
+        if not single_copy_enabled():
+            return self.filter(message_thread__owner=message_profile)
+        return self.filter(
+            Q(conversation__threads__deleted_before__isnull=True) |
+            Q(conversation__threads__deleted_before__lt=models.F('date_created')),
+            conversation__threads__owner=message_profile,
+        )
 
 
 class PrivateMessage(models.Model):
     """
     Model representing a message from one user to another.
     """
-    message_thread = models.ForeignKey(MessageThread, related_name='messages')
+    message_thread = models.ForeignKey(MessageThread, related_name='messages', null=True, blank=True)
+    conversation = models.ForeignKey(Conversation, related_name='messages', null=True, blank=True)
     sender = models.ForeignKey(MessageProfile, db_index=True)
     message = models.TextField()
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
 
     objects = PrivateMessageManager()
+
+
+class InboxCursor(DateCursor):
+    """
+    A position in a user's list of message threads.
+    """
+    date_field = 'last_message_at'
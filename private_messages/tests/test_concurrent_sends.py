@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Tests sending messages is atomic and safe when users message each other at the same time.
+"""
+from contextlib import contextmanager
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from django.contrib.auth import get_user_model
+from django.db import connection, OperationalError
+from django.test import TransactionTestCase, skipIfDBFeature, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from notifications.models import Notification
+from private_messages.models import MessageThread, PrivateMessage
+from rpg_auth.tests.utils import CreateUserMixin
+
+
+@contextmanager
+def sqlite_file_database():
+    """
+    Copies the in-memory SQLite test database to a file and points connections opened by other threads
+    at it, so threads share a database. The calling thread keeps using the in-memory database.
+    """
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'db.sqlite3')
+    connection.cursor().execute('VACUUM INTO %s', [path])
+    name = connection.settings_dict['NAME']
+    connection.settings_dict['NAME'] = path
+    try:
+        yield path
+    finally:
+        connection.settings_dict['NAME'] = name
+        shutil.rmtree(directory)
+
+
+class SendMessageStatementsTestCase(CreateUserMixin):
+    """
+    Tests the number of statements used to send a message.
+    """
+    def setUp(self):
+        super(SendMessageStatementsTestCase, self).setUp()
+        self.user2 = get_user_model().objects.create_user(
+            pen_name='User 2', password='password', email='user_2@example.com'
+        )
+
+    def count_send_queries(self):
+        """
+        Returns the number of queries used to send a message from user to user2.
+        """
+        with CaptureQueriesContext(connection) as context:
+            self.user.message_profile.send_message(message_profile=self.user2.message_profile, message='Test')
+        return len(context.captured_queries)
+
+    def test_send_uses_fixed_number_of_statements(self):
+        """
+        Sending to an existing thread uses the same number of statements however long the thread is.
+        """
+        self.count_send_queries()
+        second = self.count_send_queries()
+        for i in range(5):
+            self.count_send_queries()
+        self.assertEquals(self.count_send_queries(), second)
+
+    def test_interleaved_sends_keep_threads_consistent(self):
+        """
+        Users messaging each other back and forth keep one thread each, accurate counts and one
+        unseen notification each.
+        """
+        for i in range(10):
+            self.user.message_profile.send_message(message_profile=self.user2.message_profile, message='A')
+            self.user2.message_profile.send_message(message_profile=self.user.message_profile, message='B')
+        self.assertEquals(MessageThread.objects.count(), 2)
+        self.assertEquals(set(MessageThread.objects.values_list('message_count', flat=True)), {20})
+        self.assertEquals(self.user.notification_profile.unseen_notifications.count(), 1)
+        self.assertEquals(self.user2.notification_profile.unseen_notifications.count(), 1)
+
+
+class ConcurrentSendMessageTestCase(TransactionTestCase):
+    """
+    Sends messages from several threads at once. Needs a database with row level locking, or SQLite,
+    which serializes the writes of its connections.
+    """
+    sends_per_thread = 10
+    max_attempts = 100
+
+    def setUp(self):
+        super(ConcurrentSendMessageTestCase, self).setUp()
+        self.user1 = get_user_model().objects.create_user(
+            pen_name='User 1', password='password', email='user_1@example.com'
+        )
+        self.user2 = get_user_model().objects.create_user(
+            pen_name='User 2', password='password', email='user_2@example.com'
+        )
+
+    def send_messages(self, from_user, to_user, errors, retry_locked=False):
+        """
+        Sends messages and records any errors. If retry_locked is set a send that fails because another
+        connection holds the database's write lock is tried again.
+        """
+        try:
+            for i in range(self.sends_per_thread):
+                for attempt in range(self.max_attempts):
+                    try:
+                        from_user.message_profile.send_message(message_profile=to_user.message_profile, message='Test')
+                        break
+                    except OperationalError as e:
+                        if not retry_locked or 'database is locked' not in str(e) or attempt + 1 == self.max_attempts:
+                            raise
+                        time.sleep(random.random() / 100)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def send_at_once(self, retry_locked=False):
+        """
+        Sends messages from user1 to user2 and user2 to user1 in two threads at once.
+
+        :type retry_locked: bool
+        :return: The errors raised by either thread.
+        :rtype: list[Exception]
+        """
+        errors = []
+        threads = [
+            threading.Thread(target=self.send_messages, args=(self.user1, self.user2, errors, retry_locked)),
+            threading.Thread(target=self.send_messages, args=(self.user2, self.user1, errors, retry_locked)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    @staticmethod
+    def count_rows():
+        """
+        Counts the threads, messages and unseen notifications.
+
+        :return: The number of threads, messages and unseen notifications, and the thread message counts.
+        :rtype: (int, int, int, set[int])
+        """
+        return (
+            MessageThread.objects.count(),
+            PrivateMessage.objects.count(),
+            Notification.objects.filter(date_seen__isnull=True).count(),
+            set(MessageThread.objects.values_list('message_count', flat=True)),
+        )
+
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_users_messaging_each_other_at_once(self):
+        """
+        Simultaneous sends in both directions do not create duplicate threads or notifications.
+        """
+        self.assertEquals(self.send_at_once(), [])
+        self.assertEquals(self.count_rows(), (2, self.sends_per_thread * 4, 2, {self.sends_per_thread * 2}))
+
+    @skipIfDBFeature('has_select_for_update')
+    def test_users_messaging_each_other_at_once_on_sqlite(self):
+        """
+        Simultaneous sends in both directions, from separate connections to a SQLite file, do not create
+        duplicate threads or notifications. SQLite fails a transaction that cannot take the write lock rather
+        than waiting for it when waiting could deadlock, so those sends are tried again, as a client would.
+        """
+        if connection.vendor != 'sqlite':
+            self.skipTest('Needs SQLite')
+        with sqlite_file_database():
+            self.assertEquals(self.send_at_once(retry_locked=True), [])
+            counts = []
+            counter = threading.Thread(target=lambda: counts.append(self.count_rows()) or connection.close())
+            counter.start()
+            counter.join()
+        self.assertEquals(counts, [(2, self.sends_per_thread * 4, 2, {self.sends_per_thread * 2})])
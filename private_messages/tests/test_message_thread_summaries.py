@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the summaries stored on message threads.
+"""
+from StringIO import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test.utils import override_settings
+from freezegun import freeze_time
+from private_messages.models import MessageThread
+from rpg_auth.tests.utils import CreateUserMixin
+
+
+class MessageThreadSummaryTestCase(CreateUserMixin):
+    """
+    Tests message threads keep their count and last message up to date.
+    """
+    def setUp(self):
+        super(MessageThreadSummaryTestCase, self).setUp()
+        self.other_users = [
+            get_user_model().objects.create_user(
+                pen_name='User {0}'.format(i), password='password', email='user_{0}@example.com'.format(i)
+            )
+            for i in range(5)
+        ]
+
+    def send_messages(self):
+        """
+        Each other user messages the user on a different day.
+        """
+        for i, other_user in enumerate(self.other_users):
+            with freeze_time('2000-01-0{0}'.format(i + 1)):
+                other_user.message_profile.send_message(message_profile=self.user.message_profile, message='Test')
+
+    def test_sending_updates_summary(self):
+        """
+        Sending messages updates both threads.
+        """
+        self.user.message_profile.send_message(message_profile=self.other_users[0].message_profile, message='One')
+        _, sent_message = self.user.message_profile.send_message(
+            message_profile=self.other_users[0].message_profile, message='Two'
+        )
+        thread = self.user.message_profile.threads.get()
+        self.assertEquals(thread.message_count, 2)
+        self.assertEquals(thread.last_message, sent_message)
+        self.assertEquals(thread.last_message_at, sent_message.date_created)
+        self.assertEquals(self.other_users[0].message_profile.threads.get().message_count, 2)
+
+    @override_settings(PRIVATE_MESSAGES_SINGLE_COPY=True)
+    def test_single_copy_updates_both_threads(self):
+        """
+        With single copy messages both threads point at the one message.
+        """
+        received_message, _ = self.user.message_profile.send_message(
+            message_profile=self.other_users[0].message_profile, message='One'
+        )
+        self.assertEquals(
+            list(MessageThread.objects.values_list('message_count', 'last_message')),
+            [(1, received_message.pk), (1, received_message.pk)]
+        )
+
+    def test_inbox_pages_by_cursor(self):
+        """
+        The inbox can be paged through, most recent first, without repeating threads.
+        """
+        self.send_messages()
+        threads, before = self.user.message_profile.get_message_thread_page(page_size=2)
+        seen = list(threads)
+        while before is not None:
+            threads, before = self.user.message_profile.get_message_thread_page(before=before, page_size=2)
+            seen.extend(threads)
+        self.assertEquals(
+            [thread.other_message_profile for thread in seen],
+            [other_user.message_profile for other_user in reversed(self.other_users)]
+        )
+
+    def test_inbox_page_is_one_query(self):
+        """
+        A page of the inbox, including who the threads are with, is a single query.
+        """
+        self.send_messages()
+        with self.assertNumQueries(1):
+            threads, _ = self.user.message_profile.get_message_thread_page(page_size=3)
+            [thread.other_message_profile.user.pen_name for thread in threads]
+
+    def test_summaries_can_be_rebuilt(self):
+        """
+        The rebuild command recalculates the summaries.
+        """
+        self.send_messages()
+        MessageThread.objects.update(message_count=0, last_message=None, last_message_at=None)
+        call_command('rebuild_message_thread_summaries', stdout=StringIO())
+        self.assertEquals(set(MessageThread.objects.values_list('message_count', flat=True)), {1})
+        self.assertFalse(MessageThread.objects.filter(last_message__isnull=True).exists())
+
+    @override_settings(PRIVATE_MESSAGES_SINGLE_COPY=True)
+    def test_deleting_messages_resets_summary(self):
+        """
+        Deleting the messages in a thread empties its summary for the owner only, and later messages are counted.
+        """
+        with freeze_time('2000-01-01'):
+            self.user.message_profile.send_message(message_profile=self.other_users[0].message_profile, message='One')
+        with freeze_time('2000-01-02'):
+            self.user.message_profile.threads.get().delete_messages()
+        thread = self.user.message_profile.threads.get()
+        self.assertEquals((thread.message_count, thread.last_message, thread.last_message_at), (0, None, None))
+        self.assertEquals(self.other_users[0].message_profile.threads.get().message_count, 1)
+        with freeze_time('2000-01-03'):
+            received_message, _ = self.other_users[0].message_profile.send_message(
+                message_profile=self.user.message_profile, message='Two'
+            )
+        thread = self.user.message_profile.threads.get()
+        self.assertEquals((thread.message_count, thread.last_message), (1, received_message))
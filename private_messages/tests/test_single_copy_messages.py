@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Tests storing each private message once per conversation.
+"""
+from StringIO import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test.utils import override_settings
+from private_messages.models import PrivateMessage, MessageThread
+from rpg_auth.tests.utils import CreateUserMixin
+
+
+class SingleCopyTestCaseStub(CreateUserMixin):
+    """
+    Provides a second user to message.
+    """
+    def setUp(self):
+        super(SingleCopyTestCaseStub, self).setUp()
+        self.user2 = get_user_model().objects.create_user(
+            pen_name='User 2',
+            password='password',
+            email='user_2@example.com',
+            is_active=True,
+        )
+
+    def send_messages(self):
+        """
+        Sends messages back and forth between the users.
+        """
+        self.user.message_profile.send_message(message_profile=self.user2.message_profile, message='One')
+        self.user2.message_profile.send_message(message_profile=self.user.message_profile, message='Two')
+        self.user.message_profile.send_message(message_profile=self.user2.message_profile, message='One')
+
+
+@override_settings(PRIVATE_MESSAGES_SINGLE_COPY=True)
+class SingleCopyMessagesTestCase(SingleCopyTestCaseStub):
+    """
+    Tests the single copy layout.
+    """
+    def test_message_stored_once(self):
+        """
+        Sending a message stores it once and it is both the received and sent message.
+        """
+        received_message, sent_message = self.user.message_profile.send_message(
+            message_profile=self.user2.message_profile, message='Test'
+        )
+        self.assertEquals(received_message, sent_message)
+        self.assertEquals(PrivateMessage.objects.count(), 1)
+        self.assertEquals(list(self.user2.message_profile.received_messages), [received_message])
+        self.assertEquals(list(self.user.message_profile.sent_messages), [sent_message])
+        self.assertEquals(self.user.message_profile.received_messages.count(), 0)
+
+    def test_threads_share_a_conversation(self):
+        """
+        Both users' threads point at the same conversation.
+        """
+        self.send_messages()
+        thread1 = self.user.message_profile.threads.get()
+        thread2 = self.user2.message_profile.threads.get()
+        self.assertEquals(thread1.conversation, thread2.conversation)
+        self.assertEquals(thread1.visible_messages.count(), 3)
+        self.assertEquals(self.user.message_profile.message_threads[0].message_count, 3)
+
+    def test_deleting_only_affects_owner(self):
+        """
+        A user deleting messages hides them from that user only.
+        """
+        self.send_messages()
+        self.user2.message_profile.threads.get().delete_messages()
+        self.assertEquals(self.user2.message_profile.received_messages.count(), 0)
+        self.assertEquals(self.user.message_profile.threads.get().visible_messages.count(), 3)
+        self.assertEquals(self.user.message_profile.sent_messages.count(), 2)
+
+    def test_notification_follows_conversation(self):
+        """
+        Repeated messages in the conversation update the one unseen notification.
+        """
+        self.send_messages()
+        self.assertEquals(self.user.notification_profile.unseen_notifications.count(), 1)
+
+
+class ConvertToSingleCopyTestCase(SingleCopyTestCaseStub):
+    """
+    Tests the duplicated layout can be converted.
+    """
+    def test_conversion_keeps_one_copy(self):
+        """
+        Converting removes the duplicate copies and keeps every message and notification.
+        """
+        self.send_messages()
+        self.assertEquals(PrivateMessage.objects.count(), 6)
+        call_command('convert_to_single_copy_messages', stdout=StringIO())
+        self.assertEquals(PrivateMessage.objects.count(), 3)
+        self.assertFalse(MessageThread.objects.filter(conversation__isnull=True).exists())
+        self.assertEquals(self.user.notification_profile.unseen_notifications.count(), 1)
+        self.assertEquals(self.user2.notification_profile.unseen_notifications.count(), 1)
+        with self.settings(PRIVATE_MESSAGES_SINGLE_COPY=True):
+            self.assertEquals(self.user.message_profile.sent_messages.count(), 2)
+            self.assertEquals(self.user.message_profile.received_messages.count(), 1)
+            self.assertEquals(
+                sorted(self.user2.message_profile.threads.get().visible_messages.values_list('message', flat=True)),
+                ['One', 'One', 'Two']
+            )
+
+    def test_conversion_is_idempotent(self):
+        """
+        Running the conversion twice does nothing the second time.
+        """
+        self.send_messages()
+        call_command('convert_to_single_copy_messages', stdout=StringIO())
+        call_command('convert_to_single_copy_messages', stdout=StringIO())
+        self.assertEquals(PrivateMessage.objects.count(), 3)
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""
+Admin pages for the SQL profiles, so the hot views can be found without a shell.
+"""
+from django.contrib import admin
+from profiling.models import QueryFingerprint, ViewProfile
+
+
+class ViewProfileAdmin(admin.ModelAdmin):
+    """
+    Lists the profile of each view per hour.
+    """
+    list_display = (
+        'url_name', 'period_start', 'request_count', 'average_queries', 'max_query_count', 'duplicate_query_count',
+        'average_db_ms', 'average_template_ms',
+    )
+    list_filter = ('url_name', )
+    date_hierarchy = 'period_start'
+    search_fields = ('url_name', )
+
+
+class QueryFingerprintAdmin(admin.ModelAdmin):
+    """
+    Lists the queries views have run many times in one request.
+    """
+    list_display = ('url_name', 'fingerprint', 'max_repeats', 'request_count', 'last_seen')
+    list_filter = ('url_name', )
+    ordering = ('-max_repeats', )
+    search_fields = ('url_name', 'fingerprint')
+    readonly_fields = ('url_name', 'fingerprint_hash', 'fingerprint', 'sample_sql', 'last_seen')
+
+
+admin.site.register(ViewProfile, ViewProfileAdmin)
+admin.site.register(QueryFingerprint, QueryFingerprintAdmin)
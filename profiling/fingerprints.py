@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+Reduces SQL to a fingerprint, so the same query run with different parameters can be
+recognised. Literals are replaced with ? and IN lists collapsed, so a query run once per
+object in a loop gives the same fingerprint each time.
+"""
+from __future__ import unicode_literals
+import hashlib
+import re
+
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    :type sql: unicode
+    :rtype: unicode
+    """
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('(...)', sql)
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+def fingerprint_hash(fingerprinted_sql):
+    """
+    A short hash of a fingerprint to index it by.
+
+    :type fingerprinted_sql: unicode
+    :rtype: unicode
+    """
+    return hashlib.md5(fingerprinted_sql.encode('utf-8')).hexdigest()
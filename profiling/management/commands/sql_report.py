@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Reports the views that run the most SQL, and the queries they repeat, over a recent window.
+"""
+from datetime import timedelta
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from profiling.models import QueryFingerprint, ViewProfile
+
+
+ORDERS = {
+    'queries': '-queries',
+    'db_time': '-total_db_time',
+    'template_time': '-total_template_time',
+    'requests': '-requests',
+}
+
+
+class Command(BaseCommand):
+    """
+    Prints the SQL profile report.
+    """
+    help = 'Reports the SQL run by each view, and queries repeated within a request, over the last few hours.'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--hours',
+            dest='hours',
+            type='int',
+            default=24,
+            help='How many hours back to report on. Defaults to 24.',
+        ),
+        make_option(
+            '--order',
+            dest='order',
+            default='queries',
+            choices=sorted(ORDERS),
+            help='What to order views by: {0}.'.format(', '.join(sorted(ORDERS))),
+        ),
+        make_option(
+            '--limit',
+            dest='limit',
+            type='int',
+            default=20,
+            help='How many views and queries to list.',
+        ),
+        make_option(
+            '--prune',
+            action='store_true',
+            dest='prune',
+            default=False,
+            help='Delete profiles older than the window after reporting.',
+        ),
+    )
+
+    def handle(self, *args, **options):
+        """
+        :type args: []
+        :type options: {}
+        """
+        since = timezone.now() - timedelta(hours=options['hours'])
+        self.stdout.write('{0:<40} {1:>8} {2:>8} {3:>6} {4:>6} {5:>9} {6:>9}'.format(
+            'View', 'Requests', 'Queries', 'Max', 'Dupes', 'DB ms', 'Tmpl ms'
+        ))
+        for view in ViewProfile.objects.summarise(since, ORDERS[options['order']])[:options['limit']]:
+            requests = view['requests']
+            self.stdout.write('{0:<40} {1:>8} {2:>8.1f} {3:>6} {4:>6.1f} {5:>9.1f} {6:>9.1f}'.format(
+                view['url_name'],
+                requests,
+                float(view['queries']) / requests,
+                view['max_queries'],
+                float(view['duplicate_queries']) / requests,
+                view['total_db_time'] * 1000 / requests,
+                view['total_template_time'] * 1000 / requests,
+            ))
+
+        repeated = QueryFingerprint.objects.filter_seen_since(since)[:options['limit']]
+        if repeated:
+            self.stdout.write('')
+            self.stdout.write('Possible N+1 queries:')
+            for query in repeated:
+                self.stdout.write('{0}: run up to {1} times in {2} requests\n    {3}'.format(
+                    query.url_name, query.max_repeats, query.request_count, query.fingerprint
+                ))
+
+        if options['prune']:
+            ViewProfile.objects.filter(period_start__lt=since).delete()
+            QueryFingerprint.objects.filter(last_seen__lt=since).delete()
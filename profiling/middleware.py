@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Middleware that profiles the SQL run by each request.
+
+It is only used if settings.SQL_PROFILING is True. When it is, every request has its queries
+logged, so it should be turned on for as long as a profile is needed rather than left on.
+It should be the first middleware, so the queries of every other middleware are included.
+"""
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from profiling.recorder import RequestRecorder, profile_buffer
+
+
+class SqlProfilingMiddleware(object):
+    """
+    Records the query count, repeated queries, database time and template time of each request
+    and adds them to the profile of its view.
+    """
+    def __init__(self):
+        super(SqlProfilingMiddleware, self).__init__()
+        if not getattr(settings, 'SQL_PROFILING', False):
+            raise MiddlewareNotUsed()
+
+    def process_request(self, request):
+        """
+        :type request: HttpRequest
+        """
+        request.sql_recorder = RequestRecorder()
+        request.sql_recorder.start()
+
+    def process_template_response(self, request, response):
+        """
+        :type request: HttpRequest
+        :type response: TemplateResponse
+        """
+        recorder = getattr(request, 'sql_recorder', None)
+        if recorder is not None:
+            recorder.start_render(response)
+        return response
+
+    def process_response(self, request, response):
+        """
+        :type request: HttpRequest
+        :type response: HttpResponse
+        """
+        recorder = getattr(request, 'sql_recorder', None)
+        if recorder is not None:
+            del request.sql_recorder
+            profile_buffer.add(recorder.stop(request))
+        return response
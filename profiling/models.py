@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Models for the SQL profile of each view. Requests are added up per URL name per hour, and
+queries a view runs over and over in one request are kept so they can be looked into.
+"""
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Max, QuerySet, Sum
+from model_utils.managers import PassThroughManager
+from profiling.fingerprints import fingerprint_hash
+
+
+class ViewProfileManager(QuerySet):
+    """
+    Manager methods for view profiles.
+    """
+    def record(self, url_name, period_start, requests, queries, duplicate_queries, max_queries, db_time,
+               template_time, total_time):
+        """
+        Adds requests to the profile of a view for a period, creating it if needed.
+
+        :type url_name: unicode
+        :type period_start: datetime
+        :type requests: int
+        :type queries: int
+        :type duplicate_queries: int
+        :type max_queries: int
+        :type db_time: float
+        :type template_time: float
+        :type total_time: float
+        """
+        profile = self.filter(url_name=url_name, period_start=period_start)
+        updates = dict(
+            request_count=F('request_count') + requests,
+            query_count=F('query_count') + queries,
+            duplicate_query_count=F('duplicate_query_count') + duplicate_queries,
+            db_time=F('db_time') + db_time,
+            template_time=F('template_time') + template_time,
+            total_time=F('total_time') + total_time,
+        )
+        if not profile.update(**updates):
+            try:
+                with transaction.atomic():
+                    self.create(url_name=url_name, period_start=period_start)
+            except IntegrityError:
+                pass
+            profile.update(**updates)
+        profile.filter(max_query_count__lt=max_queries).update(max_query_count=max_queries)
+
+    def summarise(self, since, order_by='-queries'):
+        """
+        Adds up the profiles of each view since a time.
+
+        :type since: datetime
+        :param order_by: One of the annotations, e.g. -queries or -db_time
+        :type order_by: unicode
+        :rtype: list[{}]
+        """
+        return list(self.filter(period_start__gte=since).values('url_name').annotate(
+            requests=Sum('request_count'),
+            queries=Sum('query_count'),
+            duplicate_queries=Sum('duplicate_query_count'),
+            max_queries=Max('max_query_count'),
+            total_db_time=Sum('db_time'),
+            total_template_time=Sum('template_time'),
+            total_time=Sum('total_time'),
+        ).order_by(order_by, 'url_name'))
+
+
+class ViewProfile(models.Model):
+    """
+    The SQL run by a view over an hour, added up across its requests. Times are in seconds.
+    """
+    url_name = models.CharField(max_length=200)
+    period_start = models.DateTimeField(db_index=True)
+    request_count = models.IntegerField(default=0)
+    query_count = models.IntegerField(default=0)
+    duplicate_query_count = models.IntegerField(default=0)
+    max_query_count = models.IntegerField(default=0)
+    db_time = models.FloatField(default=0)
+    template_time = models.FloatField(default=0)
+    total_time = models.FloatField(default=0)
+
+    objects = PassThroughManager.for_queryset_class(ViewProfileManager)()
+
+    class Meta(object):
+        """
+        Meta properties
+        """
+        unique_together = [('url_name', 'period_start')]
+        ordering = ['-period_start', 'url_name']
+
+    def __unicode__(self):
+        return u'{0} at {1}'.format(self.url_name, self.period_start)
+
+    @property
+    def average_queries(self):
+        return float(self.query_count) / self.request_count if self.request_count else 0.0
+
+    @property
+    def average_db_ms(self):
+        return self.db_time * 1000 / self.request_count if self.request_count else 0.0
+
+    @property
+    def average_template_ms(self):
+        return self.template_time * 1000 / self.request_count if self.request_count else 0.0
+
+
+class QueryFingerprintManager(QuerySet):
+    """
+    Manager methods for query fingerprints.
+    """
+    def record(self, url_name, fingerprint, sample_sql, requests, max_repeats, last_seen):
+        """
+        Records that a view ran a query many times in one or more requests.
+
+        :type url_name: unicode
+        :type fingerprint: unicode
+        :type sample_sql: unicode
+        :param requests: The number of requests the query was repeated in
+        :type requests: int
+        :param max_repeats: The most times it was run in one request
+        :type max_repeats: int
+        :type last_seen: datetime
+        """
+        flagged = self.filter(url_name=url_name, fingerprint_hash=fingerprint_hash(fingerprint))
+        updates = dict(request_count=F('request_count') + requests, last_seen=last_seen, sample_sql=sample_sql)
+        if not flagged.update(**updates):
+            try:
+                with transaction.atomic():
+                    self.create(
+                        url_name=url_name,
+                        fingerprint_hash=fingerprint_hash(fingerprint),
+                        fingerprint=fingerprint,
+                        sample_sql=sample_sql,
+                        last_seen=last_seen,
+                    )
+            except IntegrityError:
+                pass
+            flagged.update(**updates)
+        flagged.filter(max_repeats__lt=max_repeats).update(max_repeats=max_repeats)
+
+    def filter_seen_since(self, since):
+        """
+        :type since: datetime
+        """
+        return self.filter(last_seen__gte=since).order_by('-max_repeats', 'url_name')
+
+
+class QueryFingerprint(models.Model):
+    """
+    A query a view ran many times in a single request. This is usually an N+1 pattern, where
+    a query is run for each object in a list that could have been loaded with the list.
+    """
+    url_name = models.CharField(max_length=200)
+    fingerprint_hash = models.CharField(max_length=32)
+    fingerprint = models.TextField()
+    sample_sql = models.TextField()
+    request_count = models.IntegerField(default=0)
+    max_repeats = models.IntegerField(default=0)
+    last_seen = models.DateTimeField(db_index=True)
+
+    objects = PassThroughManager.for_queryset_class(QueryFingerprintManager)()
+
+    class Meta(object):
+        """
+        Meta properties
+        """
+        unique_together = [('url_name', 'fingerprint_hash')]
+
+    def __unicode__(self):
+        return self.fingerprint
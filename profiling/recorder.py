@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Records the SQL run during a request, and buffers the profiles of requests so they are
+written to the database in batches rather than once per request.
+"""
+from __future__ import unicode_literals
+import threading
+import time
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from profiling.fingerprints import fingerprint
+
+
+class QueryRecorder(object):
+    """
+    Records the queries run on every database connection between start and stop. The
+    connections log their queries while recording, even when DEBUG is off.
+    """
+    def __init__(self):
+        super(QueryRecorder, self).__init__()
+        self.states = []
+
+    def start(self):
+        """
+        Starts logging queries on every connection.
+        """
+        self.states = [
+            (connection, connection.use_debug_cursor, len(connection.queries)) for connection in connections.all()
+        ]
+        for connection, use_debug_cursor, start in self.states:
+            connection.use_debug_cursor = True
+
+    def stop(self):
+        """
+        :return: The queries recorded, as dicts of sql and time.
+        :rtype: list[{}]
+        """
+        queries = []
+        for connection, use_debug_cursor, start in self.states:
+            queries.extend(connection.queries[start:])
+            connection.use_debug_cursor = use_debug_cursor
+        self.states = []
+        return queries
+
+
+class RequestProfile(object):
+    """
+    The SQL and timings of a single request.
+    """
+    def __init__(self, url_name, queries, total_time, template_time):
+        """
+        :type url_name: unicode
+        :param queries: Dicts of sql and time, as logged by the connection.
+        :type queries: list[{}]
+        :type total_time: float
+        :type template_time: float
+        """
+        super(RequestProfile, self).__init__()
+        self.url_name = url_name
+        self.queries = queries
+        self.total_time = total_time
+        self.template_time = template_time
+        self.fingerprints = {}
+        for query in queries:
+            key = fingerprint(query['sql'])
+            count, sample = self.fingerprints.get(key, (0, query['sql']))
+            self.fingerprints[key] = (count + 1, sample)
+
+    @property
+    def query_count(self):
+        return len(self.queries)
+
+    @property
+    def db_time(self):
+        return sum(float(query['time']) for query in self.queries)
+
+    @property
+    def duplicate_query_count(self):
+        """
+        The number of queries that repeat a query already run in the request.
+        """
+        return sum(count - 1 for count, sample in self.fingerprints.values())
+
+    def find_repeated(self, threshold):
+        """
+        Returns the fingerprints run at least threshold times, which usually means a query
+        is being run once per object in a loop.
+
+        :type threshold: int
+        :return: Dict of fingerprint to (times run, an example of the SQL).
+        :rtype: {}
+        """
+        return dict((key, value) for key, value in self.fingerprints.items() if value[0] >= threshold)
+
+
+class RequestRecorder(object):
+    """
+    Times a request, the rendering of its template and records its queries.
+    """
+    def __init__(self):
+        super(RequestRecorder, self).__init__()
+        self.queries = QueryRecorder()
+        self.started = None
+        self.render_started = None
+        self.template_time = 0.0
+
+    def start(self):
+        """
+        Starts timing the request and recording its queries.
+        """
+        self.started = time.time()
+        self.queries.start()
+
+    def start_render(self, response):
+        """
+        Times the rendering of a TemplateResponse.
+
+        :type response: TemplateResponse
+        """
+        self.render_started = time.time()
+        response.add_post_render_callback(self.finish_render)
+
+    def finish_render(self, response):
+        """
+        Called once the response has been rendered.
+
+        :type response: TemplateResponse
+        """
+        del response
+        self.template_time += time.time() - self.render_started
+
+    def stop(self, request):
+        """
+        :type request: HttpRequest
+        :rtype: RequestProfile
+        """
+        resolver_match = getattr(request, 'resolver_match', None)
+        return RequestProfile(
+            url_name=resolver_match.view_name if resolver_match else '<unresolved>',
+            queries=self.queries.stop(),
+            total_time=time.time() - self.started,
+            template_time=self.template_time,
+        )
+
+
+class ProfileBuffer(object):
+    """
+    Adds up the profiles of requests by URL name and writes them to the database once enough
+    requests have been profiled, or enough time has passed since they were last written.
+    """
+    def __init__(self):
+        super(ProfileBuffer, self).__init__()
+        self.lock = threading.Lock()
+        self.views = {}
+        self.repeated = {}
+        self.pending = 0
+        self.last_flushed = time.time()
+
+    @property
+    def flush_size(self):
+        return getattr(settings, 'SQL_PROFILING_FLUSH_SIZE', 50)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'SQL_PROFILING_FLUSH_INTERVAL', 60)
+
+    @property
+    def n_plus_one_threshold(self):
+        return getattr(settings, 'SQL_PROFILING_N_PLUS_ONE_THRESHOLD', 5)
+
+    def add(self, profile):
+        """
+        Adds a request's profile, writing the buffer if it is due.
+
+        :type profile: RequestProfile
+        """
+        with self.lock:
+            view = self.views.setdefault(profile.url_name, {
+                'requests': 0, 'queries': 0, 'duplicate_queries': 0, 'max_queries': 0,
+                'db_time': 0.0, 'template_time': 0.0, 'total_time': 0.0,
+            })
+            view['requests'] += 1
+            view['queries'] += profile.query_count
+            view['duplicate_queries'] += profile.duplicate_query_count
+            view['max_queries'] = max(view['max_queries'], profile.query_count)
+            view['db_time'] += profile.db_time
+            view['template_time'] += profile.template_time
+            view['total_time'] += profile.total_time
+            for key, (count, sample) in profile.find_repeated(self.n_plus_one_threshold).items():
+                requests, max_repeats, sample = self.repeated.get((profile.url_name, key), (0, 0, sample))
+                self.repeated[(profile.url_name, key)] = (requests + 1, max(max_repeats, count), sample)
+            self.pending += 1
+            due = self.pending >= self.flush_size or time.time() - self.last_flushed >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered profiles to the database.
+        """
+        from profiling.models import QueryFingerprint, ViewProfile
+        with self.lock:
+            views, self.views = self.views, {}
+            repeated, self.repeated = self.repeated, {}
+            self.pending = 0
+            self.last_flushed = time.time()
+        now = timezone.now()
+        period_start = now.replace(minute=0, second=0, microsecond=0)
+        with transaction.atomic():
+            for url_name, view in views.items():
+                ViewProfile.objects.record(url_name, period_start, **view)
+            for (url_name, key), (requests, max_repeats, sample) in repeated.items():
+                QueryFingerprint.objects.record(url_name, key, sample, requests, max_repeats, now)
+
+
+profile_buffer = ProfileBuffer()
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the SQL profiling middleware and report.
+"""
+from StringIO import StringIO
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from characters.tests.utils import CharacterUtils
+from profiling.fingerprints import fingerprint
+from profiling.models import QueryFingerprint, ViewProfile
+from profiling.recorder import RequestProfile, profile_buffer
+from quests.tests.utils import QuestUtils
+from rpg_auth.tests.utils import CreateUserMixin
+
+
+class FingerprintTestCase(TestCase):
+    """
+    Tests queries are reduced to fingerprints.
+    """
+    def test_literals_are_replaced(self):
+        """
+        The same query with different parameters has the same fingerprint.
+        """
+        self.assertEquals(
+            fingerprint('SELECT "a"."id" FROM "a" WHERE "a"."id" = 12 AND "a"."name" = \'Bob\''),
+            fingerprint('SELECT "a"."id"  FROM "a" WHERE "a"."id" = 7 AND "a"."name" = \'It\'\'s\''),
+        )
+
+    def test_in_lists_are_collapsed(self):
+        """
+        IN lists of any length have the same fingerprint.
+        """
+        self.assertEquals(
+            fingerprint('SELECT * FROM "a" WHERE "a"."id" IN (1, 2, 3)'),
+            'SELECT * FROM "a" WHERE "a"."id" IN (...)',
+        )
+
+    def test_repeated_queries_are_found(self):
+        """
+        Queries run at least the threshold number of times are reported as repeated.
+        """
+        queries = [{'sql': 'SELECT * FROM "a" WHERE "a"."id" = {0}'.format(i), 'time': '0.001'} for i in range(5)]
+        queries.append({'sql': 'SELECT * FROM "b"', 'time': '0.002'})
+        profile = RequestProfile('quests:quest_detail', queries, total_time=0.1, template_time=0.0)
+        self.assertEquals(profile.query_count, 6)
+        self.assertEquals(profile.duplicate_query_count, 4)
+        self.assertAlmostEquals(profile.db_time, 0.007)
+        self.assertEquals(
+            profile.find_repeated(5),
+            {'SELECT * FROM "a" WHERE "a"."id" = ?': (5, 'SELECT * FROM "a" WHERE "a"."id" = 0')},
+        )
+        self.assertEquals(profile.find_repeated(6), {})
+
+
+@override_settings(SQL_PROFILING=True, SQL_PROFILING_FLUSH_SIZE=1, SQL_PROFILING_N_PLUS_ONE_THRESHOLD=2)
+class SqlProfilingMiddlewareTestCase(CreateUserMixin):
+    """
+    Tests requests are profiled by view.
+    """
+    fixtures = ['world-test-data.json']
+
+    def setUp(self):
+        super(SqlProfilingMiddlewareTestCase, self).setUp()
+        self.character = CharacterUtils.create_character(self.user)
+        self.quest = QuestUtils.create_quest(self.user, self.character)
+        self.url = reverse('quests:quest_detail', kwargs={'slug': self.quest.slug})
+
+    def test_requests_are_profiled_by_view(self):
+        """
+        Each request adds to the profile of its view.
+        """
+        self.client.get(self.url)
+        self.client.get(self.url)
+        profile = ViewProfile.objects.get(url_name='quests:quest_detail')
+        self.assertEquals(profile.request_count, 2)
+        self.assertGreater(profile.query_count, 0)
+        self.assertGreaterEqual(profile.max_query_count, profile.query_count / 2)
+        self.assertGreater(profile.template_time, 0)
+        self.assertGreater(profile.total_time, profile.template_time)
+
+    def test_repeated_queries_are_flagged(self):
+        """
+        A query run the threshold number of times in one request is recorded.
+        """
+        self.client.get(self.url)
+        self.assertTrue(QueryFingerprint.objects.filter(url_name='quests:quest_detail').exists())
+
+    def test_profiles_are_buffered(self):
+        """
+        Profiles are only written once the buffer is full.
+        """
+        with self.settings(SQL_PROFILING_FLUSH_SIZE=3):
+            self.client.get(self.url)
+            self.client.get(self.url)
+            self.assertFalse(ViewProfile.objects.exists())
+            self.client.get(self.url)
+        self.assertEquals(ViewProfile.objects.get().request_count, 3)
+
+    def test_report_lists_views(self):
+        """
+        The report lists each view and the queries it repeats.
+        """
+        self.client.get(self.url)
+        out = StringIO()
+        call_command('sql_report', stdout=out)
+        self.assertIn('quests:quest_detail', out.getvalue())
+        self.assertIn('Possible N+1 queries', out.getvalue())
+
+    def test_disabled_by_default(self):
+        """
+        Nothing is recorded unless profiling is turned on.
+        """
+        with self.settings(SQL_PROFILING=False):
+            self.client.get(self.url)
+        profile_buffer.flush()
+        self.assertFalse(ViewProfile.objects.exists())
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Rebuilds, or verifies, the current location of quests and the current quest of characters
+from the QuestLocation and QuestCharacter history.
+"""
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from quests.models import Quest
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the denormalised quest state.
+    """
+    help = 'Rebuilds the current location of quests and current quest of characters from their history.'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--verify',
+            action='store_true',
+            dest='verify',
+            default=False,
+            help='Report stale rows without changing them. Exits with an error if any are found.',
+        ),
+    )
+
+    def handle(self, *args, **options):
+        """
+        :type args: []
+        :type options: {}
+        """
+        if options['verify']:
+            stale_locations, stale_quests = Quest.objects.find_stale_current_state()
+            for quest_pk, location_pk in sorted(stale_locations.items()):
+                self.stdout.write('Quest {0} should be at location {1}'.format(quest_pk, location_pk))
+            for character_pk, quest_pk in sorted(stale_quests.items()):
+                self.stdout.write('Character {0} should be on quest {1}'.format(character_pk, quest_pk))
+            if stale_locations or stale_quests:
+                raise CommandError('{0} quests and {1} characters are stale.'.format(
+                    len(stale_locations), len(stale_quests)
+                ))
+            self.stdout.write('Quest state is up to date.')
+        else:
+            quest_count, character_count = Quest.objects.rebuild_current_state()
+            self.stdout.write('Corrected {0} quests and {1} characters.'.format(quest_count, character_count))
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Runs a threaded server for the quest post streams, alongside the main site and against the
+same database. Route /quest/<slug>/stream/ to it so long lived streams do not tie up the
+workers serving pages.
+"""
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import get_internal_wsgi_application, run
+from quests.streaming import post_poller
+
+
+class Command(BaseCommand):
+    """
+    Serves the post streams.
+    """
+    help = 'Serves the quest post streams, polling for posts made by the main site.'
+    args = '[addr:port]'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--poll-interval',
+            dest='poll_interval',
+            type='float',
+            default=1.0,
+            help='Seconds between polls for new posts. Defaults to 1.',
+        ),
+    )
+
+    def handle(self, addrport='127.0.0.1:8001', *args, **options):
+        """
+        :type addrport: unicode
+        :type args: []
+        :type options: {}
+        """
+        addr, _, port = addrport.rpartition(':')
+        if not port.isdigit():
+            raise CommandError('{0} is not an address and port, e.g. 127.0.0.1:8001'.format(addrport))
+        post_poller.ensure_started(options['poll_interval'])
+        self.stdout.write('Streaming posts on {0}:{1}'.format(addr or '127.0.0.1', port))
+        run(addr or '127.0.0.1', int(port), get_internal_wsgi_application(), threading=True)
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Renders post content to HTML, and caches the result.
+
+Content is escaped, so posts cannot include HTML of their own, and then a small set of BBCode
+tags is converted: [b], [i], [u], [s], [quote] and [url]. The names of characters on the quest
+are linked to a search for them, and line breaks become paragraphs and <br>s.
+
+Rendered posts are kept in a bounded LRU in each process and in the cache named by
+settings.POST_RENDER_CACHE, which defaults to 'default'. The key includes the post's
+date_modified and RENDERER_VERSION, so editing a post, or changing how posts are rendered,
+never serves stale HTML. Posts are rendered when they are saved, so pages normally find
+every post already rendered.
+"""
+from __future__ import unicode_literals
+import re
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches, InvalidCacheBackendError
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.urlresolvers import reverse
+from django.utils.html import escape, linebreaks
+from django.utils.http import urlencode
+from django.utils.safestring import mark_safe
+
+
+# Increase when the output of PostRenderer changes, so posts rendered before are not used.
+RENDERER_VERSION = 2
+
+
+class PostRenderer(object):
+    """
+    Converts post content to HTML.
+    """
+    simple_tags = {'b': 'strong', 'i': 'em', 'u': 'u', 's': 'del', 'quote': 'blockquote'}
+    max_nesting = 10
+    url_re = re.compile(r'\[url=(https?://[^\]\s]+)\](.*?)\[/url\]|\[url\](https?://[^\[\s]+)\[/url\]', re.DOTALL)
+    tag_re = re.compile(r'(<[^>]*>)')
+    entity_re = re.compile(r'&[#\w]+;')
+
+    def __init__(self):
+        super(PostRenderer, self).__init__()
+        self.simple_tag_res = [
+            (re.compile(r'\[{0}\](.*?)\[/{0}\]'.format(tag), re.DOTALL | re.IGNORECASE), html_tag)
+            for tag, html_tag in self.simple_tags.items()
+        ]
+
+    def render(self, content, character_names=()):
+        """
+        :type content: unicode
+        :param character_names: Names to link to
+        :type character_names: list[unicode]
+        :rtype: SafeText
+        """
+        html = escape(content)
+        html = self.convert_tags(html)
+        html = self.link_characters(html, character_names)
+        return mark_safe(linebreaks(html, autoescape=False))
+
+    def convert_tags(self, html):
+        """
+        Converts BBCode tags with a matching close tag. Unmatched tags are left as text.
+
+        :type html: unicode
+        :rtype: unicode
+        """
+        html = self.url_re.sub(self._replace_url, html)
+        for i in range(self.max_nesting):
+            converted = html
+            for tag_re, html_tag in self.simple_tag_res:
+                converted = tag_re.sub(r'<{0}>\1</{0}>'.format(html_tag), converted)
+            if converted == html:
+                break
+            html = converted
+        return html
+
+    @staticmethod
+    def _replace_url(match):
+        href = match.group(1) or match.group(3)
+        text = match.group(2) if match.group(1) else match.group(3)
+        return '<a href="{0}" rel="nofollow">{1}</a>'.format(href, text)
+
+    def link_characters(self, html, character_names):
+        """
+        Links the names of characters wherever they appear as text, outside of any link. The text
+        has been escaped, so entities are matched whole first and names are never found inside them.
+
+        :type html: unicode
+        :type character_names: list[unicode]
+        :rtype: unicode
+        """
+        originals = dict((escape(name), name) for name in character_names if name)
+        names = sorted(originals, key=len, reverse=True)
+        if not names:
+            return html
+        name_re = re.compile(
+            r'{0}|(?<!\w)({1})(?!\w)'.format(self.entity_re.pattern, '|'.join(re.escape(name) for name in names)),
+            re.UNICODE
+        )
+        search_url = reverse('search:search')
+
+        def link(match):
+            if match.group(1) is None:
+                return match.group()
+            query = escape(urlencode({'q': originals[match.group(1)], 'type': 'character'}))
+            return '<a href="{0}?{1}" class="character">{2}</a>'.format(search_url, query, match.group(1))
+        parts = []
+        in_link = False
+        for part in self.tag_re.split(html):
+            if part.startswith('<'):
+                if part.startswith('<a '):
+                    in_link = True
+                elif part == '</a>':
+                    in_link = False
+            elif not in_link:
+                part = name_re.sub(link, part)
+            parts.append(part)
+        return ''.join(parts)
+
+
+post_renderer = PostRenderer()
+
+
+class LruCache(object):
+    """
+    A dict that holds at most max_size items, forgetting the least recently used.
+    """
+    def __init__(self, max_size):
+        """
+        :type max_size: int
+        """
+        super(LruCache, self).__init__()
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                value = self.items.pop(key)
+            except KeyError:
+                return None
+            self.items[key] = value
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items.pop(key, None)
+            self.items[key] = value
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class RenderedPostCache(object):
+    """
+    Renders posts, reading and writing them from the process's LRU and the shared cache.
+    """
+    key_template = 'post:rendered:{0}:{1}:{2}'
+    timeout = 60 * 60 * 24 * 7
+
+    def __init__(self, renderer, cache_alias=None):
+        """
+        :type renderer: PostRenderer
+        :type cache_alias: unicode
+        """
+        super(RenderedPostCache, self).__init__()
+        self.renderer = renderer
+        self.cache_alias = cache_alias
+        self._fallback_cache = None
+        self.local = LruCache(getattr(settings, 'POST_RENDER_LRU_SIZE', 1000))
+
+    @property
+    def cache(self):
+        """
+        The configured cache, or a local memory cache if it does not exist.
+        """
+        try:
+            return caches[self.cache_alias or getattr(settings, 'POST_RENDER_CACHE', 'default')]
+        except InvalidCacheBackendError:
+            if self._fallback_cache is None:
+                self._fallback_cache = LocMemCache('post-render', {})
+            return self._fallback_cache
+
+    def get_key(self, post):
+        """
+        :type post: Post
+        :rtype: unicode
+        """
+        return self.key_template.format(post.pk, post.date_modified.strftime('%Y%m%d%H%M%S%f'), RENDERER_VERSION)
+
+    def get_many(self, posts):
+        """
+        Returns the rendered HTML of each post, rendering any that are not cached. The names of the
+        characters on each quest with a post to render are loaded with one query.
+
+        :type posts: list[Post]
+        :return: Dict of post pk to HTML
+        :rtype: {}
+        """
+        rendered = {}
+        missing = {}
+        for post in posts:
+            key = self.get_key(post)
+            html = self.local.get(key)
+            if html is None:
+                missing[key] = post
+            else:
+                rendered[post.pk] = html
+        if missing:
+            for key, html in self.cache.get_many(missing.keys()).items():
+                self.local.set(key, html)
+                rendered[missing.pop(key).pk] = html
+        if missing:
+            for key, html in self.render_many(missing.values()).items():
+                rendered[missing[key].pk] = html
+        return dict((pk, mark_safe(html)) for pk, html in rendered.items())
+
+    def render_many(self, posts):
+        """
+        Renders the posts and caches them.
+
+        :type posts: list[Post]
+        :return: Dict of cache key to HTML
+        :rtype: {}
+        """
+        from quests.models import QuestCharacter
+        names = {}
+        for quest_pk, name in QuestCharacter.objects.filter(
+            quest__in=set(post.quest_id for post in posts)
+        ).values_list('quest_id', 'character__name').distinct():
+            names.setdefault(quest_pk, []).append(name)
+        rendered = {}
+        for post in posts:
+            key = self.get_key(post)
+            rendered[key] = unicode(self.renderer.render(post.content, names.get(post.quest_id, ())))
+            self.local.set(key, rendered[key])
+        self.cache.set_many(rendered, self.timeout)
+        return rendered
+
+    def prerender(self, posts):
+        """
+        Sets rendered_content on each post from the cache.
+
+        :type posts: list[Post]
+        :return: The posts
+        :rtype: list[Post]
+        """
+        rendered = self.get_many(posts)
+        for post in posts:
+            post.rendered_content = rendered[post.pk]
+        return posts
+
+
+rendered_post_cache = RenderedPostCache(post_renderer)
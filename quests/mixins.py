@@ -2,29 +2,17 @@
 """
 Mixins that can be used for classes that need some default quest behaviour.
 """
-from django.shortcuts import get_object_or_404
 from quests.models import Quest
+from soj.request_cache import RequestObjectCache
 
 
 class QuestFromRequestMixin(object):
     """
-<<<<<<< HEAD
     Loads the quest specified by quest_slug and adds it to the context.
 
     If the quest is invalid then a 404 is raised.
-=======
-<<<<<<< HEAD
-    Loads the quest specified by quest_slug and adds it to the context.
-
-    If the quest is invalid then a 404 is raised.
-=======
-    Loads the location specified by quest_slug and adds it to the context.
-
-    If the location is invalid then a 404 is raised.
->>>>>>> 48b41eb49ce1f5477e1e25b89af36d332dfb3a9f
->>>>>>> quests
     """
-    quest_queryset = Quest.objects.all()
+    quest_queryset = Quest.objects.select_related('gm__user')
 
     def __init__(self):
         super(QuestFromRequestMixin, self).__init__()
@@ -43,19 +31,21 @@ class QuestFromRequestMixin(object):
 
     def get_quest_queryset(self):
         """
-        Gets the character queryset.
+        Gets the quest queryset.
         """
         return self.quest_queryset
 
     def get_quest(self):
         """
-        Gets the location based on the location_slug.
+        Gets the quest based on the quest_slug. The quest is only loaded once per request.
         """
-        return get_object_or_404(self.get_quest_queryset(), slug=self.quest_slug)
+        return RequestObjectCache.for_request(self.request).get(
+            'quest', self.get_quest_queryset(), slug=self.quest_slug
+        )
 
     def get_context_data(self, **kwargs):
         """
-        Adds the location to the context.
+        Adds the quest to the context.
         :type kwargs: {}
         :return: {}
         """
@@ -3,15 +3,32 @@
 Models for the quests app. These models serve as the heart of the game mechanics, drawing
 on all other apps to create the game.
 """
+import uuid
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse
-from django.db import models, IntegrityError
-from django.db.models.signals import post_save
+from django.db import connections, models, transaction, IntegrityError
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
 from django.utils import timezone
-from django.utils.text import slugify
+from model_utils.managers import PassThroughManager
+from tasks import queue_post_notifications
 from characters.models import Character
-from world.models import BaseWorldModel, Location
+from notifications.counters import unseen_notification_counter
+from notifications.models import Notification, NotificationProfile
+from notifications.pubsub import notification_broker
+from notifications.rendering import render_to_string
+from quests.markup import rendered_post_cache
+from quests.streaming import post_channel, serialize_post
+from quests.timeline import TimelineCursor
+from rpg_auth.provisioning import profile_provisioner
+from world.models import BaseWorldModel, Location, LocationActivity
+
+
+class CharacterUnavailable(IntegrityError):
+    """
+    Raised when a character that is already on a quest is added to another.
+    """
 
 
 class QuestProfile(models.Model):
@@ -39,17 +56,7 @@ class QuestProfile(models.Model):
         self.following_quests.remove(quest)
 
 
-def create_quest_profile(sender, **kwargs):
-    """
-    Catches users being created and creates a quest profile for the user.
-
-    :type sender: RpgUser
-    :type kwargs: {}
-    """
-    del sender
-    if kwargs['created']:
-        QuestProfile.objects.create(user=kwargs['instance'])
-post_save.connect(create_quest_profile, sender=settings.AUTH_USER_MODEL)
+profile_provisioner.register(QuestProfile)
 
 
 class QuestManager(models.Manager):
@@ -62,6 +69,61 @@ class QuestManager(models.Manager):
         """
         return self.get(questcharacter__date_departed__isnull=True)
 
+    def find_stale_current_state(self):
+        """
+        Compares the current location of quests, and current quest of characters, with their
+        QuestLocation and QuestCharacter history.
+
+        Returns two dicts, one of quest pk to the location pk it should have, and one of
+        character pk to the quest pk it should have, containing only the rows that are wrong.
+
+        :rtype: ({}, {})
+        """
+        active_locations = dict(
+            QuestLocation.objects.filter(date_departed__isnull=True).values_list('quest_id', 'location_id')
+        )
+        stale_locations = {}
+        for quest_pk, location_pk in self.values_list('pk', 'current_location_id'):
+            if active_locations.get(quest_pk) != location_pk:
+                stale_locations[quest_pk] = active_locations.get(quest_pk)
+
+        active_quests = dict(
+            QuestCharacter.objects.filter(date_departed__isnull=True).values_list('character_id', 'quest_id')
+        )
+        stale_quests = {}
+        for character_pk, quest_pk in Character.objects.values_list('pk', 'current_quest_id'):
+            if active_quests.get(character_pk) != quest_pk:
+                stale_quests[character_pk] = active_quests.get(character_pk)
+        return stale_locations, stale_quests
+
+    @transaction.atomic
+    def rebuild_current_state(self):
+        """
+        Corrects any stale current locations and current quests. Issues one update per distinct
+        value rather than one per row.
+
+        :return: The number of quests and characters corrected.
+        :rtype: (int, int)
+        """
+        stale_locations, stale_quests = self.find_stale_current_state()
+        for location_pk, quest_pks in self._group_by_value(stale_locations).items():
+            self.filter(pk__in=quest_pks).update(current_location=location_pk)
+        for quest_pk, character_pks in self._group_by_value(stale_quests).items():
+            Character.objects.filter(pk__in=character_pks).update(current_quest=quest_pk)
+        return len(stale_locations), len(stale_quests)
+
+    @staticmethod
+    def _group_by_value(mapping):
+        """
+        Inverts a dict to map each value to the list of keys that have it.
+        :type mapping: {}
+        :rtype: {}
+        """
+        grouped = {}
+        for key, value in mapping.items():
+            grouped.setdefault(value, []).append(key)
+        return grouped
+
 
 class Quest(BaseWorldModel):
     """
@@ -72,33 +134,47 @@ class Quest(BaseWorldModel):
     Quests take place in towns and a quest can move in to a new town.
 
     This information is all tracked and dislayed to the user in the style of a timeline.
+
+    The QuestLocation and QuestCharacter rows are the history of the quest. The current
+    location, and each character's current quest, are also stored directly on the quest
+    and character so they can be read without scanning that history. They are kept up
+    to date by move_to_location, add_character and remove_character, and can be rebuilt
+    with the rebuild_quest_state management command.
     """
     title = models.CharField(max_length=100, unique=True)
     gm = models.ForeignKey(QuestProfile)
     locations = models.ManyToManyField(Location, through='QuestLocation', related_name='quests')
     characters = models.ManyToManyField(Character, through='QuestCharacter', related_name='quests')
+    current_location = models.ForeignKey(
+        Location, null=True, blank=True, related_name='active_quests', on_delete=models.SET_NULL
+    )
 
     objects = QuestManager()
 
+    slug_source_field = 'title'
+
     @property
-    def current_location(self):
+    def last_modified(self):
         """
-        Gets the current Location by the one with the most recent date_created.
-        :return: Location
+        When the quest, its roster, its locations or its posts last changed. Changes to the roster,
+        locations and posts are stamped on the quest's date_modified, so it is the same in every
+        process.
+
+        :rtype: datetime
         """
-        current_quest_location = self.current_quest_location
-        return None if current_quest_location is None else current_quest_location.location
+        return self.date_modified
 
     @property
     def current_quest_location(self):
         """
-        Gets the current Location by the one with the most recent date_created.
+        Gets the QuestLocation the quest has not departed.
         """
         try:
             return self.questlocation_set.get_active()
         except ObjectDoesNotExist:
             return None
 
+    @transaction.atomic
     def initialise(self, gm, first_post, location, character):
         """
         Initialises a new quest, setting the location, first character and first post.
@@ -114,26 +190,44 @@ class Quest(BaseWorldModel):
         self.gm.follow_quest(self)
         Post.objects.create(quest=self, character=character, content=first_post, location=location)
 
+    @transaction.atomic
     def move_to_location(self, location):
         """
         Moves a quest to a new location.
         :param location: The Location to move the quest to.
         :type location: Location
         """
-        current_quest_location = self.current_quest_location
-        if current_quest_location is not None:
-            if location == current_quest_location.location:
+        self.lock_current_location()
+        try:
+            current_quest_location = self.questlocation_set.select_for_update().get_active()
+        except ObjectDoesNotExist:
+            from_location_pk = None
+        else:
+            if location.pk == current_quest_location.location_id:
                 raise IntegrityError()
             current_quest_location.date_departed = timezone.now()
             current_quest_location.save()
+            from_location_pk = current_quest_location.location_id
         QuestLocation.objects.create(quest=self, location=location)
+        Quest.objects.filter(pk=self.pk).update(current_location=location)
+        self.current_location = location
+        LocationActivity.objects.record_quest_move(from_location_pk, location.pk, self.active_characters.count())
+
+    def lock_current_location(self):
+        """
+        Locks the quest's row until the end of the transaction, so the quest cannot move while
+        characters join or leave, and returns the pk of its current location.
+
+        :rtype: int | None
+        """
+        return Quest.objects.select_for_update().values_list('current_location_id', flat=True).get(pk=self.pk)
 
     @property
     def current_characters(self):
         """
         Gets characters currently on the quest.
         """
-        return self.characters.filter_active()
+        return self.active_characters.all()
 
     @property
     def former_characters(self):
@@ -142,25 +236,40 @@ class Quest(BaseWorldModel):
         """
         return self.characters.filter_departed()
 
+    @transaction.atomic
     def add_character(self, character):
         """
         Adds a character to a quest.
 
+        A character can only be on one quest at a time. The current quest column is claimed
+        with a conditional update, so of two concurrent joins only one can succeed.
+
         :type character: Character
         """
-        if character in self.current_characters:
-            raise IntegrityError('Character is already on a quest')
+        location_pk = self.lock_current_location()
+        if not Character.objects.filter(pk=character.pk, current_quest__isnull=True).update(current_quest=self):
+            raise CharacterUnavailable('Character is already on a quest')
         QuestCharacter.objects.create(quest=self, character=character)
+        if location_pk is not None:
+            LocationActivity.objects.adjust(location_pk, characters=1)
+        character.current_quest = self
 
+    @transaction.atomic
     def remove_character(self, character):
         """
         Removes a characters from a quest.
 
         :type character: Character
         """
-        quest_character = self.questcharacter_set.get_active_for_character(character=character)
+        location_pk = self.lock_current_location()
+        quest_character = self.questcharacter_set.select_for_update().get_active_for_character(character=character)
         quest_character.date_departed = timezone.now()
         quest_character.save()
+        if Character.objects.filter(pk=character.pk, current_quest=self).update(current_quest=None) and \
+                location_pk is not None:
+            LocationActivity.objects.adjust(location_pk, characters=-1)
+        if character.current_quest_id == self.pk:
+            character.current_quest = None
 
     def get_absolute_url(self):
         """
@@ -168,34 +277,10 @@ class Quest(BaseWorldModel):
         """
         return reverse('quests:quest_detail', kwargs={'slug': self.slug})
 
-    def create_slug(self, slug):
-        """
-        Tries to find an available slug.
-        :type slug: unicode
-        """
-        try:
-            self.__class__.objects.get(slug=slug)
-        except self.__class__.DoesNotExist:
-            return slug
-        else:
-            return self.create_slug('-{0}'.format(slug))
-
-    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
-        """
-        Overrides the save method. If no slug is set, the title will be sluggified.
-        :type force_insert: bool
-        :type force_update: bool
-        :type using: Database
-        :type update_fields: [] | ()
-        """
-        if self.slug == '':
-            self.slug = self.create_slug(slugify(self.title))
-        return super(Quest, self).save(force_insert, force_update, using, update_fields)
 
-
-class BaseQuestRelationManager(models.Manager):
+class BaseQuestRelationManager(QuerySet):
     """
-    Manager for BaseQuestRelation and its subclasses.
+    Manager methods for BaseQuestRelation and its subclasses.
     """
     def get_active_for_character(self, character):
         """
@@ -219,7 +304,7 @@ class BaseQuestRelation(models.Model):
     date_created = models.DateTimeField(auto_now_add=True)
     date_departed = models.DateTimeField(null=True, blank=True)
 
-    objects = BaseQuestRelationManager()
+    objects = PassThroughManager.for_queryset_class(BaseQuestRelationManager)()
 
     class Meta(object):
         """
@@ -253,9 +338,219 @@ class Post(models.Model):
     date_created = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
 
+    class Meta(object):
+        """
+        Meta properties
+        """
+        index_together = [('quest', 'date_created', 'id')]
+
+    _rendered_content = None
+
+    @property
+    def rendered_content(self):
+        """
+        The content as HTML, from the rendered post cache unless it has been set, for instance
+        by RenderedPostCache.prerender for a whole page of posts.
+        :rtype: SafeText
+        """
+        if self._rendered_content is None:
+            self._rendered_content = rendered_post_cache.get_many([self])[self.pk]
+        return self._rendered_content
+
+    @rendered_content.setter
+    def rendered_content(self, value):
+        self._rendered_content = value
+
+    @property
+    def cursor(self):
+        """
+        The position of the post in its quest's timeline.
+        :rtype: TimelineCursor
+        """
+        return TimelineCursor.for_object(self)
+
     def get_absolute_url(self):
         """
-        Absolute URL for post should be the quest's URL with an anchor to the post.
-        todo: Make this work with pagination
+        Absolute URL for post should be the quest's URL, on the timeline page starting with
+        the post, with an anchor to the post.
+        """
+        return '{0}?at={1}#{2}'.format(self.quest.get_absolute_url(), self.cursor.encode(), self.pk)
+
+
+def notify_quest_followers(sender, **kwargs):
+    """
+    Catches posts being created and queues notifications to the quest's followers.
+
+    :type sender: Post
+    :type kwargs: {}
+    """
+    del sender
+    if kwargs['created'] and not kwargs.get('raw', False):
+        queue_post_notifications.delay(kwargs['instance'].pk)
+post_save.connect(notify_quest_followers, sender=Post)
+
+
+def record_location_post(sender, **kwargs):
+    """
+    Catches posts being created and stores the time of the latest post at their location.
+
+    :type sender: Post
+    :type kwargs: {}
+    """
+    del sender
+    if kwargs['created'] and not kwargs.get('raw', False):
+        post = kwargs['instance']
+        LocationActivity.objects.record_post(post.location_id, post.date_created)
+post_save.connect(record_location_post, sender=Post)
+
+
+def render_post(sender, **kwargs):
+    """
+    Catches posts being saved and renders them, so they are in the rendered post cache before
+    anyone views them.
+
+    :type sender: Post
+    :type kwargs: {}
+    """
+    del sender
+    if not kwargs.get('raw', False):
+        rendered_post_cache.render_many([kwargs['instance']])
+post_save.connect(render_post, sender=Post)
+
+
+def publish_post(sender, **kwargs):
+    """
+    Catches posts being created and publishes them to anyone in this process watching the quest.
+
+    :type sender: Post
+    :type kwargs: {}
+    """
+    del sender
+    post = kwargs['instance']
+    if kwargs['created'] and not kwargs.get('raw', False) and post_channel.has_subscribers(post.quest_id):
+        post_channel.publish(post.quest_id, serialize_post(post))
+post_save.connect(publish_post, sender=Post)
+
+
+def touch_quest(sender, **kwargs):
+    """
+    Catches changes to a quest's roster, locations and posts, and stamps the quest as modified
+    so clients are not told their copy of it is current.
+
+    :type sender: QuestCharacter | QuestLocation | Post
+    :type kwargs: {}
+    """
+    if not kwargs.get('raw', False):
+        Quest.objects.filter(pk=kwargs['instance'].quest_id).update(date_modified=timezone.now())
+for quest_model in (QuestCharacter, QuestLocation, Post):
+    post_save.connect(touch_quest, sender=quest_model)
+    post_delete.connect(touch_quest, sender=quest_model)
+
+
+class PostNotificationManager(models.Manager):
+    """
+    Manages the PostNotification model.
+    """
+    chunk_size = 250
+    insert_from_batch_sql = (
+        'INSERT INTO {table} ({ptr}, {post}, {quest}) SELECT {pk}, %s, %s FROM {parent} WHERE {batch} = %s'
+    )
+
+    def notify_followers(self, post):
+        """
+        Notifies every follower of the post's quest, except the post's author, that the post
+        has been made.
+
+        Followers are handled in chunks. Followers that already have an unseen notification for
+        the quest have it updated to point at the new post, so there is only ever one unseen
+        notification per quest. The rest have notifications bulk inserted.
+
+        :type post: Post
+        :return: The number of followers notified.
+        :rtype: int
+        """
+        notification_profile_pks = list(
+            NotificationProfile.objects.filter(
+                user__quest_profile__following_quests=post.quest_id
+            ).exclude(
+                user__character_profile=post.character.character_profile_id
+            ).order_by('pk').values_list('pk', flat=True)
+        )
+        for i in range(0, len(notification_profile_pks), self.chunk_size):
+            self._notify_chunk(post, notification_profile_pks[i:i + self.chunk_size])
+        return len(notification_profile_pks)
+
+    @transaction.atomic
+    def _notify_chunk(self, post, notification_profile_pks):
+        """
+        Notifies a chunk of followers.
+
+        :type post: Post
+        :type notification_profile_pks: list[int]
+        """
+        unseen = self.filter(
+            quest=post.quest_id, date_seen__isnull=True, notification_profile__in=notification_profile_pks
+        )
+        notified_pks = set(unseen.values_list('notification_profile_id', flat=True))
+        if notified_pks:
+            unseen.update(post=post)
+            notification_broker.publish(notified_pks)
+        self._bulk_create(post, [pk for pk in notification_profile_pks if pk not in notified_pks])
+
+    def _bulk_create(self, post, notification_profile_pks):
+        """
+        Creates a notification for each profile using one insert for the Notification rows and one
+        for the PostNotification rows.
+
+        Django will not bulk create multi-table inherited models because the parent's primary keys
+        are not returned by the insert. Instead the parent rows are inserted with a batch unique to
+        this call, and the PostNotification rows are inserted from the parent rows with that batch.
+        Parent rows inserted at the same time by another fan-out, or by a notification being saved,
+        have a different batch or none, so are never mistaken for this batch's.
+
+        :type post: Post
+        :type notification_profile_pks: list[int]
+        """
+        if not notification_profile_pks:
+            return
+        batch = uuid.uuid4().hex
+        Notification.objects.bulk_create(
+            [Notification(notification_profile_id=pk, batch=batch) for pk in notification_profile_pks],
+            batch_size=self.chunk_size,
+        )
+        connection = connections[self.db]
+        quote_name = connection.ops.quote_name
+        parent_opts = Notification._meta
+        opts = self.model._meta
+        sql = self.insert_from_batch_sql.format(
+            table=quote_name(opts.db_table),
+            ptr=quote_name(opts.get_field('notification_ptr').column),
+            post=quote_name(opts.get_field('post').column),
+            quest=quote_name(opts.get_field('quest').column),
+            pk=quote_name(parent_opts.pk.column),
+            parent=quote_name(parent_opts.db_table),
+            batch=quote_name(parent_opts.get_field('batch').column),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [post.pk, post.quest_id, batch])
+        Notification.objects.filter(batch=batch).update(batch=None)
+        unseen_notification_counter.invalidate(notification_profile_pks)
+        notification_broker.publish(notification_profile_pks)
+
+
+class PostNotification(Notification):
+    """
+    A post notification informs a user that there is a new post on a quest they follow.
+    """
+    post = models.ForeignKey(Post)
+    quest = models.ForeignKey(Quest)
+
+    objects = PostNotificationManager()
+
+    render_prefetch_related = ('post__character', 'post__quest')
+
+    def render(self):
+        """
+        Renders the notification.
         """
-        return '{0}#{1}'.format(self.quest.get_absolute_url(), self.pk)
+        return render_to_string('quests/notifications/post_notification.html', {'post': self.post})
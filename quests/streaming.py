@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Streams new posts on a quest to the people watching it, as server-sent events.
+
+Watchers subscribe to the quest on the post channel, a local stand-in for a pub/sub server.
+Posts saved in the same process are published as they are created. Posts saved by other
+processes are found by the post poller, which asks for every watched quest's new posts with a
+single query each interval, however many people are watching. A watcher therefore costs an
+idle connection rather than a page load every time they want to see if anything has changed.
+
+Events carry the post's timeline cursor as their id, so a client that reconnects with
+Last-Event-ID is sent the posts it missed from the timeline first.
+"""
+from __future__ import unicode_literals
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from Queue import Empty, Full, Queue
+from django.conf import settings
+from django.db import connection, DatabaseError
+from django.utils import timezone
+from quests.markup import rendered_post_cache
+from quests.timeline import QuestTimeline, TimelineCursor
+
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_post(post):
+    """
+    The event data for a post. The character and location should be loaded with the post.
+
+    :type post: Post
+    :rtype: {}
+    """
+    return {
+        'pk': post.pk,
+        'quest': post.quest_id,
+        'cursor': post.cursor.encode(),
+        'character': {'pk': post.character_id, 'name': unicode(post.character.name)},
+        'location': {'pk': post.location_id, 'name': unicode(post.location.name)},
+        'content': unicode(post.content),
+        'html': unicode(post.rendered_content),
+        'date_created': post.date_created.isoformat(),
+    }
+
+
+class Subscription(object):
+    """
+    A watcher's queue of posts published to a quest. If the watcher falls behind and the queue
+    fills, it is marked as overflowed and the watcher should read its missed posts from the
+    timeline.
+    """
+    max_size = 100
+
+    def __init__(self, quest_pk):
+        """
+        :type quest_pk: int
+        """
+        super(Subscription, self).__init__()
+        self.quest_pk = quest_pk
+        self.queue = Queue(self.max_size)
+        self.overflowed = False
+
+    def put(self, event):
+        """
+        :type event: {}
+        """
+        try:
+            self.queue.put_nowait(event)
+        except Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """
+        Waits for the next event.
+
+        :type timeout: float
+        :return: The event, or None if none arrived in time.
+        :rtype: {} | None
+        """
+        try:
+            return self.queue.get(timeout=timeout)
+        except Empty:
+            return None
+
+
+class PostChannel(object):
+    """
+    Publishes posts to the subscribers of their quest.
+    """
+    def __init__(self):
+        super(PostChannel, self).__init__()
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+
+    def subscribe(self, quest_pk):
+        """
+        :type quest_pk: int
+        :rtype: Subscription
+        """
+        subscription = Subscription(quest_pk)
+        with self.lock:
+            self.subscriptions.setdefault(quest_pk, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """
+        :type subscription: Subscription
+        """
+        with self.lock:
+            subscriptions = self.subscriptions.get(subscription.quest_pk, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self.subscriptions.pop(subscription.quest_pk, None)
+
+    def has_subscribers(self, quest_pk):
+        """
+        :type quest_pk: int
+        :rtype: bool
+        """
+        return quest_pk in self.subscriptions
+
+    def watched_quests(self):
+        """
+        The pks of the quests with subscribers.
+
+        :rtype: list[int]
+        """
+        with self.lock:
+            return list(self.subscriptions)
+
+    def publish(self, quest_pk, event):
+        """
+        :type quest_pk: int
+        :param event: A serialized post
+        :type event: {}
+        """
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(quest_pk, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+post_channel = PostChannel()
+
+
+class PostPoller(object):
+    """
+    Publishes posts saved by other processes. Runs in a background thread once started.
+
+    Posts are not committed in the order they are created, so a post can become visible after
+    a later one has been polled. Each poll looks back overlap before the previous one and skips
+    the posts it has already published.
+    """
+    overlap = timedelta(seconds=10)
+
+    def __init__(self, channel):
+        """
+        :type channel: PostChannel
+        """
+        super(PostPoller, self).__init__()
+        self.channel = channel
+        self.lock = threading.Lock()
+        self.thread = None
+        self.started_at = None
+        self.since = None
+        self.published = {}
+
+    def ensure_started(self, interval):
+        """
+        Starts polling in a background thread, unless it already is.
+
+        :param interval: Seconds between polls
+        :type interval: float
+        """
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, args=(interval, ), name='post-poller')
+                self.thread.daemon = True
+                self.thread.start()
+
+    def run(self, interval):
+        """
+        Polls until the process exits. A failed poll is logged and tried again next interval.
+
+        :type interval: float
+        """
+        while True:
+            time.sleep(interval)
+            try:
+                self.poll()
+            except DatabaseError:
+                logger.exception('Polling for posts failed')
+            finally:
+                connection.close()
+
+    def poll(self):
+        """
+        Publishes the posts saved on watched quests since the last poll. Posts created before the
+        first poll are not published. The window moves on whether or not any quest is watched, so
+        a quest's first watcher is not sent its old posts.
+
+        :return: The number of posts published
+        :rtype: int
+        """
+        from quests.models import Post
+        now = timezone.now()
+        if self.started_at is None:
+            self.started_at = self.since = now
+        window_start = max(self.since - self.overlap, self.started_at)
+        for pk, date_created in list(self.published.items()):
+            if date_created < window_start:
+                del self.published[pk]
+        quest_pks = self.channel.watched_quests()
+        if not quest_pks:
+            self.since = now
+            return 0
+        posts = [
+            post for post in Post.objects.filter(quest__in=quest_pks, date_created__gte=window_start)
+            .select_related('character', 'location').order_by('date_created', 'pk')
+            if post.pk not in self.published
+        ]
+        rendered_post_cache.prerender(posts)
+        for post in posts:
+            self.channel.publish(post.quest_id, serialize_post(post))
+            self.published[post.pk] = post.date_created
+        self.since = now
+        return len(posts)
+
+
+post_poller = PostPoller(post_channel)
+
+
+class PostStream(object):
+    """
+    Iterates over the server-sent events of a quest's new posts.
+
+    The stream ends after max_duration seconds and the client reconnects, so a server thread
+    is not held forever by a client that has gone away without closing the connection.
+    """
+    def __init__(self, quest, after=None, channel=post_channel, keepalive=None, max_duration=None):
+        """
+        :type quest: Quest
+        :param after: The cursor of the last post the client has
+        :type after: TimelineCursor
+        :type channel: PostChannel
+        :param keepalive: Seconds between keepalive comments
+        :type keepalive: float
+        :param max_duration: Seconds before the stream ends
+        :type max_duration: float
+        """
+        super(PostStream, self).__init__()
+        self.quest = quest
+        self.after = after
+        self.channel = channel
+        self.keepalive = keepalive or getattr(settings, 'POST_STREAM_KEEPALIVE', 15)
+        self.max_duration = max_duration or getattr(settings, 'POST_STREAM_MAX_DURATION', 300)
+        self.sent_pks = set()
+
+    def __iter__(self):
+        subscription = self.channel.subscribe(self.quest.pk)
+        try:
+            missed = self.read_missed()
+            yield 'retry: 3000\n\n'
+            for event in missed:
+                yield event
+            ends = time.time() + self.max_duration
+            while time.time() < ends:
+                post = subscription.get(min(self.keepalive, ends - time.time()))
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    for event in self.read_missed():
+                        yield event
+                elif post is None:
+                    yield ': keepalive\n\n'
+                elif post['pk'] not in self.sent_pks:
+                    yield self.format_event(post)
+        finally:
+            self.channel.unsubscribe(subscription)
+
+    def read_missed(self):
+        """
+        Returns the events of the posts missed, then closes the database connection. The connection
+        is not needed while waiting, and watchers should not hold one each.
+
+        :rtype: list[unicode]
+        """
+        try:
+            return list(self.catch_up())
+        finally:
+            if not connection.in_atomic_block:
+                connection.close()
+
+    def catch_up(self):
+        """
+        Yields the events of the posts after the cursor, reading them from the timeline. With no
+        cursor nothing is sent, and only posts made from now on are streamed. Posts the poller may
+        still publish from before then are taken as sent.
+        """
+        if self.after is None:
+            latest = self.quest.posts.order_by('-date_created', '-pk').first()
+            self.after = latest.cursor if latest else TimelineCursor(self.quest.date_created, 0)
+            recent = self.quest.posts.filter(date_created__gte=timezone.now() - PostPoller.overlap)
+            self.sent_pks.update(recent.values_list('pk', flat=True))
+            return
+        timeline = QuestTimeline(self.quest)
+        page = timeline.page_after(self.after)
+        while True:
+            rendered_post_cache.prerender(page.posts)
+            for post in page:
+                if post.pk not in self.sent_pks:
+                    yield self.format_event(serialize_post(post))
+            if not page.has_next:
+                break
+            page = timeline.page_after(page.next_cursor)
+
+    def format_event(self, post):
+        """
+        Formats a post as an event, and moves the stream's cursor to it if it is later. Posts are
+        only ever sent once.
+
+        :type post: {}
+        :rtype: unicode
+        """
+        self.sent_pks.add(post['pk'])
+        cursor = TimelineCursor.decode(post['cursor'])
+        if (cursor.date, cursor.pk) > (self.after.date, self.after.pk):
+            self.after = cursor
+        return 'id: {0}\nevent: post\ndata: {1}\n\n'.format(post['cursor'], json.dumps(post))
@@ -52,7 +52,7 @@ class SelectLocationTestCase(CreateUserMixin):
         """
         If the user has no available characters then a different template should be used.
         """
-        patched_available_characters.return_value.count.return_value = 0
+        patched_available_characters.return_value.exists.return_value = False
         response = self.client.get(reverse('quests:select_location'))
         self.assertTemplateUsed(response, 'characters/no_characters_available.html')
 
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Tests that followers of a quest are notified of new posts.
+"""
+from django.contrib.auth import get_user_model
+from mock import patch
+from characters.tests.utils import CharacterUtils
+from notifications.models import Notification
+from quests.models import Post, PostNotification
+from quests.tests.utils import QuestUtils
+from rpg_auth.tests.utils import CreateUserMixin
+
+
+class PostNotificationTestCase(CreateUserMixin):
+    """
+    Tests the post notification fan-out.
+    """
+    fixtures = ['world-test-data.json']
+
+    def setUp(self):
+        super(PostNotificationTestCase, self).setUp()
+        self.character = CharacterUtils.create_character(self.user)
+        self.quest = QuestUtils.create_quest(self.user, self.character)
+        self.followers = []
+        for i in range(5):
+            follower = get_user_model().objects.create_user(
+                pen_name=u'Follower {0}'.format(i),
+                password=u'password',
+                email=u'follower{0}@example.com'.format(i),
+            )
+            follower.quest_profile.follow_quest(self.quest)
+            self.followers.append(follower)
+
+    def create_post(self):
+        """
+        Creates a post by the GM's character.
+        """
+        return Post.objects.create(
+            quest=self.quest, character=self.character, location=self.quest.current_location, content=u'Post'
+        )
+
+    def test_followers_are_notified(self):
+        """
+        Each follower gets a notification for the post.
+        """
+        post = self.create_post()
+        for follower in self.followers:
+            notifications = list(follower.notification_profile.unseen_notifications)
+            self.assertEquals(len(notifications), 1)
+            self.assertIsInstance(notifications[0], PostNotification)
+            self.assertEquals(notifications[0].post, post)
+
+    def test_author_is_not_notified(self):
+        """
+        The author of the post follows the quest but is not notified.
+        """
+        self.create_post()
+        self.assertEquals(self.user.notification_profile.unseen_notifications.count(), 0)
+
+    def test_repeated_posts_are_coalesced(self):
+        """
+        A follower with an unseen notification for the quest has it updated rather than getting another.
+        """
+        self.create_post()
+        post = self.create_post()
+        follower = self.followers[0]
+        self.assertEquals(follower.notification_profile.unseen_notifications.count(), 1)
+        self.assertEquals(follower.notification_profile.unseen_notifications[0].post, post)
+
+    def test_seen_notifications_are_not_reused(self):
+        """
+        Once a notification is seen the next post creates a new one.
+        """
+        self.create_post()
+        self.followers[0].notification_profile.unseen_notifications[0].set_as_seen()
+        self.create_post()
+        self.assertEquals(self.followers[0].notification_profile.notifications.count(), 2)
+
+    def test_deleting_post_resets_unseen_count(self):
+        """
+        Notifications deleted with their post are no longer counted as unseen.
+        """
+        post = self.create_post()
+        profile = self.followers[0].notification_profile
+        self.assertEquals(profile.unseen_notification_count, 1)
+        post.delete()
+        self.assertEquals(profile.unseen_notification_count, 0)
+
+    def test_fan_out_uses_bulk_inserts(self):
+        """
+        The number of queries does not grow with the number of followers.
+        """
+        post = self.create_post()
+        PostNotification.objects.all().delete()
+        Notification.objects.all().delete()
+        with self.assertNumQueries(7):
+            self.assertEquals(PostNotification.objects.notify_followers(post), 5)
+        self.assertEquals(PostNotification.objects.filter(date_seen__isnull=True, batch__isnull=True).count(), 5)
+
+    def test_fan_out_is_chunked(self):
+        """
+        Followers are notified in chunks.
+        """
+        post = self.create_post()
+        PostNotification.objects.all().delete()
+        Notification.objects.all().delete()
+        PostNotification.objects.chunk_size = 2
+        try:
+            PostNotification.objects.notify_followers(post)
+        finally:
+            del PostNotification.objects.chunk_size
+        self.assertEquals(PostNotification.objects.count(), 5)
+
+    def test_interleaved_fan_outs(self):
+        """
+        Parent rows inserted by another writer, for the same followers, between a fan-out inserting its
+        parent rows and inserting its PostNotification rows are not taken as the fan-out's own.
+        """
+        post = self.create_post()
+        PostNotification.objects.all().delete()
+        Notification.objects.all().delete()
+        bulk_create = Notification.objects.bulk_create
+        profile_pks = [follower.notification_profile.pk for follower in self.followers]
+
+        def interleave(*args, **kwargs):
+            created = bulk_create(*args, **kwargs)
+            bulk_create([Notification(notification_profile_id=pk) for pk in profile_pks])
+            return created
+        with patch.object(Notification.objects, 'bulk_create', interleave):
+            PostNotification.objects._bulk_create(post, profile_pks)
+        self.assertEquals(Notification.objects.count(), 10)
+        self.assertEquals(PostNotification.objects.filter(post=post).count(), 5)
+        self.assertEquals(
+            [type(notification) for notification in Notification.objects.select_subclasses()].count(Notification), 5
+        )
+
+    def test_fan_out_inside_another(self):
+        """
+        A second fan-out run to the same followers while the first is between inserting its parent rows and
+        its PostNotification rows leaves each follower with a notification for each post.
+        """
+        first_post = self.create_post()
+        second_post = self.create_post()
+        PostNotification.objects.all().delete()
+        Notification.objects.all().delete()
+        bulk_create = Notification.objects.bulk_create
+        profile_pks = [follower.notification_profile.pk for follower in self.followers]
+        interleaved = []
+
+        def interleave(*args, **kwargs):
+            created = bulk_create(*args, **kwargs)
+            if not interleaved:
+                interleaved.append(True)
+                PostNotification.objects._bulk_create(second_post, profile_pks)
+            return created
+        with patch.object(Notification.objects, 'bulk_create', interleave):
+            PostNotification.objects._bulk_create(first_post, profile_pks)
+        self.assertEquals(PostNotification.objects.filter(post=first_post).count(), 5)
+        self.assertEquals(PostNotification.objects.filter(post=second_post).count(), 5)
+        self.assertEquals(Notification.objects.filter_unseen().count(), 10)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Tests posts are rendered to HTML and the result cached.
+"""
+from django.core.urlresolvers import reverse
+from mock import patch
+from characters.tests.utils import CharacterUtils
+from quests.markup import LruCache, PostRenderer, post_renderer, rendered_post_cache
+from quests.models import Post
+from quests.tests.utils import QuestUtils
+from rpg_auth.tests.utils import CreateUserMixin
+
+
+class PostRendererTestCase(CreateUserMixin):
+    """
+    Tests the markup.
+    """
+    def setUp(self):
+        super(PostRendererTestCase, self).setUp()
+        self.renderer = PostRenderer()
+
+    def test_html_is_escaped(self):
+        """
+        Posts cannot include HTML.
+        """
+        self.assertEquals(
+            self.renderer.render('<script>alert(1)</script>'), '<p>&lt;script&gt;alert(1)&lt;/script&gt;</p>'
+        )
+
+    def test_tags_are_converted(self):
+        """
+        Matched tags are converted, including nested tags, and unmatched tags are left alone.
+        """
+        self.assertEquals(
+            self.renderer.render('[b]Bold [i]and italic[/i][/b] [quote]Quoted[/quote] [u]open'),
+            '<p><strong>Bold <em>and italic</em></strong> <blockquote>Quoted</blockquote> [u]open</p>',
+        )
+
+    def test_urls_are_linked(self):
+        """
+        Only http and https URLs are linked, and they cannot add attributes.
+        """
+        self.assertEquals(
+            self.renderer.render('[url=http://example.com/"onclick="x]Site[/url] [url]https://example.com[/url]'),
+            '<p><a href="http://example.com/&quot;onclick=&quot;x" rel="nofollow">Site</a> '
+            '<a href="https://example.com" rel="nofollow">https://example.com</a></p>',
+        )
+        self.assertEquals(
+            self.renderer.render('[url=javascript:alert(1)]x[/url]'), '<p>[url=javascript:alert(1)]x[/url]</p>'
+        )
+
+    def test_line_breaks(self):
+        """
+        Blank lines separate paragraphs and single line breaks are kept.
+        """
+        self.assertEquals(self.renderer.render('One\nTwo\n\nThree'), '<p>One<br />Two</p>\n\n<p>Three</p>')
+
+    def test_character_names_are_linked(self):
+        """
+        Names are linked as whole words, but not inside other links.
+        """
+        html = self.renderer.render(
+            'Bob met Bobby. [url=http://example.com/Bob]Bob[/url]', character_names=['Bob', 'Bobby']
+        )
+        self.assertEquals(html.count('class="character"'), 2)
+        self.assertIn('>Bobby</a>', html)
+        self.assertIn('q=Bob&amp;type=character', html)
+        self.assertIn('<a href="http://example.com/Bob" rel="nofollow">Bob</a>', html)
+
+    def test_character_names_are_not_linked_inside_entities(self):
+        """
+        Names are not found inside the entities of escaped text, but names that are escaped are linked and
+        searched for as written.
+        """
+        self.assertEquals(
+            self.renderer.render(u'Tom & Jerry "hi"', character_names=['amp', 'quot']),
+            '<p>Tom &amp; Jerry &quot;hi&quot;</p>',
+        )
+        html = self.renderer.render(u"O'Brien waves", character_names=["O'Brien"])
+        self.assertIn('>O&#39;Brien</a>', html)
+        self.assertIn('q=O%27Brien&amp;type=character', html)
+
+    def test_lru_is_bounded(self):
+        """
+        The least recently used item is forgotten first.
+        """
+        lru = LruCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEquals((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+
+class RenderedPostCacheTestCase(CreateUserMixin):
+    """
+    Tests rendered posts are cached.
+    """
+    fixtures = ['world-test-data.json']
+
+    def setUp(self):
+        super(RenderedPostCacheTestCase, self).setUp()
+        rendered_post_cache.local.clear()
+        self.character = CharacterUtils.create_character(self.user)
+        self.quest = QuestUtils.create_quest(self.user, self.character)
+
+    def create_post(self, content):
+        """
+        Creates a post by the GM's character.
+        """
+        return Post.objects.create(
+            quest=self.quest, character=self.character, location=self.quest.current_location, content=content
+        )
+
+    def test_posts_are_rendered_when_saved(self):
+        """
+        Saving a post renders it, linking the names of the quest's characters.
+        """
+        post = self.create_post(u'{0} waves'.format(self.character.name))
+        with patch.object(post_renderer, 'render') as render:
+            html = Post.objects.get(pk=post.pk).rendered_content
+        self.assertFalse(render.called)
+        self.assertIn('class="character"', html)
+
+    def test_warm_page_does_no_markup_work(self):
+        """
+        A page of posts already rendered is not rendered again or read from the shared cache.
+        """
+        for i in range(10):
+            self.create_post(u'[b]Post {0}[/b]'.format(i))
+        url = reverse('quests:quest_detail', kwargs={'slug': self.quest.slug})
+        with patch.object(post_renderer, 'render') as render, \
+                patch.object(rendered_post_cache.cache, 'get_many') as get_many:
+            response = self.client.get(url)
+        self.assertFalse(render.called)
+        self.assertFalse(get_many.called)
+        self.assertIn('<strong>Post 9</strong>', response.context['timeline'].posts[-1].rendered_content)
+
+    def test_shared_cache_fills_lru(self):
+        """
+        Posts rendered by another process are read from the shared cache.
+        """
+        post = self.create_post(u'[i]Hello[/i]')
+        rendered_post_cache.local.clear()
+        with patch.object(post_renderer, 'render') as render:
+            html = rendered_post_cache.get_many([post])[post.pk]
+        self.assertFalse(render.called)
+        self.assertEquals(html, '<p><em>Hello</em></p>')
+
+    def test_edited_posts_are_rendered_again(self):
+        """
+        The date_modified is part of the key, so edits are never served stale.
+        """
+        post = self.create_post(u'[b]Before[/b]')
+        post.content = u'[b]After[/b]'
+        post.save()
+        self.assertEquals(Post.objects.get(pk=post.pk).rendered_content, '<p><strong>After</strong></p>')
+
+    def test_page_larger_than_lru(self):
+        """
+        Posts rendered for a page are returned even if the LRU is too small to hold them all.
+        """
+        posts = [self.create_post(u'[b]Post {0}[/b]'.format(i)) for i in range(3)]
+        rendered_post_cache.local.clear()
+        rendered_post_cache.cache.clear()
+        with patch.object(rendered_post_cache.local, 'max_size', 1):
+            rendered = rendered_post_cache.get_many(posts)
+        self.assertEquals(
+            [rendered[post.pk] for post in posts], ['<p><strong>Post {0}</strong></p>'.format(i) for i in range(3)]
+        )
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Tests new posts are streamed to the watchers of a quest.
+"""
+import json
+from datetime import timedelta
+from mock import patch
+from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+from django.utils import timezone
+from characters.tests.utils import CharacterUtils
+from quests.models import Post
+from quests.streaming import PostChannel, PostPoller, PostStream, Subscription, post_channel, serialize_post
+from quests.tests.utils import QuestUtils
+from rpg_auth.tests.utils import CreateUserMixin
+
+
+class PostStreamTestCase(CreateUserMixin):
+    """
+    Tests the post channel, poller and stream.
+    """
+    fixtures = ['world-test-data.json']
+
+    def setUp(self):
+        super(PostStreamTestCase, self).setUp()
+        self.character = CharacterUtils.create_character(self.user)
+        self.quest = QuestUtils.create_quest(self.user, self.character)
+        self.first_post = self.quest.posts.get()
+
+    def create_post(self, content=u'Post'):
+        """
+        Creates a post by the GM's character.
+        """
+        return Post.objects.create(
+            quest=self.quest, character=self.character, location=self.quest.current_location, content=content
+        )
+
+    @staticmethod
+    def parse_events(chunks):
+        """
+        Returns the data of the post events in the chunks of a stream.
+        """
+        events = []
+        for chunk in chunks:
+            if 'event: post' in chunk:
+                events.append(json.loads(chunk.split('data: ', 1)[1]))
+        return events
+
+    def test_created_posts_are_published_to_subscribers(self):
+        """
+        Subscribers to the quest are sent each new post.
+        """
+        subscription = post_channel.subscribe(self.quest.pk)
+        try:
+            post = self.create_post()
+            event = subscription.get(timeout=0)
+        finally:
+            post_channel.unsubscribe(subscription)
+        self.assertEquals(event['pk'], post.pk)
+        self.assertEquals(event['character']['name'], unicode(self.character.name))
+        self.assertEquals(event['cursor'], post.cursor.encode())
+        self.assertFalse(post_channel.has_subscribers(self.quest.pk))
+
+    def test_posts_are_not_serialized_without_subscribers(self):
+        """
+        Saving a post on a quest no one is watching does not load anything to publish.
+        """
+        with patch('quests.models.serialize_post') as serialize_post:
+            self.create_post()
+        self.assertFalse(serialize_post.called)
+
+    def test_full_subscriptions_overflow(self):
+        """
+        A subscriber that falls behind is marked as overflowed rather than blocking the publisher.
+        """
+        channel = PostChannel()
+        subscription = channel.subscribe(self.quest.pk)
+        for i in range(subscription.max_size + 1):
+            channel.publish(self.quest.pk, {'pk': i})
+        self.assertTrue(subscription.overflowed)
+
+    def test_poller_publishes_posts_from_other_processes(self):
+        """
+        The poller publishes posts saved since it last polled, on watched quests only.
+        """
+        channel = PostChannel()
+        poller = PostPoller(channel)
+        self.assertEquals(poller.poll(), 0)
+        subscription = channel.subscribe(self.quest.pk)
+        post = self.create_post()
+        other_quest = QuestUtils.create_quest(self.user, CharacterUtils.create_character(self.user))
+        with self.assertNumQueries(1):
+            self.assertEquals(poller.poll(), 1)
+        self.assertEquals(subscription.get(timeout=0)['pk'], post.pk)
+        self.assertEquals(poller.poll(), 0)
+        self.assertFalse(channel.has_subscribers(other_quest.pk))
+
+    def test_poller_publishes_posts_committed_late(self):
+        """
+        A post that becomes visible after a later post has been polled is still published, once.
+        """
+        channel = PostChannel()
+        poller = PostPoller(channel)
+        poller.poll()
+        subscription = channel.subscribe(self.quest.pk)
+        other_quest = QuestUtils.create_quest(self.user, CharacterUtils.create_character(self.user))
+        late = Post.objects.create(
+            quest=other_quest, character=self.character, location=self.quest.current_location, content=u'Late'
+        )
+        post = self.create_post()
+        self.assertEquals(poller.poll(), 1)
+        Post.objects.filter(pk=late.pk).update(quest=self.quest)
+        self.assertEquals(poller.poll(), 1)
+        self.assertEquals(poller.poll(), 0)
+        self.assertEquals([subscription.get(timeout=0)['pk'] for i in range(2)], [post.pk, late.pk])
+
+    def test_first_watcher_is_not_sent_old_posts(self):
+        """
+        The poller moves on while no quest is watched, so the first watcher of a quest is not sent its old posts.
+        """
+        channel = PostChannel()
+        poller = PostPoller(channel)
+        poller.poll()
+        poller.started_at = poller.since = timezone.now() - timedelta(hours=1)
+        self.create_post()
+        self.quest.posts.update(date_created=timezone.now() - timedelta(minutes=30))
+        self.assertEquals(poller.poll(), 0)
+        channel.subscribe(self.quest.pk)
+        with self.assertNumQueries(1):
+            self.assertEquals(poller.poll(), 0)
+
+    def test_stream_sends_posts_committed_late(self):
+        """
+        A post published after a later one has been sent is still sent.
+        """
+        other_quest = QuestUtils.create_quest(self.user, CharacterUtils.create_character(self.user))
+        late = Post.objects.create(
+            quest=other_quest, character=self.character, location=self.quest.current_location, content=u'Late'
+        )
+        stream = iter(PostStream(self.quest, keepalive=0.01, max_duration=0.1))
+        next(stream)
+        post = self.create_post()
+        Post.objects.filter(pk=late.pk).update(quest=self.quest)
+        post_channel.publish(self.quest.pk, serialize_post(Post.objects.get(pk=late.pk)))
+        post_channel.publish(self.quest.pk, serialize_post(post))
+        self.assertEquals([event['pk'] for event in self.parse_events(stream)], [post.pk, late.pk])
+
+    def test_stream_closes_connection_after_each_catch_up(self):
+        """
+        The database connection is closed after catching up on connecting and after an overflow, so an idle
+        watcher holds none.
+        """
+        stream = iter(PostStream(self.quest, after=self.first_post.cursor, keepalive=0.01, max_duration=0.1))
+        with patch('quests.streaming.connection') as connection:
+            connection.in_atomic_block = False
+            next(stream)
+            self.assertEquals(connection.close.call_count, 1)
+            post = self.create_post()
+            for i in range(Subscription.max_size + 1):
+                post_channel.publish(self.quest.pk, serialize_post(post))
+            self.assertEquals([event['pk'] for event in self.parse_events(stream)], [post.pk])
+            self.assertEquals(connection.close.call_count, 2)
+
+    def test_stream_sends_new_posts(self):
+        """
+        The stream sends posts created while it is open, then ends.
+        """
+        stream = iter(PostStream(self.quest, keepalive=0.01, max_duration=0.1))
+        self.assertEquals(next(stream), 'retry: 3000\n\n')
+        post = self.create_post()
+        self.assertEquals([event['pk'] for event in self.parse_events(stream)], [post.pk])
+
+    def test_stream_sends_keepalives(self):
+        """
+        An idle stream sends keepalive comments.
+        """
+        chunks = list(PostStream(self.quest, keepalive=0.01, max_duration=0.05))
+        self.assertIn(': keepalive\n\n', chunks)
+        self.assertFalse(post_channel.has_subscribers(self.quest.pk))
+
+    @override_settings(POST_STREAM_KEEPALIVE=0.01, POST_STREAM_MAX_DURATION=0.05, POST_STREAM_POLL_INTERVAL=None)
+    def test_view_catches_up_from_last_event_id(self):
+        """
+        A client reconnecting with Last-Event-ID is sent the posts it missed first.
+        """
+        posts = [self.create_post(u'Post {0}'.format(i)) for i in range(3)]
+        response = self.client.get(
+            reverse('quests:quest_stream', kwargs={'quest_slug': self.quest.slug}),
+            HTTP_LAST_EVENT_ID=self.first_post.cursor.encode(),
+        )
+        self.assertEquals(response['Content-Type'], 'text/event-stream')
+        events = self.parse_events(response.streaming_content)
+        self.assertEquals([event['pk'] for event in events], [post.pk for post in posts])
+
+    def test_view_rejects_invalid_cursors(self):
+        """
+        An invalid cursor is not found.
+        """
+        response = self.client.get(
+            reverse('quests:quest_stream', kwargs={'quest_slug': self.quest.slug}), {'after': 'nonsense'}
+        )
+        self.assertEquals(response.status_code, 404)
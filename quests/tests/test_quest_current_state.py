@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the current location and roster stored on quests and characters stays in step with
+the quest's history.
+"""
+from StringIO import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+from characters.models import Character
+from characters.tests.utils import CharacterUtils
+from quests.models import Quest
+from world.models import Location
+
+
+class QuestCurrentStateTestCase(TestCase):
+    """
+    Tests the denormalised current state columns.
+    """
+    fixtures = ['world-test-data.json']
+
+    def setUp(self):
+        super(QuestCurrentStateTestCase, self).setUp()
+        self.user = get_user_model().objects.create(email='test@example.com', pen_name='Test')
+        self.location1 = Location.objects.get(pk=1)
+        self.location2 = Location.objects.get(pk=2)
+        self.quest = Quest.objects.create(title=u'Quest', gm=self.user.quest_profile)
+        self.character = CharacterUtils.create_character(self.user)
+
+    def test_moving_location_is_stored(self):
+        """
+        Moving the quest stores the new location on the quest.
+        """
+        self.quest.move_to_location(self.location1)
+        self.quest.move_to_location(self.location2)
+        self.assertEquals(Quest.objects.get(pk=self.quest.pk).current_location, self.location2)
+
+    def test_roster_is_stored(self):
+        """
+        Adding and removing characters stores the current quest on the character.
+        """
+        self.quest.add_character(self.character)
+        self.assertEquals(Character.objects.get(pk=self.character.pk).current_quest, self.quest)
+        self.quest.remove_character(self.character)
+        self.assertIsNone(Character.objects.get(pk=self.character.pk).current_quest)
+
+    def test_listing_quests_with_locations_is_one_query(self):
+        """
+        The current location of many quests can be loaded in a single query.
+        """
+        for i in range(5):
+            quest = Quest.objects.create(title=u'Quest {0}'.format(i), gm=self.user.quest_profile)
+            quest.move_to_location(self.location1)
+        with self.assertNumQueries(1):
+            self.assertEquals(
+                set(quest.current_location for quest in Quest.objects.select_related('current_location')),
+                {None, self.location1}
+            )
+
+    def test_verify_reports_stale_state(self):
+        """
+        Verifying the state raises an error if the stored state is wrong.
+        """
+        self.quest.move_to_location(self.location1)
+        self.quest.add_character(self.character)
+        Quest.objects.update(current_location=None)
+        Character.objects.update(current_quest=None)
+        self.assertRaises(CommandError, call_command, 'rebuild_quest_state', verify=True, stdout=StringIO())
+
+    def test_rebuild_corrects_stale_state(self):
+        """
+        Rebuilding the state corrects it.
+        """
+        self.quest.move_to_location(self.location1)
+        self.quest.add_character(self.character)
+        Quest.objects.update(current_location=self.location2)
+        Character.objects.update(current_quest=None)
+        call_command('rebuild_quest_state', stdout=StringIO())
+        self.assertEquals(Quest.objects.get(pk=self.quest.pk).current_location, self.location1)
+        self.assertEquals(Character.objects.get(pk=self.character.pk).current_quest, self.quest)
+        self.assertEquals(Quest.objects.find_stale_current_state(), ({}, {}))
@@ -176,9 +176,9 @@ class QuestToCharacterRelationshipTestCase(TestCase):
         There should be a boolean on the character profile to return True if
         the user has available characters.
         """
-        patched_available_characters.return_value.count.return_value = 1
+        patched_available_characters.return_value.exists.return_value = True
         self.assertTrue(self.user1.character_profile.has_available_characters)
-        patched_available_characters.return_value.count.return_value = 0
+        patched_available_characters.return_value.exists.return_value = False
         self.assertFalse(self.user1.character_profile.has_available_characters)
 
     def test_can_get_characters_on_quest_by_user(self):
@@ -23,7 +23,7 @@ class SlugTestCase(TestCase):
 
     def test_slugify_fixes_clashes(self):
         """
-        Tests that if slugs clash a hyphen is prepended.
+        Tests that if slugs clash a numbered suffix is appended.
         """
         Quest.objects.create(
             title=u'Test Quest',
@@ -33,4 +33,4 @@ class SlugTestCase(TestCase):
             title=u'Test  Quest',
             gm=get_user_model().objects.create(pen_name='test2', email='test2@example.com').quest_profile,
         )
-        self.assertEquals(quest.slug, '-test-quest')
+        self.assertEquals(quest.slug, 'test-quest-2')
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the quest timeline pages through posts by cursor.
+"""
+from datetime import datetime
+from django.core.urlresolvers import reverse
+from django.utils import timezone
+from freezegun import freeze_time
+from characters.tests.utils import CharacterUtils
+from quests.models import Post
+from quests.tests.utils import QuestUtils
+from quests.timeline import QuestTimeline, TimelineCursor
+from rpg_auth.tests.utils import CreateUserMixin
+from soj.cursors import InvalidCursor
+
+
+class QuestTimelineTestCase(CreateUserMixin):
+    """
+    Tests the timeline returns stable pages of posts.
+    """
+    fixtures = ['world-test-data.json']
+
+    def setUp(self):
+        super(QuestTimelineTestCase, self).setUp()
+        self.character = CharacterUtils.create_character(self.user)
+        with freeze_time('2000-01-01 00:00:00'):
+            self.quest = QuestUtils.create_quest(self.user, self.character)
+            for i in range(4):
+                self.create_post(u'Same second {0}'.format(i))
+        with freeze_time('2000-01-02 00:00:00'):
+            for i in range(5):
+                self.create_post(u'Next day {0}'.format(i))
+        self.posts = list(self.quest.posts.order_by('date_created', 'pk'))
+        self.timeline = QuestTimeline(self.quest, page_size=3)
+
+    def create_post(self, content):
+        """
+        Creates a post on the quest.
+        :type content: unicode
+        """
+        return Post.objects.create(
+            quest=self.quest, character=self.character, location=self.quest.current_location, content=content
+        )
+
+    def test_cursor_round_trips(self):
+        """
+        A cursor can be encoded and decoded.
+        """
+        cursor = TimelineCursor(datetime(2000, 1, 1, 0, 0, 0, 123, tzinfo=timezone.utc), 7)
+        self.assertEquals(TimelineCursor.decode(cursor.encode()), cursor)
+
+    def test_invalid_cursor_raises(self):
+        """
+        Malformed cursors cannot be decoded.
+        """
+        self.assertRaises(InvalidCursor, TimelineCursor.decode, 'not-a-cursor')
+
+    def test_pages_cover_every_post_once(self):
+        """
+        Following next cursors visits every post exactly once, even when posts share a timestamp.
+        """
+        seen = []
+        page = self.timeline.first_page()
+        self.assertFalse(page.has_previous)
+        while True:
+            seen.extend(page.posts)
+            if not page.has_next:
+                break
+            page = self.timeline.page_after(page.next_cursor)
+        self.assertEquals(seen, self.posts)
+
+    def test_page_before_returns_previous_posts(self):
+        """
+        Going backwards from a page returns the posts immediately before it.
+        """
+        page = self.timeline.page_before(TimelineCursor.for_object(self.posts[5]))
+        self.assertEquals(page.posts, self.posts[2:5])
+        self.assertTrue(page.has_previous)
+        self.assertTrue(page.has_next)
+
+    def test_page_at_starts_with_post(self):
+        """
+        A permalink page starts with the post it links to.
+        """
+        page = self.timeline.page_at(TimelineCursor.for_object(self.posts[4]))
+        self.assertEquals(page.posts[0], self.posts[4])
+        self.assertTrue(page.has_previous)
+
+    def test_page_query_count_is_constant(self):
+        """
+        Fetching a page costs the same number of queries wherever it is in the timeline.
+        """
+        with self.assertNumQueries(1):
+            self.timeline.page_after(TimelineCursor.for_object(self.posts[0]))
+        with self.assertNumQueries(2):
+            self.timeline.page_at(TimelineCursor.for_object(self.posts[6]))
+
+    def test_post_permalink_renders_its_page(self):
+        """
+        The post's absolute URL renders the quest with the post on the page.
+        """
+        post = self.posts[7]
+        response = self.client.get(post.get_absolute_url())
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.context['timeline'].posts[0], post)
+
+    def test_invalid_cursor_in_request_is_404(self):
+        """
+        A bad cursor in the query string gives a 404.
+        """
+        url = reverse('quests:quest_detail', kwargs={'slug': self.quest.slug})
+        response = self.client.get(url, {'after': 'bad'})
+        self.assertEquals(response.status_code, 404)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Tests that objects loaded from the request are only loaded once per request.
+"""
+from django.core.urlresolvers import reverse
+from django.http import Http404
+from characters.tests.utils import CharacterUtils
+from quests.models import Quest
+from quests.tests.utils import QuestUtils
+from rpg_auth.tests.utils import CreateUserMixin
+from soj.request_cache import RequestObjectCache
+from soj.tests.utils import MockRequest
+from world.models import Location
+
+
+class RequestObjectCacheTestCase(CreateUserMixin):
+    """
+    Tests the cache attached to requests.
+    """
+    fixtures = ['world-test-data.json']
+
+    def test_cache_is_shared_for_request(self):
+        """
+        The same cache is returned for the same request.
+        """
+        request = MockRequest()
+        self.assertIs(RequestObjectCache.for_request(request), RequestObjectCache.for_request(request))
+        self.assertIsNot(RequestObjectCache.for_request(request), RequestObjectCache.for_request(MockRequest()))
+
+    def test_object_loaded_once(self):
+        """
+        Repeated lookups only hit the database once.
+        """
+        cache = RequestObjectCache()
+        with self.assertNumQueries(1):
+            location = cache.get('location', Location.objects.all(), slug='location-one')
+            self.assertIs(cache.get('location', Location.objects.all(), slug='location-one'), location)
+        self.assertEquals((cache.hits, cache.misses), (1, 1))
+
+    def test_missing_object_raises_404(self):
+        """
+        Objects that do not exist raise a 404.
+        """
+        cache = RequestObjectCache()
+        self.assertRaises(Http404, cache.get, 'location', Location.objects.all(), slug='fake-slug')
+
+    def test_forget_removes_object(self):
+        """
+        Forgetting a name causes the object to be loaded again.
+        """
+        cache = RequestObjectCache()
+        cache.get('location', Location.objects.all(), slug='location-one')
+        cache.forget('location')
+        cache.get('location', Location.objects.all(), slug='location-one')
+        self.assertEquals(cache.misses, 2)
+
+    def test_post_create_view_loads_quest_once(self):
+        """
+        The post create view asks for the quest several times but only loads it once.
+        """
+        quest = QuestUtils.create_quest(self.user, CharacterUtils.create_character(self.user))
+        response = self.client.get(reverse('quests:create_post', kwargs={'quest_slug': quest.slug}))
+        cache = response.wsgi_request.object_cache
+        self.assertEquals(cache.misses, 1)
+        self.assertTrue(cache.hits > 0)
+        self.assertIsInstance(response.context['quest'], Quest)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+The quest timeline pages through a quest's posts using a keyset cursor rather than
+an offset.
+
+A cursor is the (date_created, pk) pair of a post. Pages are found by asking for the
+posts either side of a cursor, which the (quest, date_created, id) index on Post can
+answer directly, so the cost of a page does not depend on how many posts the quest has.
+"""
+from __future__ import unicode_literals
+from soj.cursors import DateCursor
+
+
+class TimelineCursor(DateCursor):
+    """
+    A position in a quest's timeline.
+    """
+
+
+class TimelinePage(object):
+    """
+    A page of posts from a quest's timeline, in chronological order.
+    """
+    def __init__(self, posts, has_previous, has_next):
+        """
+        :type posts: list[Post]
+        :type has_previous: bool
+        :type has_next: bool
+        """
+        super(TimelinePage, self).__init__()
+        self.posts = posts
+        self.has_previous = has_previous
+        self.has_next = has_next
+
+    def __iter__(self):
+        return iter(self.posts)
+
+    def __len__(self):
+        return len(self.posts)
+
+    @property
+    def previous_cursor(self):
+        """
+        Cursor to pass as `before` to fetch the previous page.
+        """
+        if self.has_previous and self.posts:
+            return TimelineCursor.for_object(self.posts[0])
+        return None
+
+    @property
+    def next_cursor(self):
+        """
+        Cursor to pass as `after` to fetch the next page.
+        """
+        if self.has_next and self.posts:
+            return TimelineCursor.for_object(self.posts[-1])
+        return None
+
+
+class QuestTimeline(object):
+    """
+    Pages through the posts of a quest.
+    """
+    page_size = 25
+
+    def __init__(self, quest, page_size=None):
+        """
+        :type quest: Quest
+        :type page_size: int
+        """
+        super(QuestTimeline, self).__init__()
+        self.quest = quest
+        if page_size is not None:
+            self.page_size = page_size
+
+    def get_queryset(self):
+        """
+        The posts on the quest with everything needed to render them.
+        """
+        return self.quest.posts.select_related('character', 'location')
+
+    def first_page(self):
+        """
+        The oldest posts on the quest.
+
+        :rtype: TimelinePage
+        """
+        return self._forward(self.get_queryset(), has_previous=False)
+
+    def page_after(self, cursor):
+        """
+        The posts immediately after the cursor.
+
+        :type cursor: TimelineCursor
+        :rtype: TimelinePage
+        """
+        return self._forward(self.get_queryset().filter(cursor.after_q()), has_previous=True)
+
+    def page_at(self, cursor):
+        """
+        The page starting with the post at the cursor. Used for post permalinks.
+
+        :type cursor: TimelineCursor
+        :rtype: TimelinePage
+        """
+        has_previous = self.get_queryset().filter(cursor.before_q()).exists()
+        return self._forward(self.get_queryset().filter(cursor.after_q(inclusive=True)), has_previous=has_previous)
+
+    def page_before(self, cursor):
+        """
+        The posts immediately before the cursor.
+
+        :type cursor: TimelineCursor
+        :rtype: TimelinePage
+        """
+        posts = list(
+            self.get_queryset().filter(cursor.before_q()).order_by('-date_created', '-pk')[:self.page_size + 1]
+        )
+        has_previous = len(posts) > self.page_size
+        posts = posts[:self.page_size]
+        posts.reverse()
+        return TimelinePage(posts, has_previous=has_previous, has_next=True)
+
+    def get_page(self, after=None, before=None, at=None):
+        """
+        Returns a page given the encoded cursors taken from a request. If none are given the
+        first page is returned.
+
+        :type after: unicode
+        :type before: unicode
+        :type at: unicode
+        :rtype: TimelinePage
+        """
+        if at:
+            return self.page_at(TimelineCursor.decode(at))
+        if after:
+            return self.page_after(TimelineCursor.decode(after))
+        if before:
+            return self.page_before(TimelineCursor.decode(before))
+        return self.first_page()
+
+    def _forward(self, queryset, has_previous):
+        """
+        Takes a page from the queryset in chronological order.
+        """
+        posts = list(queryset.order_by('date_created', 'pk')[:self.page_size + 1])
+        return TimelinePage(posts[:self.page_size], has_previous=has_previous, has_next=len(posts) > self.page_size)
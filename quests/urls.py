@@ -4,7 +4,7 @@ URLs for the characters app.
 """
 from django.conf.urls import patterns, url
 from quests.views import SelectLocationListView, SelectCharacterListView, QuestCreateView, QuestDetailView, \
-    FollowQuestFormView, UnfollowQuestFormView, PostCreateView
+    FollowQuestFormView, UnfollowQuestFormView, PostCreateView, QuestStreamView
 
 
 urlpatterns = patterns(
@@ -40,4 +40,9 @@ urlpatterns = patterns(
         PostCreateView.as_view(),
         name='create_post'
     ),
+    url(
+        r'^(?P<quest_slug>[\w-]+)/stream/$',
+        QuestStreamView.as_view(),
+        name='quest_stream'
+    ),
 )
@@ -6,12 +6,20 @@ from __future__ import unicode_literals
 from braces.views import LoginRequiredMixin
 from characters.mixins import CharacterFromRequestMixin, NoAvailableCharactersMixin
 from characters.views import CharacterListView
+from django.conf import settings
 from django.contrib import messages
 from django.forms import Form
-from django.views.generic import FormView, CreateView, DetailView
+from django.http import Http404, StreamingHttpResponse
+from django.views.generic import FormView, CreateView, DetailView, View
 from quests.forms import CreateQuestModelForm, CreatePostModelForm
+from quests.markup import rendered_post_cache
 from quests.mixins import QuestFromRequestMixin
-from quests.models import Quest, Post
+from quests.models import CharacterUnavailable, Quest, Post
+from quests.streaming import PostStream, post_poller
+from quests.timeline import QuestTimeline, TimelineCursor
+from soj.conditional import ConditionalGetMixin
+from soj.cursors import InvalidCursor
+from soj.replicas import ReplicaReadsMixin
 from world.mixins import LocationFromRequestMixin
 from world.views import ContinentListView
 
@@ -61,12 +69,16 @@ class QuestCreateView(LoginRequiredMixin, NoAvailableCharactersMixin, CharacterF
         :return: HttpResponse
         """
         self.object = form.save(commit=False)
-        self.object.initialise(
-            gm=self.request.user.quest_profile,
-            first_post=form.cleaned_data['first_post'],
-            location=self.get_location(),
-            character=self.get_character(),
-        )
+        try:
+            self.object.initialise(
+                gm=self.request.user.quest_profile,
+                first_post=form.cleaned_data['first_post'],
+                location=self.get_location(),
+                character=self.get_character(),
+            )
+        except CharacterUnavailable:
+            form.add_error(None, '{0} is already on a quest.'.format(self.get_character().name))
+            return self.form_invalid(form)
         messages.success(self.request, '{0} has begun!'.format(self.object.title))
         return super(QuestCreateView, self).form_valid(form)
 
@@ -77,11 +89,61 @@ class QuestCreateView(LoginRequiredMixin, NoAvailableCharactersMixin, CharacterF
         return self.object.get_absolute_url()
 
 
-class QuestDetailView(DetailView):
+class QuestDetailView(ReplicaReadsMixin, ConditionalGetMixin, DetailView):
     """
-    Details a quest
+    Details a quest along with a page of its timeline.
+
+    The page is selected with one of the `after`, `before` or `at` cursors in the query string.
+    Only the quest is loaded to answer a conditional request for a page that has not changed.
     """
     model = Quest
+    timeline_page_size = QuestTimeline.page_size
+
+    def __init__(self):
+        super(QuestDetailView, self).__init__()
+        self.object = None
+
+    def get_object(self, queryset=None):
+        """
+        Loads the quest once, whether for the conditional request or the page.
+        :rtype: Quest
+        """
+        if self.object is None:
+            self.object = super(QuestDetailView, self).get_object(queryset)
+        return self.object
+
+    def get_last_modified(self):
+        """
+        :rtype: datetime
+        """
+        return self.get_object().last_modified
+
+    def get_timeline(self):
+        """
+        Returns the page of the timeline requested, with its posts rendered.
+        :rtype: TimelinePage
+        """
+        timeline = QuestTimeline(self.object, page_size=self.timeline_page_size)
+        try:
+            page = timeline.get_page(
+                after=self.request.GET.get('after'),
+                before=self.request.GET.get('before'),
+                at=self.request.GET.get('at'),
+            )
+        except InvalidCursor:
+            raise Http404()
+        rendered_post_cache.prerender(page.posts)
+        return page
+
+    def get_context_data(self, **kwargs):
+        """
+        Adds the timeline page to the context.
+        :type kwargs: {}
+        :return: {}
+        """
+        context_data = super(QuestDetailView, self).get_context_data(**kwargs)
+        context_data['timeline'] = self.get_timeline()
+        return context_data
 
 
 class FollowQuestFormView(LoginRequiredMixin, QuestFromRequestMixin, FormView):
@@ -176,3 +238,29 @@ class PostCreateView(LoginRequiredMixin, QuestFromRequestMixin, CreateView):
         self.object.quest = self.get_quest()
         self.object.save()
         return super(PostCreateView, self).form_valid(form)
+
+
+class QuestStreamView(QuestFromRequestMixin, View):
+    """
+    Streams the quest's new posts as server-sent events, so watchers do not need to reload the
+    quest to see them. Clients may pass the cursor of the last post they have as `after`, and
+    are sent the posts after it first. EventSource does this itself with Last-Event-ID when it
+    reconnects.
+    """
+    def get(self, request, *args, **kwargs):
+        """
+        :type request: HttpRequest
+        :rtype: StreamingHttpResponse
+        """
+        after = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('after')
+        try:
+            after = TimelineCursor.decode(after) if after else None
+        except InvalidCursor:
+            raise Http404()
+        poll_interval = getattr(settings, 'POST_STREAM_POLL_INTERVAL', 2)
+        if poll_interval:
+            post_poller.ensure_started(poll_interval)
+        response = StreamingHttpResponse(PostStream(self.get_quest(), after=after), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -5,7 +5,14 @@ Forms for the auth app.
 from __future__ import unicode_literals
 from django import forms
 from django.contrib.auth import get_user_model
+from django.contrib.auth.forms import PasswordResetForm
+from django.contrib.auth.tokens import default_token_generator
+from django.contrib.sites.shortcuts import get_current_site
+from django.template import loader
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
 from django.utils.translation import ugettext as _
+from tasks import queue_send_mail
 
 
 class UserCreateForm(forms.ModelForm):
@@ -54,3 +61,41 @@ class UserCreateForm(forms.ModelForm):
             password=self.cleaned_data['password'],
         )
         return user
+
+
+class PasswordRequestForm(PasswordResetForm):
+    """
+    Password reset form that queues the reset mail through the mail pipeline, so it is batched,
+    deduplicated and rate limited like the rest of the site's mail, rather than sending it on the
+    request.
+    """
+    def save(self, domain_override=None, subject_template_name='registration/password_reset_subject.txt',
+             email_template_name='registration/password_reset_email.html', use_https=False,
+             token_generator=default_token_generator, from_email=None, request=None, html_email_template_name=None):
+        """
+        Renders a one use link for resetting the password of each active user with the email
+        address and queues it. Takes the same arguments as PasswordResetForm.save.
+        """
+        if domain_override:
+            site_name = domain = domain_override
+        else:
+            current_site = get_current_site(request)
+            site_name, domain = current_site.name, current_site.domain
+        for user in get_user_model()._default_manager.filter(email__iexact=self.cleaned_data['email'], is_active=True):
+            if not user.has_usable_password():
+                continue
+            context = {
+                'email': user.email,
+                'domain': domain,
+                'site_name': site_name,
+                'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+                'user': user,
+                'token': token_generator.make_token(user),
+                'protocol': 'https' if use_https else 'http',
+            }
+            subject = ''.join(loader.render_to_string(subject_template_name, context).splitlines())
+            body = loader.render_to_string(email_template_name, context)
+            html_body = None
+            if html_email_template_name:
+                html_body = loader.render_to_string(html_email_template_name, context)
+            queue_send_mail.delay(subject, body, from_email, [user.email], html_message=html_body)
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Delivers outbound mail in batches.
+
+Queued mail is stored as OutboundMail rows, one per recipient, rather than being sent
+straight away. A delivery claims a batch of due rows and sends them over a single
+connection, which is kept open and reused by later batches in the same worker. The same
+message queued twice for a recipient before it is sent is only sent once.
+
+Mail that fails is retried with exponential backoff until it has been tried max_attempts
+times. Deliveries are throttled to settings.MAIL_RATE_LIMIT messages a second if it is set.
+
+Queueing mail schedules a delivery MAIL_BATCH_DELAY seconds later, unless one is already
+scheduled, so a burst of mail is delivered by one task. Whether one is scheduled is kept in
+the cache named by settings.MAIL_CACHE, which defaults to 'default'. If that cache is not
+configured a local memory cache is used.
+
+Settings:
+    MAIL_BATCH_SIZE: The number of messages sent per delivery. Defaults to 100.
+    MAIL_BATCH_DELAY: Seconds between queueing mail and delivering it. Defaults to 5.
+    MAIL_RATE_LIMIT: Messages sent per second by a worker. Defaults to no limit.
+"""
+from __future__ import unicode_literals
+import hashlib
+import smtplib
+import socket
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core import mail
+from django.core.cache import caches, InvalidCacheBackendError
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from rpg_auth.models import OutboundMail
+
+
+class MailPipeline(object):
+    """
+    Queues mail and delivers it in batches over a reused connection.
+    """
+    max_attempts = 5
+    retry_delay = timedelta(minutes=1)
+    lease_time = timedelta(minutes=10)
+    delivery_errors = (smtplib.SMTPException, socket.error)
+    scheduled_key = 'mail:delivery-scheduled'
+
+    def __init__(self, sleep=time.sleep, clock=time.time):
+        """
+        :param sleep: Function used to wait when rate limiting
+        :param clock: Function returning the current time in seconds
+        """
+        super(MailPipeline, self).__init__()
+        self.sleep = sleep
+        self.clock = clock
+        self.connection = None
+        self.last_sent_at = None
+        self._fallback_cache = None
+
+    @property
+    def cache(self):
+        """
+        The configured cache, or a local memory cache if it does not exist.
+        """
+        try:
+            return caches[getattr(settings, 'MAIL_CACHE', 'default')]
+        except InvalidCacheBackendError:
+            if self._fallback_cache is None:
+                self._fallback_cache = LocMemCache('mail', {})
+            return self._fallback_cache
+
+    @property
+    def batch_size(self):
+        """
+        :rtype: int
+        """
+        return getattr(settings, 'MAIL_BATCH_SIZE', 100)
+
+    @property
+    def batch_delay(self):
+        """
+        :rtype: int
+        """
+        return getattr(settings, 'MAIL_BATCH_DELAY', 5)
+
+    @property
+    def rate_limit(self):
+        """
+        :rtype: float | None
+        """
+        return getattr(settings, 'MAIL_RATE_LIMIT', None)
+
+    def claim_delivery(self):
+        """
+        Returns True if no delivery is scheduled, recording that the caller will schedule one.
+        The record is removed when that delivery starts, so mail queued after it schedules
+        another. It also expires in case the delivery is lost.
+
+        :rtype: bool
+        """
+        return self.cache.add(self.scheduled_key, True, self.batch_delay * 2)
+
+    def release_delivery(self):
+        """
+        Records that the scheduled delivery has started.
+        """
+        self.cache.delete(self.scheduled_key)
+
+    @staticmethod
+    def get_dedupe_key(recipient, subject, body):
+        """
+        Identifies a message to a recipient.
+
+        :type recipient: unicode
+        :type subject: unicode
+        :type body: unicode
+        :rtype: unicode
+        """
+        return hashlib.sha1(force_bytes('\n'.join((recipient.lower(), subject, body)))).hexdigest()
+
+    def enqueue(self, subject, body, from_email, recipients, html_body=''):
+        """
+        Queues a message to each recipient that is not already waiting for the same message.
+
+        :type subject: unicode
+        :type body: unicode
+        :type from_email: unicode
+        :type recipients: list[unicode]
+        :type html_body: unicode
+        :return: The number of messages queued
+        :rtype: int
+        """
+        keys = {}
+        for recipient in recipients:
+            keys.setdefault(self.get_dedupe_key(recipient, subject, body), recipient)
+        waiting = set(OutboundMail.objects.filter(
+            dedupe_key__in=keys.keys(), status=OutboundMail.PENDING
+        ).values_list('dedupe_key', flat=True))
+        OutboundMail.objects.bulk_create([
+            OutboundMail(
+                recipient=recipient,
+                from_email=from_email or '',
+                subject=subject,
+                body=body,
+                html_body=html_body or '',
+                dedupe_key=key,
+            )
+            for key, recipient in keys.items() if key not in waiting
+        ])
+        return len(keys) - len(waiting)
+
+    @transaction.atomic
+    def claim_batch(self):
+        """
+        Claims a batch of due mail by pushing its next attempt past the lease time, so other
+        deliveries skip it. If a worker dies while sending, the mail is due again when the
+        lease ends.
+
+        :rtype: list[OutboundMail]
+        """
+        pks = list(OutboundMail.objects.filter_due().select_for_update().values_list('pk', flat=True)[:self.batch_size])
+        OutboundMail.objects.filter(pk__in=pks).update(next_attempt_at=timezone.now() + self.lease_time)
+        return list(OutboundMail.objects.filter(pk__in=pks).order_by('pk'))
+
+    def get_connection(self):
+        """
+        Returns the open connection, opening one if needed.
+        """
+        if self.connection is None:
+            self.connection = mail.get_connection(fail_silently=False)
+            self.connection.open()
+        return self.connection
+
+    def close(self):
+        """
+        Closes the connection.
+        """
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except self.delivery_errors:
+                pass
+            self.connection = None
+
+    def throttle(self):
+        """
+        Waits long enough to keep to the rate limit.
+        """
+        if self.rate_limit and self.last_sent_at is not None:
+            wait = 1.0 / self.rate_limit - (self.clock() - self.last_sent_at)
+            if wait > 0:
+                self.sleep(wait)
+        self.last_sent_at = self.clock()
+
+    @staticmethod
+    def build_message(outbound_mail):
+        """
+        :type outbound_mail: OutboundMail
+        :rtype: EmailMessage
+        """
+        message = mail.EmailMultiAlternatives(
+            outbound_mail.subject,
+            outbound_mail.body,
+            outbound_mail.from_email or None,
+            [outbound_mail.recipient],
+        )
+        if outbound_mail.html_body:
+            message.attach_alternative(outbound_mail.html_body, 'text/html')
+        return message
+
+    def send(self, outbound_mail):
+        """
+        Sends a message over the connection. If the server has dropped the reused connection
+        it is opened again once.
+
+        :type outbound_mail: OutboundMail
+        """
+        message = self.build_message(outbound_mail)
+        self.throttle()
+        try:
+            self.get_connection().send_messages([message])
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            self.get_connection().send_messages([message])
+
+    def record_failure(self, outbound_mail, error):
+        """
+        Schedules the next attempt with exponential backoff, or gives up on the message.
+
+        :type outbound_mail: OutboundMail
+        :type error: Exception
+        """
+        attempts = outbound_mail.attempts + 1
+        updates = {'attempts': attempts, 'last_error': repr(error)}
+        if attempts >= self.max_attempts:
+            updates['status'] = OutboundMail.FAILED
+        else:
+            updates['next_attempt_at'] = timezone.now() + self.retry_delay * 2 ** (attempts - 1)
+        OutboundMail.objects.filter(dedupe_key=outbound_mail.dedupe_key, status=OutboundMail.PENDING).update(**updates)
+
+    def deliver(self):
+        """
+        Sends a batch of due mail.
+
+        If the connection fails the failed message is scheduled for a retry, the rest of the
+        batch is released to be sent by the next delivery, and the delivery stops.
+
+        :return: The number of messages sent and whether there is more mail due now.
+        :rtype: (int, bool)
+        """
+        batch = self.claim_batch()
+        sent = 0
+        seen = set()
+        for index, outbound_mail in enumerate(batch):
+            if outbound_mail.dedupe_key in seen:
+                continue
+            seen.add(outbound_mail.dedupe_key)
+            try:
+                self.send(outbound_mail)
+            except self.delivery_errors as e:
+                self.close()
+                self.record_failure(outbound_mail, e)
+                OutboundMail.objects.filter(
+                    pk__in=[other.pk for other in batch[index + 1:]], status=OutboundMail.PENDING
+                ).update(next_attempt_at=timezone.now())
+                return sent, False
+            OutboundMail.objects.filter(
+                dedupe_key=outbound_mail.dedupe_key, status=OutboundMail.PENDING
+            ).update(status=OutboundMail.SENT, date_sent=timezone.now())
+            sent += 1
+        return sent, len(batch) == self.batch_size and OutboundMail.objects.filter_due().exists()
+
+
+mail_pipeline = MailPipeline()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Creates any profiles missing for existing users.
+"""
+from optparse import make_option
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from tasks import queue_provision_profiles
+from rpg_auth.provisioning import profile_provisioner
+
+
+class Command(BaseCommand):
+    """
+    Backfills missing user profiles.
+    """
+    help = 'Creates the quest, character, message and notification profiles of users that are missing them.'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--batch-size',
+            action='store',
+            type='int',
+            dest='batch_size',
+            default=profile_provisioner.batch_size,
+            help='The number of users to create profiles for at a time.',
+        ),
+        make_option(
+            '--queue',
+            action='store_true',
+            dest='queue',
+            default=False,
+            help='Queue each batch to be created by the workers rather than creating them here.',
+        ),
+    )
+
+    def handle(self, *args, **options):
+        """
+        :type args: []
+        :type options: {}
+        """
+        user_model = get_user_model()
+        batch_size = options['batch_size']
+        if options['queue']:
+            user_pks = profile_provisioner.find_users_missing_profiles(user_model)
+            for start in range(0, len(user_pks), batch_size):
+                queue_provision_profiles.delay(user_pks[start:start + batch_size])
+            self.stdout.write('Queued profiles for {0} users.'.format(len(user_pks)))
+        else:
+            created = profile_provisioner.backfill(user_model, batch_size=batch_size)
+            for profile_model, count in sorted(created.items(), key=lambda item: item[0].__name__):
+                self.stdout.write('Created {0} {1} rows.'.format(count, profile_model.__name__))
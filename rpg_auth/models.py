@@ -6,11 +6,12 @@ from __future__ import unicode_literals
 import uuid
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.contrib.sites.shortcuts import get_current_site
-from django.db import models
-from django.template.loader import render_to_string
+from django.db import models, transaction, IntegrityError
+from django.db.models.signals import post_save
 from django.utils import timezone
 from django.utils.translation import ugettext as _
-from tasks import queue_send_mail
+from tasks import queue_user_mail
+from rpg_auth.provisioning import profile_provisioner
 
 
 class RpgUserManager(BaseUserManager):
@@ -18,9 +19,11 @@ class RpgUserManager(BaseUserManager):
     Custom manager for the SoJ User.
     """
 
+    @transaction.atomic
     def _create_user(self, pen_name, email, password, **extra_fields):
         """
-        Creates and saves a User with the given username, email and password.
+        Creates and saves a User with the given username, email and password. The user's
+        profiles are created in the same transaction.
         """
         now = timezone.now()
         email = self.normalize_email(email)
@@ -49,6 +52,35 @@ class RpgUserManager(BaseUserManager):
         kwargs.update(dict(is_superuser=True, is_staff=True, is_active=True))
         return self._create_user(**kwargs)
 
+    @transaction.atomic
+    def bulk_create_users(self, users, batch_size=None):
+        """
+        Creates many users, and all of their profiles, in bulk. Used for imports.
+
+        bulk_create does not send post_save or set pks, so the users are read back by email
+        and their profiles created a batch at a time. Emails are normalised first, as they are
+        when users are created one at a time, so they are stored as they are read back.
+
+        :type users: list[RpgUser]
+        :type batch_size: int
+        :return: The pks of the new users
+        :rtype: list[int]
+        :raises: IntegrityError if the users cannot all be read back
+        """
+        batch_size = batch_size or profile_provisioner.batch_size
+        for user in users:
+            user.email = self.normalize_email(user.email)
+        self.bulk_create(users, batch_size=batch_size)
+        emails = [user.email for user in users]
+        user_pks = []
+        for start in range(0, len(emails), batch_size):
+            user_pks.extend(self.filter(email__in=emails[start:start + batch_size]).values_list('pk', flat=True))
+        if len(user_pks) != len(users):
+            raise IntegrityError('Read back {0} of {1} bulk created users'.format(len(user_pks), len(users)))
+        for start in range(0, len(user_pks), batch_size):
+            profile_provisioner.provision(user_pks[start:start + batch_size], new_users=True)
+        return user_pks
+
     def get_by_activation_key(self, activation_key):
         """
         Gets a user by their activation key.
@@ -82,28 +114,32 @@ class RpgUser(AbstractBaseUser):
         """
         self.activation_key = uuid.uuid1()
 
-    def email_user(self, request, subject, template, context, from_email=None, **kwargs):
+    def email_user(self, request, subject, template, from_email=None, **kwargs):
         """
         Sends an email to this User.
 
+        Only the user's pk, the domain and the protocol are passed to the worker, which loads
+        the user and renders the template. The template is given the user, domain and protocol.
+
         :param subject: The subject of the email
         :param request: The request, used to get the domain
         :type request: HttpRequest
         :type subject: unicode
         :param template: The template to render the email message with
         :type template: unicode
-        :param context: The context that should be used when rendering the template
-        :type context: {}
         :param from_email: The email address the email should be from
         :type from_email: unicode
         :type kwargs: {}
         """
-        current_site = get_current_site(request)
-        context['domain'] = current_site.domain
-        context['protocol'] = 'https' if request.is_secure() else 'http',
-
-        message = render_to_string(template, context)
-        queue_send_mail.delay(subject, message, from_email, [self.email], **kwargs)
+        queue_user_mail.delay(
+            self.pk,
+            subject,
+            template,
+            get_current_site(request).domain,
+            'https' if request.is_secure() else 'http',
+            from_email,
+            **kwargs
+        )
 
     def send_welcome_email(self, request):
         """
@@ -111,10 +147,7 @@ class RpgUser(AbstractBaseUser):
 
         :type request: HttpRequest
         """
-        context = {
-            'user': self,
-        }
-        self.email_user(request, _('Welcome to SoJ!'), 'rpg_auth/email/activation_email.txt', context)
+        self.email_user(request, _('Welcome to SoJ!'), 'rpg_auth/email/activation_email.txt')
 
     def activate(self, request):
         """
@@ -123,12 +156,72 @@ class RpgUser(AbstractBaseUser):
         :type request: HttpRequest
         """
         self.is_active = True
-        context = {
-            'user': self,
-        }
+        self.save(update_fields=['is_active'])
         self.email_user(
             request,
             _('Your account has been activated!'),
             'rpg_auth/email/account_activated_email.txt',
-            context,
         )
+
+
+def provision_profiles(sender, **kwargs):
+    """
+    Catches users being created and creates all of their profiles.
+
+    :type sender: RpgUser
+    :type kwargs: {}
+    """
+    del sender
+    if kwargs['created']:
+        profile_provisioner.provision([kwargs['instance'].pk], new_users=True)
+post_save.connect(provision_profiles, sender=RpgUser)
+
+
+class OutboundMailManager(models.Manager):
+    """
+    Manager methods for queued mail.
+    """
+    def filter_due(self):
+        """
+        Returns pending mail that is due to be sent, oldest first.
+        """
+        return self.filter(
+            status=OutboundMail.PENDING, next_attempt_at__lte=timezone.now()
+        ).order_by('next_attempt_at', 'pk')
+
+
+class OutboundMail(models.Model):
+    """
+    An email waiting to be sent, or that has been sent, to a single recipient.
+
+    Mail is delivered in batches by the mail pipeline in rpg_auth.mail.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    recipient = models.EmailField()
+    from_email = models.CharField(max_length=254, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    dedupe_key = models.CharField(max_length=40, db_index=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    date_created = models.DateTimeField(auto_now_add=True)
+    date_sent = models.DateTimeField(null=True, blank=True)
+
+    objects = OutboundMailManager()
+
+    class Meta(object):
+        """
+        Meta properties
+        """
+        index_together = [('status', 'next_attempt_at')]
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Creates the profiles each user needs in the other apps.
+
+Apps register their profile models with the provisioner rather than each listening for
+users being saved. When a user is created all of their profiles are inserted in one
+transaction, and users created in bulk, or missing profiles, have each profile model
+inserted with a single bulk_create per batch.
+"""
+from django.db import transaction
+
+
+class ProfileProvisioner(object):
+    """
+    Registry of per-user profile models.
+    """
+    batch_size = 500
+
+    def __init__(self):
+        super(ProfileProvisioner, self).__init__()
+        self.profile_models = []
+
+    def register(self, profile_model):
+        """
+        Registers a model with a one-to-one `user` field to be created for every user.
+
+        :type profile_model: type
+        :return: The model, so this can be used as a class decorator.
+        """
+        if profile_model not in self.profile_models:
+            self.profile_models.append(profile_model)
+        return profile_model
+
+    @transaction.atomic
+    def provision(self, user_pks, new_users=False):
+        """
+        Creates any missing profiles for the users.
+
+        :param user_pks: The pks of the users
+        :type user_pks: list[int]
+        :param new_users: If True the users are known to have no profiles, so they are not looked for.
+        :type new_users: bool
+        :return: Dict of profile model to the number created.
+        :rtype: {}
+        """
+        created = {}
+        for profile_model in self.profile_models:
+            missing = list(user_pks)
+            if not new_users:
+                existing = set(
+                    profile_model.objects.filter(user__in=user_pks).values_list('user_id', flat=True)
+                )
+                missing = [user_pk for user_pk in user_pks if user_pk not in existing]
+            profile_model.objects.bulk_create(
+                [profile_model(user_id=user_pk) for user_pk in missing], batch_size=self.batch_size
+            )
+            created[profile_model] = len(missing)
+        return created
+
+    def find_users_missing_profiles(self, user_model):
+        """
+        Returns the pks of users missing any profile, in pk order.
+
+        :type user_model: type
+        :rtype: list[int]
+        """
+        missing = set()
+        for profile_model in self.profile_models:
+            missing.update(
+                user_model.objects.exclude(pk__in=profile_model.objects.values('user_id')).values_list('pk', flat=True)
+            )
+        return sorted(missing)
+
+    def backfill(self, user_model, batch_size=None):
+        """
+        Creates missing profiles for every user, a batch of users at a time.
+
+        :type user_model: type
+        :type batch_size: int
+        :return: Dict of profile model to the number created.
+        :rtype: {}
+        """
+        batch_size = batch_size or self.batch_size
+        created = dict((profile_model, 0) for profile_model in self.profile_models)
+        user_pks = self.find_users_missing_profiles(user_model)
+        for start in range(0, len(user_pks), batch_size):
+            for profile_model, count in self.provision(user_pks[start:start + batch_size]).items():
+                created[profile_model] += count
+        return created
+
+
+profile_provisioner = ProfileProvisioner()
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Tests mail is queued and delivered in batches.
+"""
+import smtplib
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from mock import patch
+from tasks import deliver_queued_mail, queue_send_mail
+from rpg_auth.mail import MailPipeline, mail_pipeline
+from rpg_auth.models import OutboundMail
+from rpg_auth.tests.utils import SessionCountingEmailBackend
+
+
+@override_settings(EMAIL_BACKEND='rpg_auth.tests.utils.SessionCountingEmailBackend', MAIL_BATCH_SIZE=10)
+class MailPipelineTestCase(TestCase):
+    """
+    Tests the mail pipeline.
+    """
+    def setUp(self):
+        super(MailPipelineTestCase, self).setUp()
+        cache.clear()
+        SessionCountingEmailBackend.sessions = 0
+        SessionCountingEmailBackend.fail_with = None
+        self.pipeline = MailPipeline(sleep=self.sleep, clock=lambda: 0)
+        self.slept = []
+
+    def tearDown(self):
+        SessionCountingEmailBackend.fail_with = None
+        self.pipeline.close()
+        mail_pipeline.close()
+        super(MailPipelineTestCase, self).tearDown()
+
+    def sleep(self, seconds):
+        """
+        Records waits rather than waiting.
+        """
+        self.slept.append(seconds)
+
+    def enqueue(self, count, subject=u'Subject'):
+        """
+        Queues a message to each of count recipients.
+        """
+        return self.pipeline.enqueue(
+            subject, u'Body', u'from@example.com', [u'user{0}@example.com'.format(i) for i in range(count)]
+        )
+
+    def test_batch_is_sent_over_one_connection(self):
+        """
+        A batch is sent over a single connection, which is reused by the next batch.
+        """
+        self.enqueue(15)
+        self.assertEquals(self.pipeline.deliver(), (10, True))
+        self.assertEquals(self.pipeline.deliver(), (5, False))
+        self.assertEquals(len(mail.outbox), 15)
+        self.assertEquals(SessionCountingEmailBackend.sessions, 1)
+
+    def test_duplicates_are_sent_once(self):
+        """
+        The same message queued twice for a recipient before it is sent is sent once.
+        """
+        self.assertEquals(self.enqueue(3), 3)
+        self.assertEquals(self.enqueue(3), 0)
+        self.enqueue(1, subject=u'Other')
+        self.pipeline.deliver()
+        self.assertEquals(len(mail.outbox), 4)
+        self.enqueue(1)
+        self.pipeline.deliver()
+        self.assertEquals(len(mail.outbox), 5)
+
+    def test_failures_are_retried_with_backoff(self):
+        """
+        A failed message is retried later, and the rest of the batch is left for the next delivery.
+        """
+        self.enqueue(3)
+        SessionCountingEmailBackend.fail_with = smtplib.SMTPException('Down')
+        self.assertEquals(self.pipeline.deliver(), (0, False))
+        failed = OutboundMail.objects.get(attempts=1)
+        self.assertGreater(failed.next_attempt_at, timezone.now() + timedelta(seconds=50))
+        SessionCountingEmailBackend.fail_with = None
+        self.assertEquals(self.pipeline.deliver(), (2, False))
+        OutboundMail.objects.filter(pk=failed.pk).update(next_attempt_at=timezone.now())
+        self.assertEquals(self.pipeline.deliver(), (1, False))
+        self.assertEquals(OutboundMail.objects.filter(status=OutboundMail.SENT).count(), 3)
+
+    def test_mail_is_given_up_after_max_attempts(self):
+        """
+        Mail that keeps failing is marked as failed.
+        """
+        self.enqueue(1)
+        SessionCountingEmailBackend.fail_with = smtplib.SMTPException('Down')
+        for attempt in range(self.pipeline.max_attempts):
+            OutboundMail.objects.update(next_attempt_at=timezone.now())
+            self.pipeline.deliver()
+        self.assertEquals(OutboundMail.objects.get().status, OutboundMail.FAILED)
+
+    @override_settings(MAIL_RATE_LIMIT=4)
+    def test_sending_is_rate_limited(self):
+        """
+        Messages are spaced out to keep to the rate limit.
+        """
+        self.enqueue(3)
+        self.pipeline.deliver()
+        self.assertEquals(self.slept, [0.25, 0.25])
+
+    def test_queue_send_mail_task_delivers(self):
+        """
+        The task queues the mail and delivers it.
+        """
+        queue_send_mail(u'Subject', u'Body', u'from@example.com', [u'user@example.com'], html_message=u'<p>Body</p>')
+        self.assertEquals(len(mail.outbox), 1)
+        self.assertEquals(mail.outbox[0].to, [u'user@example.com'])
+        self.assertEquals(mail.outbox[0].alternatives, [(u'<p>Body</p>', 'text/html')])
+
+    def test_burst_of_mail_schedules_one_delivery(self):
+        """
+        Mail queued while a delivery is scheduled is left to that delivery, and mail queued once it has
+        started schedules another.
+        """
+        with patch('tasks.deliver_queued_mail.apply_async') as apply_async:
+            for i in range(5):
+                queue_send_mail(u'Subject {0}'.format(i), u'Body', u'from@example.com', [u'user@example.com'])
+            self.assertEquals(apply_async.call_count, 1)
+            deliver_queued_mail()
+            self.assertEquals(len(mail.outbox), 5)
+            queue_send_mail(u'Subject', u'Body', u'from@example.com', [u'user@example.com'])
+            self.assertEquals(apply_async.call_count, 2)
+
+    def test_password_reset_mail_is_queued(self):
+        """
+        Password reset mail goes through the pipeline rather than being sent on the request.
+        """
+        get_user_model().objects.create_user(
+            pen_name=u'Pen Name', password=u'password', email=u'user@example.com', is_active=True
+        )
+        response = self.client.post(reverse('rpg_auth:password_request_form'), {'email': u'user@example.com'})
+        self.assertEquals(response.status_code, 302)
+        self.assertEquals(list(OutboundMail.objects.values_list('recipient', flat=True)), [u'user@example.com'])
+        self.assertEquals(len(mail.outbox), 1)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Tests users are given all of their profiles.
+"""
+from StringIO import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from characters.models import CharacterProfile
+from notifications.models import NotificationProfile
+from private_messages.models import MessageProfile
+from quests.models import QuestProfile
+from rpg_auth.provisioning import profile_provisioner
+
+PROFILE_MODELS = (CharacterProfile, MessageProfile, NotificationProfile, QuestProfile)
+
+
+class ProfileProvisioningTestCase(TestCase):
+    """
+    Tests the profile provisioner.
+    """
+    def build_users(self, count):
+        """
+        Builds unsaved users.
+        """
+        return [
+            get_user_model()(pen_name=u'User {0}'.format(i), email=u'user{0}@example.com'.format(i))
+            for i in range(count)
+        ]
+
+    @staticmethod
+    def count_statements(context):
+        """
+        Counts the captured queries, leaving out savepoints.
+        """
+        return len([query for query in context.captured_queries if 'SAVEPOINT' not in query['sql']])
+
+    def assertAllUsersHaveProfiles(self):
+        """
+        Every user has one of each profile.
+        """
+        user_count = get_user_model().objects.count()
+        for profile_model in PROFILE_MODELS:
+            self.assertEquals(profile_model.objects.count(), user_count, profile_model.__name__)
+
+    def test_all_profile_models_are_registered(self):
+        """
+        Each app's profile model is registered.
+        """
+        self.assertEquals(set(profile_provisioner.profile_models), set(PROFILE_MODELS))
+
+    def test_creating_a_user_creates_profiles(self):
+        """
+        Creating a user creates each profile with a single insert.
+        """
+        with CaptureQueriesContext(connection) as context:
+            user = get_user_model().objects.create(pen_name=u'User', email=u'user@example.com')
+        self.assertEquals(self.count_statements(context), 1 + len(PROFILE_MODELS))
+        self.assertIsInstance(user.quest_profile, QuestProfile)
+        self.assertAllUsersHaveProfiles()
+
+    def test_bulk_created_users_have_profiles(self):
+        """
+        Users created in bulk have their profiles created in bulk.
+        """
+        with CaptureQueriesContext(connection) as context:
+            user_pks = get_user_model().objects.bulk_create_users(self.build_users(50))
+        self.assertEquals(self.count_statements(context), 2 + len(PROFILE_MODELS))
+        self.assertEquals(len(user_pks), 50)
+        self.assertAllUsersHaveProfiles()
+
+    def test_bulk_created_emails_are_normalised(self):
+        """
+        Users whose email has an upper case domain are stored normalised and still get their profiles.
+        """
+        users = self.build_users(3)
+        for user in users:
+            user.email = user.email.replace(u'example.com', u'EXAMPLE.COM')
+        user_pks = get_user_model().objects.bulk_create_users(users)
+        self.assertEquals(len(user_pks), 3)
+        self.assertEquals(
+            set(get_user_model().objects.values_list('email', flat=True)),
+            {u'user0@example.com', u'user1@example.com', u'user2@example.com'}
+        )
+        self.assertAllUsersHaveProfiles()
+
+    def test_backfill_creates_missing_profiles(self):
+        """
+        The management command creates only the missing profiles.
+        """
+        get_user_model().objects.bulk_create(self.build_users(5))
+        get_user_model().objects.create(pen_name=u'User', email=u'user@example.com')
+        out = StringIO()
+        call_command('provision_profiles', batch_size=2, stdout=out)
+        self.assertAllUsersHaveProfiles()
+        self.assertIn('Created 5 QuestProfile rows.', out.getvalue())
+
+    def test_backfill_can_be_queued(self):
+        """
+        The backfill can be handed to the workers.
+        """
+        get_user_model().objects.bulk_create(self.build_users(3))
+        call_command('provision_profiles', queue=True, stdout=StringIO())
+        self.assertAllUsersHaveProfiles()
+        self.assertEquals(profile_provisioner.find_users_missing_profiles(get_user_model()), [])
@@ -94,7 +94,7 @@ class UserCanCreateAccountTestCase(RegistrationTestCaseStub):
         self.assertFormError(response, 'form', 'password2', 'Your passwords did not match.')
 
     @patch('celery.Celery')
-    @patch('tasks.queue_send_mail.delay')
+    @patch('tasks.queue_user_mail.delay')
     def test_if_valid_data_supplied_a_user_is_created(self, patched_delay, patched_celery):
         """
         If valid data is provided a user is created.
@@ -122,7 +122,7 @@ class SendingWelcomeEmailTestCase(RegistrationTestCaseStub):
         self.assertEquals(user.activation_key, 'demo-uuid')
 
     @patch('celery.Celery')
-    @patch('tasks.queue_send_mail.delay')
+    @patch('tasks.queue_user_mail.delay')
     def test_user_can_be_sent_activation_email(self, patched_delay, patched_celery):
         """
         Once a user has an activation key it can be emailed to them.
@@ -187,7 +187,7 @@ class ActivationProcessTestCase(TestCase):
         self.assertEquals(response.status_code, 404)
 
     @patch('celery.Celery')
-    @patch('tasks.queue_send_mail.delay')
+    @patch('tasks.queue_user_mail.delay')
     def test_posting_to_activation_activates_user(self, patched_delay, patched_celery):
         """
         A post to activation view will activate the user.
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Tests emails to users are rendered by the worker.
+"""
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.test import TestCase
+from mock import patch
+from notifications.rendering import template_registry
+from soj.tests.utils import MockRequest
+
+
+class UserMailTestCase(TestCase):
+    """
+    Tests RpgUser.email_user.
+    """
+    def setUp(self):
+        super(UserMailTestCase, self).setUp()
+        self.user = get_user_model().objects.create_user(
+            pen_name=u'Pen Name', password=u'password', email=u'test@example.com'
+        )
+        template_registry.clear()
+
+    @patch('tasks.queue_user_mail.delay')
+    def test_only_minimal_context_is_queued(self, patched_delay):
+        """
+        The request only queues the user's pk, the domain and the protocol.
+        """
+        self.user.send_welcome_email(MockRequest())
+        self.assertEquals(
+            patched_delay.call_args[0][:5],
+            (self.user.pk, u'Welcome to SoJ!', 'rpg_auth/email/activation_email.txt', 'host', 'https'),
+        )
+
+    def test_worker_renders_and_sends(self):
+        """
+        The worker renders the template and sends the mail.
+        """
+        self.user.send_welcome_email(MockRequest())
+        self.assertEquals(len(mail.outbox), 1)
+        self.assertEquals(mail.outbox[0].to, [u'test@example.com'])
+        self.assertIn(u'Please activate your account.', mail.outbox[0].body)
+
+    @patch('notifications.rendering.get_template')
+    def test_templates_are_compiled_once(self, patched_get_template):
+        """
+        The worker compiles each template once.
+        """
+        patched_get_template.return_value.render.return_value = u'Body'
+        self.user.send_welcome_email(MockRequest())
+        self.user.send_welcome_email(MockRequest())
+        self.assertEquals(patched_get_template.call_count, 1)
@@ -3,15 +3,19 @@
 Utils that provide useful starting points for tests.
 """
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.mail.backends import locmem
 from django.test import TestCase
 
 
 class CreateUserMixin(TestCase):
     """
-    Mixin that comes with a user, ready to login and use.
+    Mixin that comes with a user, ready to login and use. The cache is cleared so that
+    counts cached by earlier tests are not seen.
     """
     def setUp(self):
         super(CreateUserMixin, self).setUp()
+        cache.clear()
         self.user = get_user_model().objects.create_user(
             pen_name='Pen Name',
             password='password',
@@ -19,3 +23,28 @@ class CreateUserMixin(TestCase):
             is_active=True,
         )
         self.client.login(username=self.user.email, password='password')
+
+
+class SessionCountingEmailBackend(locmem.EmailBackend):
+    """
+    Local memory email backend that counts the connections opened, standing in for SMTP in tests.
+
+    Set fail_with to an exception to have sending raise it.
+    """
+    sessions = 0
+    fail_with = None
+
+    def open(self):
+        """
+        Counts the connection.
+        """
+        SessionCountingEmailBackend.sessions += 1
+        return True
+
+    def send_messages(self, messages):
+        """
+        Stores the messages, or raises fail_with.
+        """
+        if SessionCountingEmailBackend.fail_with is not None:
+            raise SessionCountingEmailBackend.fail_with
+        return super(SessionCountingEmailBackend, self).send_messages(messages)
@@ -4,6 +4,7 @@ URLs for the auth app.
 """
 from django.conf.urls import patterns, url
 from django.views.generic import TemplateView
+from rpg_auth.forms import PasswordRequestForm
 from rpg_auth.views import UserCreateView, ActivateFormView
 
 
@@ -66,6 +67,7 @@ urlpatterns += patterns(
             'template_name': 'rpg_auth/password_request_form.html',
             'post_reset_redirect': 'rpg_auth:password_request_form_confirmation',
             'email_template_name': 'rpg_auth/email/password_request_email.txt',
+            'password_reset_form': PasswordRequestForm,
         },
         name='password_request_form'
     ),
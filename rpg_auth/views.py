@@ -30,6 +30,7 @@ class UserCreateView(CreateView):
         """
         response = super(UserCreateView, self).form_valid(form)
         self.object.generate_activation_key()
+        self.object.save(update_fields=['activation_key'])
         self.object.send_welcome_email(self.request)
         return response
 
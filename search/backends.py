@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""
+Search backends hold the inverted index and answer queries against it.
+
+SqliteFtsBackend uses an SQLite FTS5 table, ranking with bm25 and highlighting with
+snippet. DatabaseSearchBackend keeps its own inverted index in ordinary tables, so works
+on any database. settings.SEARCH_BACKEND may name a backend class; by default FTS5 is
+used on SQLite and the database backend elsewhere. Each backend works on the database alias it
+is created with.
+"""
+from __future__ import unicode_literals
+import math
+import re
+from collections import Counter
+from django.conf import settings
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import Count
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+TERM_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    """
+    Splits text into lower case terms.
+
+    :type text: unicode
+    :rtype: list[unicode]
+    """
+    return [term.lower() for term in TERM_PATTERN.findall(text or '')]
+
+
+def highlight(text, terms, words=24):
+    """
+    Returns an escaped extract of the text around the first matching term, with matching
+    terms wrapped in <mark>.
+
+    :type text: unicode
+    :type terms: set[unicode]
+    :param words: The number of words in the extract
+    :type words: int
+    :rtype: SafeText
+    """
+    matches = list(TERM_PATTERN.finditer(text or ''))
+    first = next((i for i, match in enumerate(matches) if match.group().lower() in terms), 0)
+    start = max(0, first - words // 4)
+    window = matches[start:start + words]
+    if not window:
+        return mark_safe('')
+    parts = ['&hellip;' if start > 0 else '']
+    position = window[0].start() if start > 0 else 0
+    for match in window:
+        parts.append(escape(text[position:match.start()]))
+        if match.group().lower() in terms:
+            parts.append('<mark>{0}</mark>'.format(escape(match.group())))
+        else:
+            parts.append(escape(match.group()))
+        position = match.end()
+    if start + words < len(matches):
+        parts.append('&hellip;')
+    else:
+        parts.append(escape(text[position:]))
+    return mark_safe(''.join(parts))
+
+
+class SearchHit(object):
+    """
+    A document matching a query.
+    """
+    def __init__(self, doc_type, object_pk, score, snippet):
+        """
+        :type doc_type: unicode
+        :type object_pk: int
+        :param score: Higher scores are better matches
+        :type score: float
+        :param snippet: Extract of the document with the matches highlighted
+        :type snippet: SafeText
+        """
+        super(SearchHit, self).__init__()
+        self.doc_type = doc_type
+        self.object_pk = object_pk
+        self.score = score
+        self.snippet = snippet
+
+
+class BaseSearchBackend(object):
+    """
+    The interface of a search backend.
+    """
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        """
+        :param using: The alias of the database the index is kept in
+        :type using: unicode
+        """
+        super(BaseSearchBackend, self).__init__()
+        self.using = using
+
+    @property
+    def connection(self):
+        """
+        The connection to the database the index is kept in.
+        """
+        return connections[self.using]
+
+    def create(self):
+        """
+        Creates any storage the backend needs. Safe to call when it already exists.
+        """
+
+    def index(self, document_type, object_pk, title, body):
+        """
+        Adds or replaces a document.
+
+        :type document_type: DocumentType
+        :type object_pk: int
+        :type title: unicode
+        :type body: unicode
+        """
+        raise NotImplementedError
+
+    def remove(self, document_type, object_pk):
+        """
+        :type document_type: DocumentType
+        :type object_pk: int
+        """
+        raise NotImplementedError
+
+    def indexed_pks(self, document_type):
+        """
+        Returns the pks of the indexed documents of a type.
+
+        :type document_type: DocumentType
+        :rtype: set[int]
+        """
+        raise NotImplementedError
+
+    def clear(self):
+        """
+        Removes every document.
+        """
+        raise NotImplementedError
+
+    def search(self, query, document_types, limit, offset=0):
+        """
+        Returns the best matching documents for the query, best first. Every term in the
+        query must match.
+
+        :type query: unicode
+        :type document_types: list[DocumentType]
+        :type limit: int
+        :type offset: int
+        :rtype: list[SearchHit]
+        """
+        raise NotImplementedError
+
+
+class SqliteFtsBackend(BaseSearchBackend):
+    """
+    Stores documents in an FTS5 virtual table. Each document's rowid is made from its pk and
+    its type's code so it can be replaced without scanning the table.
+    """
+    table = 'search_fts'
+    code_range = 16
+    title_weight = 10.0
+    body_weight = 1.0
+    snippet_words = 24
+
+    def create(self):
+        self.connection.cursor().execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5('
+            'doc_type UNINDEXED, title, body, tokenize = \'porter unicode61\')'.format(self.table)
+        )
+
+    def get_rowid(self, document_type, object_pk):
+        """
+        :type document_type: DocumentType
+        :type object_pk: int
+        :rtype: int
+        """
+        return object_pk * self.code_range + document_type.code
+
+    def index(self, document_type, object_pk, title, body):
+        rowid = self.get_rowid(document_type, object_pk)
+        with transaction.atomic(using=self.using):
+            cursor = self.connection.cursor()
+            cursor.execute('DELETE FROM {0} WHERE rowid = %s'.format(self.table), [rowid])
+            cursor.execute(
+                'INSERT INTO {0} (rowid, doc_type, title, body) VALUES (%s, %s, %s, %s)'.format(self.table),
+                [rowid, document_type.name, title, body],
+            )
+
+    def remove(self, document_type, object_pk):
+        self.connection.cursor().execute(
+            'DELETE FROM {0} WHERE rowid = %s'.format(self.table), [self.get_rowid(document_type, object_pk)]
+        )
+
+    def indexed_pks(self, document_type):
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT rowid FROM {0} WHERE doc_type = %s'.format(self.table), [document_type.name])
+        return set(rowid // self.code_range for rowid, in cursor.fetchall())
+
+    def clear(self):
+        self.connection.cursor().execute('DELETE FROM {0}'.format(self.table))
+
+    @staticmethod
+    def get_match_expression(query):
+        """
+        Quotes each term so the query cannot use FTS5 syntax.
+
+        :type query: unicode
+        :rtype: unicode
+        """
+        return ' '.join('"{0}"'.format(term) for term in tokenize(query))
+
+    @staticmethod
+    def mark_snippet(snippet):
+        """
+        Escapes a snippet, turning the placeholder marks into <mark> tags.
+
+        :type snippet: unicode
+        :rtype: SafeText
+        """
+        return mark_safe(escape(snippet).replace('\x02', '<mark>').replace('\x03', '</mark>'))
+
+    def search(self, query, document_types, limit, offset=0):
+        match = self.get_match_expression(query)
+        if not match or not document_types:
+            return []
+        by_code = dict((document_type.code, document_type) for document_type in document_types)
+        cursor = self.connection.cursor()
+        cursor.execute(
+            'SELECT rowid, bm25({0}, 0.0, %s, %s) AS rank, '
+            'snippet({0}, 2, %s, %s, %s, %s), snippet({0}, 1, %s, %s, %s, %s) '
+            'FROM {0} WHERE {0} MATCH %s AND doc_type IN ({1}) '
+            'ORDER BY rank LIMIT %s OFFSET %s'.format(self.table, ', '.join(['%s'] * len(by_code))),
+            [self.title_weight, self.body_weight] +
+            ['\x02', '\x03', '…', self.snippet_words] * 2 +
+            [match] + [document_type.name for document_type in document_types] + [limit, offset],
+        )
+        hits = []
+        for rowid, rank, body_snippet, title_snippet in cursor.fetchall():
+            snippet = body_snippet if '\x02' in body_snippet or '\x02' not in title_snippet else title_snippet
+            hits.append(SearchHit(
+                by_code[rowid % self.code_range].name, rowid // self.code_range, -rank, self.mark_snippet(snippet)
+            ))
+        return hits
+
+
+class DatabaseSearchBackend(BaseSearchBackend):
+    """
+    Keeps an inverted index of terms to documents in the IndexedDocument and IndexedTerm
+    tables. Documents are ranked by tf-idf, with terms in the title weighted higher. Matching,
+    ranking and paging are done by the database, so only the page of documents is loaded.
+    """
+    title_weight = 10.0
+    search_sql = (
+        'SELECT {term}.{document}, SUM({term}.{frequency} * CASE WHEN {term}.{in_title} THEN %s ELSE 1.0 END * '
+        'CASE {term}.{term_text} {idf_cases} ELSE 0.0 END) AS score '
+        'FROM {term} INNER JOIN {document_table} ON {document_table}.{pk} = {term}.{document} '
+        'WHERE {term}.{term_text} IN ({terms}) AND {document_table}.{doc_type} IN ({doc_types}) '
+        'GROUP BY {term}.{document} HAVING COUNT(*) = %s '
+        'ORDER BY score DESC, {term}.{document} LIMIT %s OFFSET %s'
+    )
+
+    @staticmethod
+    def get_models():
+        """
+        :rtype: (type, type)
+        """
+        from search.models import IndexedDocument, IndexedTerm
+        return IndexedDocument, IndexedTerm
+
+    def index(self, document_type, object_pk, title, body):
+        indexed_document_model, indexed_term_model = self.get_models()
+        with transaction.atomic(using=self.using):
+            document, created = indexed_document_model.objects.using(self.using).update_or_create(
+                doc_type=document_type.name, object_pk=object_pk, defaults={'title': title, 'body': body}
+            )
+            if not created:
+                indexed_term_model.objects.using(self.using).filter(document=document).delete()
+            title_terms = set(tokenize(title))
+            indexed_term_model.objects.using(self.using).bulk_create([
+                indexed_term_model(
+                    document=document, term=term[:100], frequency=frequency, in_title=term in title_terms
+                )
+                for term, frequency in Counter(tokenize(title) + tokenize(body)).items()
+            ])
+
+    def remove(self, document_type, object_pk):
+        indexed_document_model = self.get_models()[0]
+        indexed_document_model.objects.using(self.using).filter(
+            doc_type=document_type.name, object_pk=object_pk
+        ).delete()
+
+    def indexed_pks(self, document_type):
+        indexed_document_model = self.get_models()[0]
+        return set(indexed_document_model.objects.using(self.using).filter(
+            doc_type=document_type.name
+        ).values_list('object_pk', flat=True))
+
+    def clear(self):
+        indexed_document_model = self.get_models()[0]
+        indexed_document_model.objects.using(self.using).all().delete()
+
+    def get_idfs(self, terms, doc_types):
+        """
+        Returns the inverse document frequency of each term that is in any document of the types.
+
+        :type terms: set[unicode]
+        :type doc_types: list[unicode]
+        :rtype: {}
+        """
+        indexed_document_model, indexed_term_model = self.get_models()
+        document_count = indexed_document_model.objects.using(self.using).count()
+        document_frequencies = indexed_term_model.objects.using(self.using).filter(
+            term__in=terms, document__doc_type__in=doc_types
+        ).values_list('term').annotate(Count('pk'))
+        return dict(
+            (term, math.log(1.0 + float(document_count) / frequency)) for term, frequency in document_frequencies
+        )
+
+    def search(self, query, document_types, limit, offset=0):
+        indexed_document_model, indexed_term_model = self.get_models()
+        terms = set(term[:100] for term in tokenize(query))
+        if not terms or not document_types:
+            return []
+        doc_types = [document_type.name for document_type in document_types]
+        idfs = self.get_idfs(terms, doc_types)
+        if len(idfs) < len(terms):
+            return []
+        quote_name = self.connection.ops.quote_name
+        term_opts, document_opts = indexed_term_model._meta, indexed_document_model._meta
+        sql = self.search_sql.format(
+            term=quote_name(term_opts.db_table),
+            document=quote_name(term_opts.get_field('document').column),
+            frequency=quote_name(term_opts.get_field('frequency').column),
+            in_title=quote_name(term_opts.get_field('in_title').column),
+            term_text=quote_name(term_opts.get_field('term').column),
+            idf_cases=' '.join(['WHEN %s THEN %s'] * len(idfs)),
+            document_table=quote_name(document_opts.db_table),
+            pk=quote_name(document_opts.pk.column),
+            doc_type=quote_name(document_opts.get_field('doc_type').column),
+            terms=', '.join(['%s'] * len(idfs)),
+            doc_types=', '.join(['%s'] * len(doc_types)),
+        )
+        params = [self.title_weight]
+        for term, idf in idfs.items():
+            params.extend([term, idf])
+        params.extend(list(idfs) + doc_types + [len(idfs), limit, offset])
+        cursor = self.connection.cursor()
+        cursor.execute(sql, params)
+        scores = cursor.fetchall()
+        documents = indexed_document_model.objects.using(self.using).in_bulk([pk for pk, score in scores])
+        return [
+            SearchHit(
+                documents[pk].doc_type,
+                documents[pk].object_pk,
+                float(score),
+                highlight(documents[pk].body or documents[pk].title, terms),
+            )
+            for pk, score in scores
+        ]
+
+
+def get_backend(using=DEFAULT_DB_ALIAS):
+    """
+    Returns the configured backend, or the default backend for the database.
+
+    :type using: unicode
+    :rtype: BaseSearchBackend
+    """
+    backend_path = getattr(settings, 'SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)(using)
+    if connections[using].vendor == 'sqlite':
+        return SqliteFtsBackend(using)
+    return DatabaseSearchBackend(using)
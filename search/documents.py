@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+The kinds of document the search index holds.
+
+Each document type says which model it indexes and which fields make up the title and
+body of its documents. Posts, quests and characters are registered here.
+"""
+from __future__ import unicode_literals
+from characters.models import Character
+from quests.models import Post, Quest
+
+
+class DocumentType(object):
+    """
+    A model whose rows are indexed as documents.
+    """
+    def __init__(self, name, code, model, title_fields, body_fields, select_related=()):
+        """
+        :param name: Identifies the type in the index and in search requests, e.g. 'post'
+        :type name: unicode
+        :param code: A small number, unique to the type, that backends can use to identify it
+        :type code: int
+        :type model: type
+        :type title_fields: list[unicode]
+        :type body_fields: list[unicode]
+        :param select_related: Relations loaded with the objects, for building results
+        :type select_related: ()
+        """
+        super(DocumentType, self).__init__()
+        self.name = name
+        self.code = code
+        self.model = model
+        self.title_fields = title_fields
+        self.body_fields = body_fields
+        self.select_related = select_related
+
+    def get_queryset(self):
+        """
+        :rtype: QuerySet
+        """
+        return self.model._default_manager.select_related(*self.select_related)
+
+    @staticmethod
+    def join_fields(obj, fields):
+        """
+        :rtype: unicode
+        """
+        return '\n'.join(unicode(getattr(obj, field)) for field in fields if getattr(obj, field))
+
+    def get_title(self, obj):
+        """
+        :rtype: unicode
+        """
+        return self.join_fields(obj, self.title_fields)
+
+    def get_body(self, obj):
+        """
+        :rtype: unicode
+        """
+        return self.join_fields(obj, self.body_fields)
+
+
+class DocumentRegistry(object):
+    """
+    The registered document types.
+    """
+    def __init__(self):
+        super(DocumentRegistry, self).__init__()
+        self.document_types = []
+
+    def register(self, document_type):
+        """
+        :type document_type: DocumentType
+        """
+        self.document_types.append(document_type)
+
+    def get(self, name):
+        """
+        :type name: unicode
+        :rtype: DocumentType
+        :raises: KeyError
+        """
+        for document_type in self.document_types:
+            if document_type.name == name:
+                return document_type
+        raise KeyError(name)
+
+    def for_model(self, model):
+        """
+        Returns the document type for a model, or None if it is not indexed.
+
+        :type model: type
+        :rtype: DocumentType | None
+        """
+        for document_type in self.document_types:
+            if document_type.model is model:
+                return document_type
+        return None
+
+    def __iter__(self):
+        return iter(self.document_types)
+
+
+document_registry = DocumentRegistry()
+document_registry.register(DocumentType('post', 1, Post, [], ['content'], select_related=('quest', 'character')))
+document_registry.register(DocumentType('quest', 2, Quest, ['title'], ['description']))
+document_registry.register(DocumentType(
+    'character', 3, Character, ['name'], ['physical_description', 'personality', 'skills', 'full_biography']
+))
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+The search index: keeps documents up to date and turns backend hits into results.
+"""
+from __future__ import unicode_literals
+from django.db import transaction
+from search.backends import get_backend
+from search.documents import document_registry
+from search.models import IndexState
+
+
+class SearchResult(object):
+    """
+    An object matching a search.
+    """
+    def __init__(self, hit, obj):
+        """
+        :type hit: SearchHit
+        :type obj: Model
+        """
+        super(SearchResult, self).__init__()
+        self.doc_type = hit.doc_type
+        self.score = hit.score
+        self.snippet = hit.snippet
+        self.object = obj
+
+    @property
+    def title(self):
+        """
+        :rtype: unicode
+        """
+        if self.doc_type == 'post':
+            return self.object.quest.title
+        return unicode(getattr(self.object, 'title', None) or self.object)
+
+    @property
+    def url(self):
+        """
+        :rtype: unicode
+        """
+        if hasattr(self.object, 'get_absolute_url'):
+            return self.object.get_absolute_url()
+        return None
+
+
+class SearchPage(object):
+    """
+    A page of search results.
+    """
+    def __init__(self, results, has_next):
+        """
+        :type results: list[SearchResult]
+        :type has_next: bool
+        """
+        super(SearchPage, self).__init__()
+        self.results = results
+        self.has_next = has_next
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+
+class SearchIndex(object):
+    """
+    Indexes objects of the registered document types and searches them.
+    """
+    batch_size = 500
+
+    def __init__(self, backend=None):
+        """
+        :type backend: BaseSearchBackend
+        """
+        super(SearchIndex, self).__init__()
+        self._backend = backend
+
+    @property
+    def backend(self):
+        """
+        :rtype: BaseSearchBackend
+        """
+        if self._backend is None:
+            self._backend = get_backend()
+        return self._backend
+
+    def update_object(self, obj):
+        """
+        Indexes the object if it is of a registered type.
+
+        :type obj: Model
+        """
+        document_type = document_registry.for_model(type(obj))
+        if document_type is not None:
+            self.backend.index(document_type, obj.pk, document_type.get_title(obj), document_type.get_body(obj))
+
+    def remove_object(self, obj):
+        """
+        :type obj: Model
+        """
+        document_type = document_registry.for_model(type(obj))
+        if document_type is not None:
+            self.backend.remove(document_type, obj.pk)
+
+    def search(self, query, doc_types=None, page_size=20, offset=0):
+        """
+        Returns a page of the objects best matching the query.
+
+        :type query: unicode
+        :param doc_types: Names of the document types to search. Defaults to all.
+        :type doc_types: list[unicode]
+        :type page_size: int
+        :type offset: int
+        :rtype: SearchPage
+        :raises: KeyError if a document type does not exist
+        """
+        if doc_types:
+            document_types = [document_registry.get(name) for name in doc_types]
+        else:
+            document_types = list(document_registry)
+        hits = self.backend.search(query, document_types, page_size + 1, offset)
+        objects = {}
+        for document_type in document_types:
+            pks = [hit.object_pk for hit in hits if hit.doc_type == document_type.name]
+            if pks:
+                objects[document_type.name] = document_type.get_queryset().in_bulk(pks)
+        results = [
+            SearchResult(hit, objects[hit.doc_type][hit.object_pk])
+            for hit in hits[:page_size] if hit.object_pk in objects.get(hit.doc_type, {})
+        ]
+        return SearchPage(results, has_next=len(hits) > page_size)
+
+    def reindex(self, full=False):
+        """
+        Indexes objects modified since the last reindex and removes documents whose objects
+        have been deleted. A full reindex clears the index first.
+
+        :type full: bool
+        :return: Dict of document type name to the number of objects indexed and removed.
+        :rtype: {}
+        """
+        if full:
+            self.backend.clear()
+            IndexState.objects.all().delete()
+        counts = {}
+        for document_type in document_registry:
+            counts[document_type.name] = (self.index_modified(document_type), self.remove_deleted(document_type))
+        return counts
+
+    def index_modified(self, document_type):
+        """
+        Indexes the objects of a type modified since they were last indexed, a batch at a time.
+
+        :type document_type: DocumentType
+        :rtype: int
+        """
+        try:
+            state = IndexState.objects.get(doc_type=document_type.name)
+        except IndexState.DoesNotExist:
+            state = IndexState(doc_type=document_type.name)
+        queryset = document_type.get_queryset().order_by('date_modified', 'pk')
+        if state.last_modified is not None:
+            queryset = queryset.filter(date_modified__gte=state.last_modified)
+        count = 0
+        while True:
+            with transaction.atomic():
+                batch = list(queryset[count:count + self.batch_size])
+                for obj in batch:
+                    self.backend.index(document_type, obj.pk, document_type.get_title(obj), document_type.get_body(obj))
+                if batch:
+                    state.last_modified = batch[-1].date_modified
+                    state.save()
+            count += len(batch)
+            if len(batch) < self.batch_size:
+                return count
+
+    def remove_deleted(self, document_type):
+        """
+        Removes the documents of a type whose objects no longer exist.
+
+        :type document_type: DocumentType
+        :rtype: int
+        """
+        indexed = sorted(self.backend.indexed_pks(document_type))
+        removed = 0
+        for start in range(0, len(indexed), self.batch_size):
+            batch = indexed[start:start + self.batch_size]
+            existing = set(document_type.model._default_manager.filter(pk__in=batch).values_list('pk', flat=True))
+            for object_pk in set(batch) - existing:
+                self.backend.remove(document_type, object_pk)
+                removed += 1
+        return removed
+
+
+search_index = SearchIndex()
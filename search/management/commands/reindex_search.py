@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Brings the search index up to date.
+"""
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from search.index import search_index
+
+
+class Command(BaseCommand):
+    """
+    Reindexes objects changed since the last run.
+    """
+    help = 'Indexes posts, quests and characters changed since the last run, and removes deleted ones.'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--full',
+            action='store_true',
+            dest='full',
+            default=False,
+            help='Clear the index and index everything.',
+        ),
+    )
+
+    def handle(self, *args, **options):
+        """
+        :type args: []
+        :type options: {}
+        """
+        search_index.backend.create()
+        for doc_type, (indexed, removed) in sorted(search_index.reindex(full=options['full']).items()):
+            self.stdout.write('Indexed {0} and removed {1} {2} documents.'.format(indexed, removed, doc_type))
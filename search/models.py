@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Models for the search app. The index is kept up to date as posts, quests and characters are
+saved and deleted.
+"""
+from django.apps import apps
+from django.db import models, router
+from django.db.models.signals import post_delete, post_migrate, post_save
+from search.documents import document_registry
+
+
+class IndexState(models.Model):
+    """
+    The date_modified of the newest object of each document type that has been indexed, so
+    the reindex command only needs to index objects changed since.
+    """
+    doc_type = models.CharField(max_length=20, unique=True)
+    last_modified = models.DateTimeField()
+
+
+class IndexedDocument(models.Model):
+    """
+    A document in the DatabaseSearchBackend's index.
+    """
+    doc_type = models.CharField(max_length=20)
+    object_pk = models.IntegerField()
+    title = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+
+    class Meta(object):
+        """
+        Meta properties
+        """
+        unique_together = [('doc_type', 'object_pk')]
+
+
+class IndexedTerm(models.Model):
+    """
+    A term in a document in the DatabaseSearchBackend's index.
+    """
+    document = models.ForeignKey(IndexedDocument, related_name='terms')
+    term = models.CharField(max_length=100)
+    frequency = models.IntegerField()
+    in_title = models.BooleanField(default=False)
+
+    class Meta(object):
+        """
+        Meta properties
+        """
+        index_together = [('term', 'document')]
+
+
+def update_search_index(sender, **kwargs):
+    """
+    Catches indexed objects being saved and updates their documents.
+
+    :type sender: type
+    :type kwargs: {}
+    """
+    del sender
+    if not kwargs.get('raw', False):
+        from search.index import search_index
+        search_index.update_object(kwargs['instance'])
+
+
+def remove_from_search_index(sender, **kwargs):
+    """
+    Catches indexed objects being deleted and removes their documents.
+
+    :type sender: type
+    :type kwargs: {}
+    """
+    del sender
+    from search.index import search_index
+    search_index.remove_object(kwargs['instance'])
+
+
+def create_search_index(sender, **kwargs):
+    """
+    Creates the search backend's storage after a database the search app is migrated to is
+    migrated.
+
+    :type sender: AppConfig
+    :type kwargs: {}
+    """
+    del sender
+    using = kwargs['using']
+    if router.allow_migrate(using, IndexedDocument):
+        from search.backends import get_backend
+        get_backend(using).create()
+post_migrate.connect(create_search_index, sender=apps.get_app_config('search'))
+
+
+for document_type in document_registry:
+    post_save.connect(update_search_index, sender=document_type.model)
+    post_delete.connect(remove_from_search_index, sender=document_type.model)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Tests posts, quests and characters can be searched.
+"""
+from StringIO import StringIO
+from django.core.management import call_command
+from django.core.urlresolvers import reverse
+from django.db import connection, DEFAULT_DB_ALIAS
+from django.test.utils import CaptureQueriesContext, override_settings
+from mock import patch
+from characters.tests.utils import CharacterUtils
+from quests.models import Post, Quest
+from rpg_auth.tests.utils import CreateUserMixin
+from search.backends import DatabaseSearchBackend, SqliteFtsBackend
+from search.documents import document_registry
+from search.index import search_index
+from search.models import create_search_index
+from world.models import Location
+
+
+class SearchTestMixin(object):
+    """
+    Tests a search backend. Sub-classes set backend_class.
+    """
+    fixtures = ['world-test-data.json']
+    backend_class = None
+
+    def setUp(self):
+        super(SearchTestMixin, self).setUp()
+        self.original_backend = search_index._backend
+        search_index._backend = self.backend_class()
+        search_index.backend.clear()
+        self.location = Location.objects.get(pk=1)
+        self.character = CharacterUtils.create_character(self.user)
+        self.quest = Quest.objects.create(
+            title=u'The Dragon of Kessel', description=u'A hunt for a dragon', gm=self.user.quest_profile
+        )
+
+    def tearDown(self):
+        search_index._backend = self.original_backend
+        super(SearchTestMixin, self).tearDown()
+
+    def create_post(self, content):
+        """
+        Creates a post on the quest.
+        """
+        return Post.objects.create(quest=self.quest, character=self.character, location=self.location, content=content)
+
+    def search(self, query, **kwargs):
+        """
+        Returns the (type, object) pairs found.
+        """
+        return [(result.doc_type, result.object) for result in search_index.search(query, **kwargs)]
+
+    def test_saved_posts_are_found(self):
+        """
+        Posts can be found as soon as they are saved.
+        """
+        post = self.create_post(u'The knights rode north to the mountains.')
+        self.create_post(u'Nothing to see here.')
+        self.assertEquals(self.search(u'knights mountains'), [('post', post)])
+
+    def test_all_terms_must_match(self):
+        """
+        Documents must contain every term.
+        """
+        self.create_post(u'The knights rode north.')
+        self.assertEquals(self.search(u'knights south'), [])
+
+    def test_edits_and_deletes_are_kept_in_sync(self):
+        """
+        Editing a post replaces its document and deleting it removes it.
+        """
+        post = self.create_post(u'A goblin appears.')
+        post.content = u'An orc appears.'
+        post.save()
+        self.assertEquals(self.search(u'goblin'), [])
+        self.assertEquals(self.search(u'orc'), [('post', post)])
+        post.delete()
+        self.assertEquals(self.search(u'orc'), [])
+
+    def test_titles_rank_higher(self):
+        """
+        A match in a quest's title ranks above a match in a post.
+        """
+        post = self.create_post(u'The dragon sleeps.')
+        results = self.search(u'dragon')
+        self.assertEquals(results[0], ('quest', self.quest))
+        self.assertIn(('post', post), results)
+
+    def test_types_can_be_filtered(self):
+        """
+        Searches can be limited to some document types.
+        """
+        self.create_post(u'The dragon sleeps.')
+        self.assertEquals([doc_type for doc_type, obj in self.search(u'dragon', doc_types=['quest'])], ['quest'])
+        self.assertRaises(KeyError, search_index.search, u'dragon', doc_types=['spaceship'])
+
+    def test_characters_are_found_by_biography(self):
+        """
+        Characters are indexed by their biography fields.
+        """
+        self.character.full_biography = u'Raised by wolves.'
+        self.character.save()
+        self.assertEquals(self.search(u'wolves'), [('character', self.character)])
+
+    def test_snippets_are_highlighted_and_escaped(self):
+        """
+        Snippets mark the matching terms and escape the content.
+        """
+        self.create_post(u'<b>Bold</b> knights ride.')
+        snippet = list(search_index.search(u'knights'))[0].snippet
+        self.assertIn(u'<mark>knights</mark>', snippet)
+        self.assertIn(u'&lt;b&gt;', snippet)
+
+    def test_query_syntax_is_not_interpreted(self):
+        """
+        Punctuation in the query is treated as separating terms.
+        """
+        post = self.create_post(u'The knights rode north.')
+        self.assertEquals(self.search(u'knights" "north*'), [('post', post)])
+        self.assertEquals(self.search(u'***'), [])
+
+    def test_pages(self):
+        """
+        Results are paged.
+        """
+        for i in range(3):
+            self.create_post(u'Knights {0}'.format(i))
+        page = search_index.search(u'knights', page_size=2)
+        self.assertEquals(len(page), 2)
+        self.assertTrue(page.has_next)
+        page = search_index.search(u'knights', page_size=2, offset=2)
+        self.assertEquals(len(page), 1)
+        self.assertFalse(page.has_next)
+
+    def test_reindex_is_incremental(self):
+        """
+        The reindex command indexes changed objects and removes deleted ones.
+        """
+        post = self.create_post(u'The knights rode north.')
+        call_command('reindex_search', full=True, stdout=StringIO())
+        search_index.backend.clear()
+        out = StringIO()
+        call_command('reindex_search', stdout=out)
+        self.assertIn(u'Indexed 1 and removed 0 post documents.', out.getvalue())
+        self.assertEquals(self.search(u'knights'), [('post', post)])
+        Post.objects.filter(pk=post.pk).delete()
+        search_index.backend.index(document_registry.get('post'), post.pk, u'', u'knights')
+        out = StringIO()
+        call_command('reindex_search', stdout=out)
+        self.assertIn(u'removed 1 post documents.', out.getvalue())
+        self.assertEquals(self.search(u'knights'), [])
+
+    def test_search_view_and_api(self):
+        """
+        The search page and API list the results.
+        """
+        post = self.create_post(u'The knights rode north.')
+        response = self.client.get(reverse('search:search'), {'q': u'knights'})
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals([result.object for result in response.context['page']], [post])
+        response = self.client.get(reverse('search-list'), {'q': u'knights', 'type': 'post'})
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.data['results'][0]['id'], post.pk)
+        self.assertEquals(response.data['results'][0]['url'], post.get_absolute_url())
+        response = self.client.get(reverse('search-list'), {'q': u'knights', 'type': 'spaceship'})
+        self.assertEquals(response.status_code, 400)
+
+
+class SqliteFtsSearchTestCase(SearchTestMixin, CreateUserMixin):
+    """
+    Tests the SQLite FTS5 backend.
+    """
+    backend_class = SqliteFtsBackend
+
+    def test_index_is_created_on_migrated_database(self):
+        """
+        The index is created on the database being migrated, and not on replicas.
+        """
+        with patch('search.backends.connections') as connections:
+            SqliteFtsBackend('other').create()
+        connections.__getitem__.assert_called_with('other')
+        with override_settings(DATABASE_REPLICAS=('replica', )), patch('search.backends.get_backend') as get_backend:
+            create_search_index(sender=None, using='replica')
+            self.assertFalse(get_backend.called)
+            create_search_index(sender=None, using=DEFAULT_DB_ALIAS)
+        get_backend.assert_called_once_with(DEFAULT_DB_ALIAS)
+
+
+class DatabaseSearchTestCase(SearchTestMixin, CreateUserMixin):
+    """
+    Tests the database backend.
+    """
+    backend_class = DatabaseSearchBackend
+
+    def test_only_the_page_is_loaded(self):
+        """
+        Matching, ranking and paging are done by the database, so only the page is read back.
+        """
+        for i in range(10):
+            self.create_post(u'Knights {0}'.format(i))
+        everything = search_index.backend.search(u'knights', [document_registry.get('post')], 10)
+        with CaptureQueriesContext(connection) as context:
+            hits = search_index.backend.search(u'knights', [document_registry.get('post')], 3, 6)
+        self.assertEquals([hit.object_pk for hit in hits], [hit.object_pk for hit in everything[6:9]])
+        self.assertEquals(len(context.captured_queries), 4)
+        self.assertTrue(any('LIMIT' in query['sql'] for query in context.captured_queries[:-1]))
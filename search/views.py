@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Search views.
+"""
+from __future__ import unicode_literals
+from django.http import Http404
+from django.views.generic import TemplateView
+from rest_framework import viewsets
+from rest_framework.exceptions import ParseError
+from rest_framework.response import Response
+from search.index import search_index
+
+
+class SearchParametersMixin(object):
+    """
+    Reads the search parameters from the query string: q, type (repeatable) and offset.
+    """
+    page_size = 20
+
+    def get_search_page(self, params):
+        """
+        Runs the search described by the parameters.
+
+        :type params: QueryDict
+        :rtype: SearchPage
+        :raises: ValueError if the parameters are invalid
+        """
+        try:
+            offset = max(0, int(params.get('offset', 0)))
+            return search_index.search(
+                params.get('q', ''), doc_types=params.getlist('type'), page_size=self.page_size, offset=offset
+            )
+        except KeyError as e:
+            raise ValueError('Unknown type {0}'.format(e))
+
+
+class SearchView(SearchParametersMixin, TemplateView):
+    """
+    Searches posts, quests and characters.
+    """
+    template_name = 'search/search.html'
+
+    def get_context_data(self, **kwargs):
+        """
+        Adds the query and results to the context.
+        :type kwargs: {}
+        :return: {}
+        """
+        context_data = super(SearchView, self).get_context_data(**kwargs)
+        try:
+            page = self.get_search_page(self.request.GET)
+        except ValueError:
+            raise Http404()
+        context_data['query'] = self.request.GET.get('q', '')
+        context_data['page'] = page
+        return context_data
+
+
+class SearchViewSet(SearchParametersMixin, viewsets.ViewSet):
+    """
+    API endpoint that searches posts, quests and characters.
+    """
+    def list(self, request):
+        """
+        Lists the results, best first.
+        :type request: Request
+        """
+        try:
+            page = self.get_search_page(request.QUERY_PARAMS)
+        except ValueError:
+            raise ParseError
+        return Response({
+            'has_next': page.has_next,
+            'results': [
+                {
+                    'type': result.doc_type,
+                    'id': result.object.pk,
+                    'title': result.title,
+                    'url': result.url,
+                    'snippet': result.snippet,
+                    'score': result.score,
+                }
+                for result in page
+            ],
+        })
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Answers conditional GET requests without building the page.
+
+Views work out when their page last changed from stamps that are cheap to read, and
+ConditionalGetMixin compares it, and an ETag derived from it, with the request's
+If-Modified-Since and If-None-Match headers before the view's get method runs. If the client's
+copy is current a 304 is returned and none of the page's queries or template rendering happen.
+
+Stamps are read from the database rather than a cache, so a change made in any process, web or
+worker, is seen by all of them. Things without a cheap date of their own, such as a quest and
+its posts, stamp a row that has one as they change.
+"""
+import hashlib
+from django.contrib.messages import get_messages
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+
+def make_etag(*parts):
+    """
+    Hashes the parts into an ETag.
+
+    :rtype: unicode
+    """
+    return hashlib.md5(u':'.join(unicode(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+class ConditionalGetMixin(object):
+    """
+    Answers GET and HEAD requests with 304 if the page has not changed since the client's copy.
+
+    Views implement get_last_modified. Pages are rendered with the user and their unseen
+    notification count, so both are part of the ETag and responses are private to the user.
+    Requests with messages waiting to be shown are always answered in full.
+    """
+    def get_last_modified(self):
+        """
+        Returns when the page last changed, or None if it is not known and the page should be
+        rendered. It must not load the page's data.
+
+        :rtype: datetime | None
+        """
+        return None
+
+    def get_etag(self):
+        """
+        :rtype: unicode | None
+        """
+        last_modified = self._get_last_modified()
+        if last_modified is None:
+            return None
+        user = self.request.user
+        if user.is_authenticated():
+            return make_etag(last_modified.isoformat(), user.pk, user.notification_profile.unseen_notification_count)
+        return make_etag(last_modified.isoformat())
+
+    def dispatch(self, request, *args, **kwargs):
+        """
+        :type request: HttpRequest
+        :type args: []
+        :type kwargs: {}
+        :rtype: HttpResponse
+        """
+        parent_dispatch = super(ConditionalGetMixin, self).dispatch
+        if request.method not in ('GET', 'HEAD') or get_messages(request):
+            return parent_dispatch(request, *args, **kwargs)
+        response = condition(
+            etag_func=lambda *args, **kwargs: self.get_etag(),
+            last_modified_func=lambda *args, **kwargs: self._get_last_modified(),
+        )(parent_dispatch)(request, *args, **kwargs)
+        patch_cache_control(response, private=True, must_revalidate=True)
+        patch_vary_headers(response, ('Cookie', ))
+        return response
+
+    def _get_last_modified(self):
+        """
+        Calls get_last_modified once per request.
+        """
+        if not hasattr(self, '_last_modified'):
+            self._last_modified = self.get_last_modified()
+        return self._last_modified
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Keyset cursors for paging through lists ordered by a date and then the pk.
+
+A cursor is the (date, pk) pair of an object. Pages are found by asking for the objects
+either side of a cursor, which an index on the date and pk can answer directly, so the cost
+of a page does not depend on how long the list is. Cursors are encoded as microseconds since
+the epoch and the pk so they can be passed in URLs.
+"""
+from __future__ import unicode_literals
+import calendar
+from datetime import datetime, timedelta
+from django.db.models import Q
+from django.utils import timezone
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised when a cursor cannot be decoded.
+    """
+
+
+class DateCursor(object):
+    """
+    A position in a list ordered by a date field and then the pk.
+
+    Sub-classes set date_field to the field their list is ordered by.
+    """
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    date_field = 'date_created'
+
+    def __init__(self, date, pk):
+        """
+        :type date: datetime
+        :type pk: int
+        """
+        super(DateCursor, self).__init__()
+        self.date = date
+        self.pk = pk
+
+    @classmethod
+    def for_object(cls, obj):
+        """
+        Returns the cursor that points at the given object.
+
+        :type obj: Model
+        :rtype: DateCursor
+        """
+        return cls(getattr(obj, cls.date_field), obj.pk)
+
+    @classmethod
+    def decode(cls, value):
+        """
+        Decodes a cursor from the format produced by encode.
+
+        :type value: unicode
+        :rtype: DateCursor
+        """
+        try:
+            microseconds, pk = [int(part) for part in value.split('-', 1)]
+        except (AttributeError, TypeError, ValueError):
+            raise InvalidCursor(value)
+        return cls(cls.epoch + timedelta(microseconds=microseconds), pk)
+
+    def encode(self):
+        """
+        Encodes the cursor as microseconds since the epoch and the pk, e.g. 946684800000000-12
+
+        :rtype: unicode
+        """
+        date = self.date
+        if timezone.is_naive(date):
+            date = timezone.make_aware(date, timezone.utc)
+        seconds = calendar.timegm(date.utctimetuple())
+        return '{0}-{1}'.format(seconds * 1000000 + date.microsecond, self.pk)
+
+    def after_q(self, inclusive=False):
+        """
+        Q object matching objects after the cursor.
+
+        :type inclusive: bool
+        """
+        pk_lookup = 'pk__gte' if inclusive else 'pk__gt'
+        return Q(**{'{0}__gt'.format(self.date_field): self.date}) | Q(
+            **{self.date_field: self.date, pk_lookup: self.pk}
+        )
+
+    def before_q(self):
+        """
+        Q object matching objects before the cursor.
+        """
+        return Q(**{'{0}__lt'.format(self.date_field): self.date}) | Q(
+            **{self.date_field: self.date, 'pk__lt': self.pk}
+        )
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, DateCursor) and other.date_field == self.date_field and
+            (self.date, self.pk) == (other.date, other.pk)
+        )
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __unicode__(self):
+        return self.encode()
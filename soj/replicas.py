@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Sends the reads of read-heavy views to read replicas of the database.
+
+Replicas are the database aliases listed in settings.DATABASE_REPLICAS. Views opt in with
+ReplicaReadsMixin, or the replica_reads decorator, and while they run ReplicaRouter sends their
+reads to a replica chosen for the request. Everything else, and every write, uses the primary.
+
+Replicas lag behind the primary, so a user who has just posted, sent a message or followed a
+quest may not see it on a replica. Once a request has written, the rest of it reads from the
+primary, and ReplicaPinningMiddleware pins the user to the primary for
+settings.DATABASE_REPLICA_PIN_SECONDS afterwards. Pins are kept in the cache named by
+settings.DATABASE_REPLICA_PIN_CACHE, which defaults to 'default'. If that cache is not configured
+a local memory cache is used.
+"""
+from contextlib import contextmanager
+from functools import wraps
+import random
+import threading
+from django.conf import settings
+from django.core.cache import caches, InvalidCacheBackendError
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+
+def get_replicas():
+    """
+    The aliases of the read replicas.
+
+    :rtype: tuple[unicode]
+    """
+    return tuple(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+class ReplicaState(threading.local):
+    """
+    The replica the current thread's reads go to, and whether it has written since its request began.
+    """
+    replica = None
+    wrote = False
+
+
+replica_state = ReplicaState()
+
+
+class ReplicaPins(object):
+    """
+    Cached pins of users to the primary database.
+    """
+    key_template = 'replicas:pinned:{0}'
+
+    def __init__(self, cache_alias=None):
+        """
+        :type cache_alias: unicode
+        """
+        super(ReplicaPins, self).__init__()
+        self.cache_alias = cache_alias
+        self._fallback_cache = None
+
+    @property
+    def cache(self):
+        """
+        The configured cache, or a local memory cache if it does not exist.
+        """
+        try:
+            return caches[self.cache_alias or getattr(settings, 'DATABASE_REPLICA_PIN_CACHE', 'default')]
+        except InvalidCacheBackendError:
+            if self._fallback_cache is None:
+                self._fallback_cache = LocMemCache('replicas', {})
+            return self._fallback_cache
+
+    @property
+    def timeout(self):
+        """
+        How many seconds a user stays pinned after writing.
+
+        :rtype: int
+        """
+        return getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 10)
+
+    def pin(self, user_pk):
+        """
+        Pins the user to the primary, or extends their pin.
+
+        :type user_pk: int
+        """
+        self.cache.set(self.key_template.format(user_pk), True, self.timeout)
+
+    def is_pinned(self, user_pk):
+        """
+        :type user_pk: int
+        :rtype: bool
+        """
+        return bool(self.cache.get(self.key_template.format(user_pk)))
+
+
+replica_pins = ReplicaPins()
+
+
+@contextmanager
+def use_replica(request):
+    """
+    Sends reads to a replica until the block ends, unless there are none or the user is pinned
+    to the primary.
+
+    :type request: HttpRequest
+    """
+    replicas = get_replicas()
+    previous = replica_state.replica
+    user = getattr(request, 'user', None)
+    if not replicas or (user is not None and user.is_authenticated() and replica_pins.is_pinned(user.pk)):
+        replica_state.replica = None
+    else:
+        replica_state.replica = previous if previous in replicas else random.choice(replicas)
+    try:
+        yield replica_state.replica
+    finally:
+        replica_state.replica = previous
+
+
+def replica_reads(view_func):
+    """
+    Decorates a view so its reads go to a replica.
+
+    :type view_func: callable
+    :rtype: callable
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        with use_replica(request):
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaReadsMixin(object):
+    """
+    Sends the reads of a class based view to a replica. It should come before the mixins that
+    load objects, so they are loaded from the replica too.
+    """
+    def dispatch(self, request, *args, **kwargs):
+        """
+        :type request: HttpRequest
+        :type args: []
+        :type kwargs: {}
+        :rtype: HttpResponse
+        """
+        with use_replica(request):
+            return super(ReplicaReadsMixin, self).dispatch(request, *args, **kwargs)
+
+
+class ReplicaRouter(object):
+    """
+    Routes reads made inside use_replica to its replica, and everything else to the primary.
+    """
+    def db_for_read(self, model, **hints):
+        """
+        :type model: Model
+        :type hints: {}
+        :rtype: unicode
+        """
+        if replica_state.replica is not None and not replica_state.wrote:
+            return replica_state.replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        """
+        Writes always go to the primary. Reads for the rest of the request follow them there.
+
+        :type model: Model
+        :type hints: {}
+        :rtype: unicode
+        """
+        replica_state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """
+        Objects loaded from the primary and its replicas are the same data, so may be related.
+
+        :type obj1: Model
+        :type obj2: Model
+        :type hints: {}
+        :rtype: bool | None
+        """
+        databases = (DEFAULT_DB_ALIAS, ) + get_replicas()
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, model):
+        """
+        Replicas get their tables from the primary.
+
+        :type db: unicode
+        :type model: Model
+        :rtype: bool | None
+        """
+        if db in get_replicas():
+            return False
+        return None
+
+
+class ReplicaPinningMiddleware(object):
+    """
+    Pins users to the primary after a request in which they wrote. It should come after
+    AuthenticationMiddleware. It is only used if there are replicas.
+    """
+    def __init__(self):
+        super(ReplicaPinningMiddleware, self).__init__()
+        if not get_replicas():
+            raise MiddlewareNotUsed()
+
+    def process_request(self, request):
+        """
+        :type request: HttpRequest
+        """
+        replica_state.replica = None
+        replica_state.wrote = False
+
+    def process_response(self, request, response):
+        """
+        :type request: HttpRequest
+        :type response: HttpResponse
+        """
+        user = getattr(request, 'user', None)
+        if replica_state.wrote and user is not None and user.is_authenticated():
+            replica_pins.pin(user.pk)
+        return response
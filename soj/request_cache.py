@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Request scoped cache of objects loaded from URL kwargs.
+
+The *FromRequest mixins resolve their objects through this cache so that each slug or pk
+is only loaded once per request, however many times a view asks for it.
+"""
+from django.shortcuts import get_object_or_404
+
+
+class RequestObjectCache(object):
+    """
+    Holds the objects resolved for a single request.
+
+    Counts hits and misses so tests can assert how many lookups went to the database.
+    """
+    attribute_name = 'object_cache'
+
+    def __init__(self):
+        super(RequestObjectCache, self).__init__()
+        self.objects = {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_request(cls, request):
+        """
+        Returns the cache attached to the request, attaching a new one if needed.
+
+        :type request: HttpRequest
+        :rtype: RequestObjectCache
+        """
+        cache = getattr(request, cls.attribute_name, None)
+        if cache is None:
+            cache = cls()
+            setattr(request, cls.attribute_name, cache)
+        return cache
+
+    def get(self, name, queryset, **kwargs):
+        """
+        Returns the object from the queryset matching kwargs, loading it with get_object_or_404 the
+        first time it is asked for.
+
+        :param name: Identifies the object, e.g. 'quest'. Different querysets must use different names.
+        :type name: unicode
+        :type queryset: QuerySet
+        :type kwargs: {}
+        """
+        key = (name, tuple(sorted(kwargs.items())))
+        try:
+            obj = self.objects[key]
+        except KeyError:
+            self.misses += 1
+            obj = self.objects[key] = get_object_or_404(queryset, **kwargs)
+        else:
+            self.hits += 1
+        return obj
+
+    def forget(self, name):
+        """
+        Removes all cached objects with the given name, e.g. after they have been changed.
+
+        :type name: unicode
+        """
+        for key in [key for key in self.objects if key[0] == name]:
+            del self.objects[key]
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.7/ref/settings/
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 import os
+from datetime import timedelta
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 
 
@@ -44,15 +45,20 @@ INSTALLED_APPS = (
     'quests',
     'private_messages',
     'notifications',
+    'search',
+    'benchmarks',
+    'profiling',
     'rest_framework',
 )
 
 MIDDLEWARE_CLASSES = (
+    'profiling.middleware.SqlProfilingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
+    'soj.replicas.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 )
@@ -83,6 +89,26 @@ DATABASES = {
     }
 }
 
+# Caches
+# The default cache holds unseen notification counts, notification versions, rendered posts,
+# the world and replica pins, and must be shared by every server process and Celery worker.
+# Create its table with `python manage.py createcachetable`, or use memcached in production.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'soj_cache',
+    }
+}
+
+# Read replicas
+# Read-heavy views read from one of the DATABASE_REPLICAS, which are aliases in DATABASES. A user
+# who writes reads from the primary for the next DATABASE_REPLICA_PIN_SECONDS seconds; the pins are
+# kept in the cache named by DATABASE_REPLICA_PIN_CACHE. See soj.settings_replicas.
+DATABASE_ROUTERS = ['soj.replicas.ReplicaRouter']
+DATABASE_REPLICAS = ()
+DATABASE_REPLICA_PIN_SECONDS = 10
+DATABASE_REPLICA_PIN_CACHE = 'default'
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.7/topics/i18n/
 
@@ -111,6 +137,63 @@ LOGIN_URL = 'rpg_auth:login'
 
 CELERY_BROKER = 'amqp://guest@localhost//'
 
+CELERYBEAT_SCHEDULE = {
+    'deliver-queued-mail': {
+        'task': 'tasks.deliver_queued_mail',
+        'schedule': timedelta(minutes=1),
+    },
+}
+
+# Mail
+# Queued mail is delivered in batches of MAIL_BATCH_SIZE, MAIL_BATCH_DELAY seconds after it is
+# queued. MAIL_RATE_LIMIT limits the messages sent per second by each worker.
+MAIL_BATCH_SIZE = 100
+MAIL_BATCH_DELAY = 5
+MAIL_RATE_LIMIT = None
+
+# Private messages
+# Store each message once per conversation rather than once per user. Run the
+# convert_to_single_copy_messages command before turning this on.
+PRIVATE_MESSAGES_SINGLE_COPY = False
+
+# Notifications
+# NOTIFICATIONS_BROKER wakes clients waiting at /api/notifications/poll/ when their notifications
+# change. The cache broker sees changes made by any process, including the Celery workers that
+# notify followers of posts, as long as they share the cache named by NOTIFICATIONS_CACHE. It
+# refuses a local memory cache unless tasks run in process. notifications.pubsub.LocalNotificationBroker
+# only works in a single process running tasks in process. Clients wait for up to
+# NOTIFICATIONS_POLL_TIMEOUT seconds.
+NOTIFICATIONS_BROKER = 'notifications.pubsub.CacheNotificationBroker'
+NOTIFICATIONS_POLL_TIMEOUT = 25
+
+# Post rendering
+# Rendered posts are kept in an LRU of POST_RENDER_LRU_SIZE posts in each process, and in the
+# cache named by POST_RENDER_CACHE.
+POST_RENDER_CACHE = 'default'
+POST_RENDER_LRU_SIZE = 1000
+
+# Post streams
+# Watchers of a quest are sent a keepalive every POST_STREAM_KEEPALIVE seconds, and their stream
+# ends after POST_STREAM_MAX_DURATION seconds for the client to reconnect. Posts saved by other
+# processes are polled for every POST_STREAM_POLL_INTERVAL seconds; None turns polling off.
+POST_STREAM_KEEPALIVE = 15
+POST_STREAM_MAX_DURATION = 300
+POST_STREAM_POLL_INTERVAL = 2
+
+# Search
+# The dotted path of the search backend class. If not set, SQLite databases use
+# search.backends.SqliteFtsBackend and other databases search.backends.DatabaseSearchBackend.
+SEARCH_BACKEND = None
+
+# SQL profiling
+# Set SQL_PROFILING to True to profile the queries of every request. Profiles are written every
+# SQL_PROFILING_FLUSH_SIZE requests or SQL_PROFILING_FLUSH_INTERVAL seconds, and a query run
+# SQL_PROFILING_N_PLUS_ONE_THRESHOLD times in one request is reported. See the sql_report command.
+SQL_PROFILING = False
+SQL_PROFILING_FLUSH_SIZE = 50
+SQL_PROFILING_FLUSH_INTERVAL = 60
+SQL_PROFILING_N_PLUS_ONE_THRESHOLD = 5
+
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
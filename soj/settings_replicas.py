@@ -0,0 +1,26 @@
+#  -*-coding: utf-8 -*-
+"""
+Development settings with two SQLite files standing in for read replicas of db.sqlite3.
+
+Nothing replicates to them, so copy the primary to them with the sqlite3 shell, and again to
+catch them up. Until then they lag behind it, as real replicas would.
+
+    sqlite3 db.sqlite3 ".backup db-replica1.sqlite3"
+    sqlite3 db.sqlite3 ".backup db-replica2.sqlite3"
+"""
+from soj.settings_development import *
+
+
+DATABASES.update({
+    'replica1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db-replica1.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
+    'replica2': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db-replica2.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
+})
+DATABASE_REPLICAS = ('replica1', 'replica2')
@@ -3,3 +3,15 @@
 User specific settings.
 """
 from soj.settings_development import *
+
+
+# Run Celery tasks in process so tests do not need a broker
+CELERY_ALWAYS_EAGER = True
+CELERY_EAGER_PROPAGATES_EXCEPTIONS = True
+
+# Tests run in one process, so a local memory cache is shared by everything they do
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Tests conditional GET requests are answered with 304 when the page has not changed.
+"""
+from django.core.urlresolvers import reverse
+from django.test.utils import override_settings
+from characters.tests.utils import CharacterUtils
+from notifications.models import GenericNotification
+from quests.models import Post
+from quests.tests.utils import QuestUtils
+from rpg_auth.tests.utils import CreateUserMixin
+from world.models import Location
+
+
+class ConditionalGetTestCase(CreateUserMixin):
+    """
+    Tests the quest, world and notification validators.
+    """
+    fixtures = ['world-test-data.json']
+
+    def setUp(self):
+        super(ConditionalGetTestCase, self).setUp()
+        self.character = CharacterUtils.create_character(self.user)
+        self.quest = QuestUtils.create_quest(self.user, self.character)
+        self.quest_url = reverse('quests:quest_detail', kwargs={'slug': self.quest.slug})
+
+    def revalidate(self, url):
+        """
+        Fetches the page, then fetches it again with its validators, returning both responses.
+        """
+        response = self.client.get(url)
+        return response, self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_quest_is_not_rendered(self):
+        """
+        An unchanged quest is answered with 304 without loading its timeline.
+        """
+        response = self.client.get(self.quest_url)
+        self.assertEquals(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        with self.assertNumQueries(4):
+            response = self.client.get(self.quest_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(response.status_code, 304)
+
+    def test_new_post_changes_quest(self):
+        """
+        A new post means the quest is rendered again.
+        """
+        response = self.client.get(self.quest_url)
+        Post.objects.create(
+            quest=self.quest, character=self.character, location=self.quest.current_location, content=u'Post'
+        )
+        self.assertEquals(self.client.get(self.quest_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_post_from_another_process_changes_quest(self):
+        """
+        A post made by a process with its own cache, such as a worker, means the quest is rendered again.
+        """
+        response = self.client.get(self.quest_url)
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker'}
+        }):
+            Post.objects.create(
+                quest=self.quest, character=self.character, location=self.quest.current_location, content=u'Post'
+            )
+        self.assertEquals(self.client.get(self.quest_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_other_users_are_not_sent_304(self):
+        """
+        The ETag is specific to the user.
+        """
+        response = self.client.get(self.quest_url)
+        self.client.logout()
+        self.assertEquals(self.client.get(self.quest_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_unseen_notification_changes_pages(self):
+        """
+        Pages show the unseen notification count, so a new notification means they are rendered again.
+        """
+        response = self.client.get(self.quest_url)
+        self.user.notification_profile.send_notification(GenericNotification, text='Test')
+        self.assertEquals(self.client.get(self.quest_url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_missing_quest_is_not_found(self):
+        """
+        A conditional request for a missing quest is still not found.
+        """
+        self.assertEquals(
+            self.client.get(reverse('quests:quest_detail', kwargs={'slug': 'missing'}), HTTP_IF_NONE_MATCH='"x"')
+            .status_code,
+            404
+        )
+
+    def test_unchanged_location_is_not_rendered(self):
+        """
+        Locations and continents are validated from the gazetteer.
+        """
+        location = Location.objects.get(pk=1)
+        for url in (
+            reverse('world:location_detail', kwargs={'slug': location.slug}),
+            reverse('world:continent_detail', kwargs={'slug': location.continent.slug}),
+        ):
+            self.assertEquals(self.revalidate(url)[1].status_code, 304)
+
+    def test_edited_location_is_rendered(self):
+        """
+        Editing a location means it is rendered again.
+        """
+        location = Location.objects.get(pk=1)
+        url = reverse('world:location_detail', kwargs={'slug': location.slug})
+        response = self.client.get(url)
+        location.description = u'Changed'
+        location.save()
+        self.assertEquals(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_notification_list(self):
+        """
+        The notification list is answered with 304 until a notification is sent or seen.
+        """
+        url = reverse('notification-list')
+        self.user.notification_profile.send_notification(GenericNotification, text='Test')
+        response, revalidated = self.revalidate(url)
+        self.assertEquals(revalidated.status_code, 304)
+        self.user.notification_profile.notifications.set_as_seen()
+        self.assertEquals(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Tests reads of read-heavy views go to a replica, and users who write read their writes from the primary.
+"""
+from django.contrib.auth import get_user_model
+from django.core.urlresolvers import reverse
+from django.db import DEFAULT_DB_ALIAS
+from django.test.utils import override_settings
+from mock import patch
+from characters.tests.utils import CharacterUtils
+from quests.models import Quest
+from quests.tests.utils import QuestUtils
+from rpg_auth.tests.utils import CreateUserMixin
+from soj.replicas import ReplicaRouter, replica_pins, replica_state, use_replica
+from soj.tests.utils import MockRequest
+
+
+@override_settings(DATABASE_REPLICAS=('replica', ))
+class ReplicaRouterTestCase(CreateUserMixin):
+    """
+    Tests the router, and the views that read from replicas.
+    """
+    fixtures = ['world-test-data.json']
+
+    def setUp(self):
+        super(ReplicaRouterTestCase, self).setUp()
+        self.router = ReplicaRouter()
+        self.character = CharacterUtils.create_character(self.user)
+        self.quest = QuestUtils.create_quest(self.user, self.character)
+        self.quest_url = reverse('quests:quest_detail', kwargs={'slug': self.quest.slug})
+        replica_state.wrote = False
+
+    def record_reads(self):
+        """
+        Patches the router to record where it sends each read, while running them on the primary.
+        Returns the patch and the list of aliases it records.
+        """
+        routed = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            routed.append(db_for_read(router, model, **hints))
+            return DEFAULT_DB_ALIAS
+        return patch.object(ReplicaRouter, 'db_for_read', record), routed
+
+    def test_reads_outside_views_use_primary(self):
+        """
+        Reads go to the primary unless a view asks for a replica.
+        """
+        self.assertEquals(self.router.db_for_read(Quest), DEFAULT_DB_ALIAS)
+
+    def test_reads_in_views_use_replica(self):
+        """
+        Reads inside use_replica go to the replica, and writes to the primary.
+        """
+        with use_replica(MockRequest()):
+            self.assertEquals(self.router.db_for_read(Quest), 'replica')
+            self.assertEquals(self.router.db_for_write(Quest), DEFAULT_DB_ALIAS)
+
+    def test_reads_after_writing_use_primary(self):
+        """
+        Once the request has written its reads go to the primary.
+        """
+        with use_replica(MockRequest()):
+            self.router.db_for_write(Quest)
+            self.assertEquals(self.router.db_for_read(Quest), DEFAULT_DB_ALIAS)
+
+    def test_pinned_users_use_primary(self):
+        """
+        A user pinned to the primary reads from it.
+        """
+        request = MockRequest()
+        request.user = self.user
+        replica_pins.pin(self.user.pk)
+        with use_replica(request):
+            self.assertEquals(self.router.db_for_read(Quest), DEFAULT_DB_ALIAS)
+
+    @override_settings(DATABASE_REPLICAS=())
+    def test_reads_use_primary_without_replicas(self):
+        """
+        Without replicas everything uses the primary.
+        """
+        with use_replica(MockRequest()):
+            self.assertEquals(self.router.db_for_read(Quest), DEFAULT_DB_ALIAS)
+
+    def test_replicas_are_not_migrated(self):
+        """
+        Tables are only created on the primary.
+        """
+        self.assertFalse(self.router.allow_migrate('replica', Quest))
+        self.assertIsNone(self.router.allow_migrate(DEFAULT_DB_ALIAS, Quest))
+
+    def test_quest_detail_reads_from_replica(self):
+        """
+        The quest page is read from the replica by a user who has not written.
+        """
+        recording, routed = self.record_reads()
+        with recording:
+            self.assertEquals(self.client.get(self.quest_url).status_code, 200)
+        self.assertTrue(routed)
+        self.assertEquals(set(routed) - {DEFAULT_DB_ALIAS}, {'replica'})
+
+    def test_world_reads_from_replica(self):
+        """
+        The world pages are read from the replica.
+        """
+        recording, routed = self.record_reads()
+        with recording:
+            self.client.get(reverse('world:location_detail', kwargs={'slug': self.quest.current_location.slug}))
+        self.assertIn('replica', routed)
+
+    def test_notification_list_reads_from_replica(self):
+        """
+        The notification list API is read from the replica.
+        """
+        recording, routed = self.record_reads()
+        with recording:
+            self.assertEquals(self.client.get(reverse('notification-list')).status_code, 200)
+        self.assertIn('replica', routed)
+
+    def test_writers_read_their_writes_from_primary(self):
+        """
+        After following a quest the user reads the quest from the primary.
+        """
+        follower = get_user_model().objects.create_user(
+            pen_name=u'Follower', password=u'password', email=u'follower@example.com', is_active=True
+        )
+        self.client.login(username=follower.email, password=u'password')
+        self.client.post(reverse('quests:follow_quest', kwargs={'quest_slug': self.quest.slug}))
+        self.assertTrue(replica_pins.is_pinned(follower.pk))
+        recording, routed = self.record_reads()
+        with recording:
+            self.assertEquals(self.client.get(self.quest_url).status_code, 200)
+        self.assertEquals(set(routed), {DEFAULT_DB_ALIAS})
+
+    def test_readers_are_not_pinned(self):
+        """
+        Reading does not pin the user.
+        """
+        recording, routed = self.record_reads()
+        with recording:
+            self.client.get(self.quest_url)
+        self.assertFalse(replica_pins.is_pinned(self.user.pk))
@@ -6,9 +6,11 @@ from django.conf.urls import patterns, include, url
 from django.contrib import admin
 from rest_framework import routers
 from notifications import views
+from search.views import SearchViewSet
 
 router = routers.DefaultRouter()
 router.register(r'notifications', views.NotificationViewSet)
+router.register(r'search', SearchViewSet, base_name='search')
 
 
 urlpatterns = patterns(
@@ -17,6 +19,7 @@ urlpatterns = patterns(
     url(r'^characters/', include('characters.urls', namespace='characters')),
     url(r'^world/', include('world.urls', namespace='world')),
     url(r'^quest/', include('quests.urls', namespace='quests')),
+    url(r'^search/', include('search.urls', namespace='search')),
     url(r'^api/', include(router.urls)),
     url(r'^api-auth/', include('rest_framework.urls', namespace='rest_framework')),
     url(r'^admin/', include(admin.site.urls)),
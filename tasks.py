@@ -4,21 +4,94 @@ Celery tasks used to process non-time critical jobs.
 """
 from celery import Celery
 from django.conf import settings
-from django.core.mail import send_mail
 
 
 app = Celery('tasks', broker=settings.CELERY_BROKER)
+app.config_from_object('django.conf:settings')
 
 
 @app.task
 def queue_send_mail(subject, message, from_email, email, **kwargs):
     """
-    Allows mail to be queued for sending and taken off the request.
+    Allows mail to be queued for sending and taken off the request. The mail is added to the
+    outbound queue and delivered in a batch with any other mail that is due. A delivery is only
+    scheduled if one is not already.
 
     :type subject: unicode
     :type message: unicode
     :type from_email: unicode
-    :type email: unicode
+    :type email: list[unicode]
+    :param kwargs: Accepts html_message. Other send_mail arguments are ignored.
     :type kwargs: {}
     """
-    send_mail(subject, message, from_email, email, **kwargs)
+    from rpg_auth.mail import mail_pipeline
+    mail_pipeline.enqueue(subject, message, from_email, email, html_body=kwargs.get('html_message'))
+    if mail_pipeline.claim_delivery():
+        deliver_queued_mail.apply_async(countdown=mail_pipeline.batch_delay)
+
+
+@app.task
+def queue_user_mail(user_pk, subject, template_name, domain, protocol, from_email=None, **kwargs):
+    """
+    Renders an email to a user and queues it for sending. Rendering happens here rather than
+    on the request, using templates compiled once per worker.
+
+    :type user_pk: int
+    :type subject: unicode
+    :param template_name: The template to render the message with. It is given the user, domain and protocol.
+    :type template_name: unicode
+    :type domain: unicode
+    :param protocol: http or https
+    :type protocol: unicode
+    :type from_email: unicode
+    :type kwargs: {}
+    """
+    from django.contrib.auth import get_user_model
+    from notifications.rendering import render_to_string
+    try:
+        user = get_user_model().objects.get(pk=user_pk)
+    except get_user_model().DoesNotExist:
+        return
+    message = render_to_string(template_name, {'user': user, 'domain': domain, 'protocol': protocol})
+    queue_send_mail(subject, message, from_email, [user.email], **kwargs)
+
+
+@app.task
+def deliver_queued_mail():
+    """
+    Delivers a batch of queued mail, queueing another delivery if more is due. Also run
+    periodically so mail waiting to be retried is sent.
+    """
+    from rpg_auth.mail import mail_pipeline
+    mail_pipeline.release_delivery()
+    sent, more_due = mail_pipeline.deliver()
+    if more_due:
+        deliver_queued_mail.delay()
+    return sent
+
+
+@app.task
+def queue_post_notifications(post_pk):
+    """
+    Notifies the followers of a quest that a post has been made, taking the fan-out off
+    the request.
+
+    :type post_pk: int
+    """
+    from quests.models import Post, PostNotification
+    try:
+        post = Post.objects.select_related('quest', 'character').get(pk=post_pk)
+    except Post.DoesNotExist:
+        return
+    PostNotification.objects.notify_followers(post)
+
+
+@app.task
+def queue_provision_profiles(user_pks):
+    """
+    Creates any missing profiles for the users, taking backfills off the command line.
+
+    :type user_pks: list[int]
+    """
+    from rpg_auth.provisioning import profile_provisioner
+    profile_provisioner.provision(user_pks)
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+The activity board lists every continent and location with what is happening there.
+
+The world comes from the gazetteer and the activity from the LocationActivity counters, so
+the whole board is a single query once the gazetteer is loaded.
+"""
+from world.gazetteer import gazetteer
+from world.models import LocationActivity
+
+
+class ActivityBoard(object):
+    """
+    Continents and their locations, each location paired with its activity.
+    """
+    def __init__(self, continents, activity):
+        """
+        :type continents: list[Continent]
+        :param activity: Dict of location pk to LocationActivity
+        :type activity: {}
+        """
+        super(ActivityBoard, self).__init__()
+        self.continents = continents
+        self.activity = activity
+
+    @classmethod
+    def load(cls):
+        """
+        Loads the board for the whole world.
+
+        :rtype: ActivityBoard
+        """
+        return cls(gazetteer.continents, dict((row.location_id, row) for row in LocationActivity.objects.all()))
+
+    def get_activity(self, location):
+        """
+        Returns the activity of a location. Locations without any have empty activity.
+
+        :type location: Location
+        :rtype: LocationActivity
+        """
+        try:
+            return self.activity[location.pk]
+        except KeyError:
+            return LocationActivity(location_id=location.pk)
+
+    def __iter__(self):
+        """
+        Yields each continent with a list of (location, activity) pairs.
+        """
+        for continent in self.continents:
+            yield continent, [(location, self.get_activity(location)) for location in continent.location_set.all()]
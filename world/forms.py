@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Form fields for choosing parts of the world.
+"""
+from django import forms
+from django.core.exceptions import ValidationError
+
+
+class GazetteerChoiceIterator(object):
+    """
+    Lazily lists the choices, so they are read from the gazetteer when the field is rendered.
+    """
+    def __init__(self, field):
+        """
+        :type field: GazetteerChoiceField
+        """
+        super(GazetteerChoiceIterator, self).__init__()
+        self.field = field
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for obj in self.field.get_objects():
+            yield (obj.pk, self.field.label_from_instance(obj))
+
+    def __len__(self):
+        return len(self.field.get_objects()) + (1 if self.field.empty_label is not None else 0)
+
+
+class GazetteerChoiceField(forms.ModelChoiceField):
+    """
+    Model choice field that lists and validates its choices from the gazetteer rather than
+    querying the database.
+    """
+    def __init__(self, queryset, get_objects, *args, **kwargs):
+        """
+        :type queryset: QuerySet
+        :param get_objects: Callable returning the list of objects to choose from
+        """
+        self.get_objects = get_objects
+        super(GazetteerChoiceField, self).__init__(queryset, *args, **kwargs)
+
+    def _get_choices(self):
+        return GazetteerChoiceIterator(self)
+
+    choices = property(_get_choices, forms.ChoiceField._set_choices)
+
+    def to_python(self, value):
+        """
+        Returns the object with the given pk.
+
+        :type value: unicode
+        """
+        if value in self.empty_values:
+            return None
+        for obj in self.get_objects():
+            if unicode(obj.pk) == unicode(value):
+                return obj
+        raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of the world tree: the races, the continents and their locations.
+
+The world is read on nearly every page but only changes when it is edited in the admin.
+The gazetteer loads it once and keeps it in the process. A copy is also put in a cache
+shared by all workers, under a version number stored in the same cache. Saving or
+deleting a race, continent or location changes the version. Each process compares its
+copy against the version and reloads the tree when it is out of date.
+
+A change made inside a transaction is not committed when the version changes, so another
+process could reload the world from the old rows and cache it under the new version. The
+version is changed again once the change has committed: when the request or Celery task
+making it finishes, when the world is next read outside a transaction, or when the process,
+such as a management command, exits.
+
+The cache used is the one named by settings.WORLD_CACHE, which defaults to 'default'. If
+that cache is not configured a local memory cache is used.
+"""
+import threading
+import uuid
+from django.conf import settings
+from django.core.cache import caches, InvalidCacheBackendError
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from world.models import Continent, Location, Race
+
+
+class WorldTree(object):
+    """
+    A snapshot of the world.
+    """
+    def __init__(self, races, continents, locations):
+        """
+        :type races: list[Race]
+        :type continents: list[Continent]
+        :type locations: list[Location]
+        """
+        super(WorldTree, self).__init__()
+        self.races = races
+        self.continents = continents
+        self.locations = locations
+        self.locations_by_slug = dict((location.slug, location) for location in locations)
+        self.continents_by_slug = dict((continent.slug, continent) for continent in continents)
+
+    @classmethod
+    def load(cls):
+        """
+        Loads the world from the database. Each continent has its locations prefetched.
+
+        :rtype: WorldTree
+        """
+        return cls(
+            races=list(Race.objects.order_by('pk')),
+            continents=list(Continent.objects.prefetch_related('location_set').order_by('pk')),
+            locations=list(Location.objects.select_related('continent').order_by('pk')),
+        )
+
+
+class Gazetteer(object):
+    """
+    Reads the world from the process, the shared cache or the database, in that order.
+    """
+    version_key = 'world:gazetteer:version'
+    tree_key_template = 'world:gazetteer:{0}'
+    timeout = 60 * 60 * 24
+
+    def __init__(self, cache_alias=None):
+        """
+        :type cache_alias: unicode
+        """
+        super(Gazetteer, self).__init__()
+        self.cache_alias = cache_alias
+        self._fallback_cache = None
+        self._version = None
+        self._tree = None
+        self._pending = threading.local()
+
+    @property
+    def cache(self):
+        """
+        The configured cache, or a local memory cache if it does not exist.
+        """
+        try:
+            return caches[self.cache_alias or getattr(settings, 'WORLD_CACHE', 'default')]
+        except InvalidCacheBackendError:
+            if self._fallback_cache is None:
+                self._fallback_cache = LocMemCache('world', {})
+            return self._fallback_cache
+
+    def get_version(self):
+        """
+        Returns the current version of the world, starting a new one if there is none.
+
+        :rtype: unicode
+        """
+        version = self.cache.get(self.version_key)
+        if version is None:
+            self.cache.add(self.version_key, uuid.uuid4().hex, self.timeout)
+            version = self.cache.get(self.version_key)
+        return version
+
+    def get_tree(self):
+        """
+        Returns the current world tree.
+
+        :rtype: WorldTree
+        """
+        self.invalidate_committed()
+        version = self.get_version()
+        if self._tree is None or self._version != version:
+            key = self.tree_key_template.format(version)
+            tree = self.cache.get(key)
+            if tree is None:
+                tree = WorldTree.load()
+                self.cache.set(key, tree, self.timeout)
+            self._tree, self._version = tree, version
+        return self._tree
+
+    def invalidate(self):
+        """
+        Starts a new version so every process reloads the world. If called inside a transaction
+        a new version is started again by invalidate_pending.
+        """
+        self._start_version()
+        if transaction.get_connection().in_atomic_block:
+            self._pending.invalidate = True
+
+    def invalidate_pending(self):
+        """
+        Starts a new version if the world was invalidated inside a transaction since this was
+        last called. Called once the transaction has committed.
+        """
+        if getattr(self._pending, 'invalidate', False):
+            self._pending.invalidate = False
+            self._start_version()
+
+    def invalidate_committed(self):
+        """
+        Calls invalidate_pending unless a transaction is still open, for callers that may be
+        inside one, such as an eagerly run task.
+        """
+        if getattr(self._pending, 'invalidate', False) and not transaction.get_connection().in_atomic_block:
+            self.invalidate_pending()
+
+    def _start_version(self):
+        """
+        Stores a new version and forgets this process's copy of the world.
+        """
+        self.cache.set(self.version_key, uuid.uuid4().hex, self.timeout)
+        self._tree = self._version = None
+
+    @property
+    def races(self):
+        """
+        :rtype: list[Race]
+        """
+        return self.get_tree().races
+
+    @property
+    def continents(self):
+        """
+        :rtype: list[Continent]
+        """
+        return self.get_tree().continents
+
+    @property
+    def locations(self):
+        """
+        :rtype: list[Location]
+        """
+        return self.get_tree().locations
+
+    def get_location(self, slug):
+        """
+        :type slug: unicode
+        :rtype: Location
+        :raises: Location.DoesNotExist
+        """
+        try:
+            return self.get_tree().locations_by_slug[slug]
+        except KeyError:
+            raise Location.DoesNotExist(slug)
+
+    def get_continent(self, slug):
+        """
+        :type slug: unicode
+        :rtype: Continent
+        :raises: Continent.DoesNotExist
+        """
+        try:
+            return self.get_tree().continents_by_slug[slug]
+        except KeyError:
+            raise Continent.DoesNotExist(slug)
+
+
+gazetteer = Gazetteer()
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+Rebuilds, or verifies, the activity counts of locations from the quests, characters and posts.
+"""
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from world.models import LocationActivity
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the location activity counts.
+    """
+    help = 'Rebuilds the active quest and character counts, and last post time, of each location.'
+    option_list = BaseCommand.option_list + (
+        make_option(
+            '--verify',
+            action='store_true',
+            dest='verify',
+            default=False,
+            help='Report stale locations without changing them. Exits with an error if any are found.',
+        ),
+    )
+
+    def handle(self, *args, **options):
+        """
+        :type args: []
+        :type options: {}
+        """
+        if options['verify']:
+            stale = LocationActivity.objects.find_stale()
+            for location_pk, (quests, characters, last_post_at) in sorted(stale.items()):
+                self.stdout.write('Location {0} should have {1} quests and {2} characters, last post at {3}'.format(
+                    location_pk, quests, characters, last_post_at
+                ))
+            if stale:
+                raise CommandError('{0} locations are stale.'.format(len(stale)))
+            self.stdout.write('Location activity is up to date.')
+        else:
+            self.stdout.write('Corrected {0} locations.'.format(LocationActivity.objects.rebuild()))
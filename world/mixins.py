@@ -2,7 +2,9 @@
 """
 Mixins that can be used for classes that need some default world objects behaviour.
 """
-from django.shortcuts import get_object_or_404
+from django.http import Http404
+from soj.request_cache import RequestObjectCache
+from world.gazetteer import gazetteer
 from world.models import Location
 
 
@@ -10,9 +12,10 @@ class LocationFromRequestMixin(object):
     """
     Loads the location specified by location_slug and adds it to the context.
 
-    If the location is invalid then a 404 is raised.
+    If the location is invalid then a 404 is raised. Locations are read from the gazetteer unless
+    a location_queryset is given, in which case they are loaded from it once per request.
     """
-    location_queryset = Location.objects.all()
+    location_queryset = None
 
     def __init__(self):
         super(LocationFromRequestMixin, self).__init__()
@@ -29,11 +32,23 @@ class LocationFromRequestMixin(object):
         self.location_slug = kwargs['location_slug']
         return super(LocationFromRequestMixin, self).dispatch(request, *args, **kwargs)
 
+    def get_location_queryset(self):
+        """
+        Gets the location queryset, or None to read locations from the gazetteer.
+        """
+        return self.location_queryset
+
     def get_location(self):
         """
         Gets the location based on the location_slug.
         """
-        return get_object_or_404(self.location_queryset, slug=self.location_slug)
+        queryset = self.get_location_queryset()
+        if queryset is not None:
+            return RequestObjectCache.for_request(self.request).get('location', queryset, slug=self.location_slug)
+        try:
+            return gazetteer.get_location(self.location_slug)
+        except Location.DoesNotExist:
+            raise Http404()
 
     def get_context_data(self, **kwargs):
         """
@@ -3,13 +3,25 @@
 World models. These models define the game universe and are reference by all
 other aspects of the game.
 """
-from django.db import models
+import atexit
+from celery.signals import task_postrun
+from django.core.signals import request_finished
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, F, Max, Q, QuerySet
+from django.db.models.signals import post_delete, post_save
+from model_utils.managers import PassThroughManager
+from django.utils.text import slugify
+from world.slugs import SlugAllocator
 
 
 class BaseWorldModel(models.Model):
     """
     Provides common fields to all world models.
+
+    If no slug is set one is made from the field named by slug_source_field when saving.
     """
+    slug_source_field = 'name'
+
     name = models.CharField(max_length=150)
     slug = models.SlugField(unique=True)
     description = models.TextField()
@@ -22,6 +34,25 @@ class BaseWorldModel(models.Model):
         """
         abstract = True
 
+    def save(self, force_insert=False, force_update=False, using=None, update_fields=None):
+        """
+        Overrides the save method. If no slug is set, a free slug is allocated.
+
+        :type force_insert: bool
+        :type force_update: bool
+        :type using: Database
+        :type update_fields: [] | ()
+        """
+        parent_save = super(BaseWorldModel, self).save
+        if self.slug:
+            return parent_save(force_insert, force_update, using, update_fields)
+        return SlugAllocator(self.__class__).save_with_slug(
+            self,
+            slugify(getattr(self, self.slug_source_field)),
+            lambda: parent_save(force_insert, force_update, using, update_fields),
+            using=using,
+        )
+
 
 class Race(BaseWorldModel):
     """
@@ -44,9 +75,9 @@ class Location(BaseWorldModel):
     @property
     def current_quests(self):
         """
-        References the reverse relation of quests.
+        Returns the quests currently at the location.
         """
-        return self.quests.filter(questlocation__date_departed__isnull=True)
+        return self.active_quests.all()
 
     @property
     def former_quests(self):
@@ -54,3 +85,182 @@ class Location(BaseWorldModel):
         Returns the former quests from a location.
         """
         return self.quests.filter(questlocation__date_departed__isnull=False)
+
+
+class LocationActivityManager(QuerySet):
+    """
+    Manager methods for location activity.
+    """
+    def adjust(self, location_pk, quests=0, characters=0):
+        """
+        Adds to the active quest and character counts of a location, creating its row if needed.
+
+        :type location_pk: int
+        :type quests: int
+        :type characters: int
+        """
+        updates = {}
+        if quests:
+            updates['active_quest_count'] = F('active_quest_count') + quests
+        if characters:
+            updates['active_character_count'] = F('active_character_count') + characters
+        if updates and not self.filter(location_id=location_pk).update(**updates):
+            self._create_for_location(location_pk)
+            self.filter(location_id=location_pk).update(**updates)
+
+    def record_quest_move(self, from_location_pk, to_location_pk, characters):
+        """
+        Moves a quest, and its active characters, from one location to another.
+
+        :type from_location_pk: int | None
+        :type to_location_pk: int
+        :type characters: int
+        """
+        if from_location_pk is not None:
+            self.adjust(from_location_pk, quests=-1, characters=-characters)
+        self.adjust(to_location_pk, quests=1, characters=characters)
+
+    def record_post(self, location_pk, date_posted):
+        """
+        Stores the time of the latest post at a location.
+
+        :type location_pk: int
+        :type date_posted: datetime
+        """
+        earlier = self.filter(Q(last_post_at__lt=date_posted) | Q(last_post_at__isnull=True), location_id=location_pk)
+        if not earlier.update(last_post_at=date_posted):
+            self._create_for_location(location_pk)
+            earlier.update(last_post_at=date_posted)
+
+    def _create_for_location(self, location_pk):
+        """
+        Creates an empty row for the location, unless another process already has.
+
+        :type location_pk: int
+        """
+        try:
+            with transaction.atomic():
+                self.create(location_id=location_pk)
+        except IntegrityError:
+            pass
+
+    def count_activity(self):
+        """
+        Counts the activity of every location from the quests, characters and posts.
+
+        :return: Dict of location pk to (active quests, active characters, last post time).
+        :rtype: {}
+        """
+        return dict(
+            (row['pk'], (row['quest_count'], row['character_count'], row['latest_post_at']))
+            for row in Location.objects.annotate(
+                quest_count=Count('active_quests', distinct=True),
+                character_count=Count('active_quests__active_characters', distinct=True),
+                latest_post_at=Max('posts__date_created'),
+            ).values('pk', 'quest_count', 'character_count', 'latest_post_at')
+        )
+
+    def find_stale(self):
+        """
+        Returns the locations whose stored activity does not match the counted activity.
+
+        :return: Dict of location pk to the activity it should have.
+        :rtype: {}
+        """
+        stored = dict(
+            (row[0], row[1:]) for row in self.values_list(
+                'location_id', 'active_quest_count', 'active_character_count', 'last_post_at'
+            )
+        )
+        return dict(
+            (location_pk, activity) for location_pk, activity in self.count_activity().items()
+            if stored.get(location_pk, (0, 0, None)) != activity
+        )
+
+    @transaction.atomic
+    def rebuild(self):
+        """
+        Replaces the stored activity of stale locations with the counted activity.
+
+        :return: The number of locations corrected.
+        :rtype: int
+        """
+        stale = self.find_stale()
+        self.filter(location_id__in=stale.keys()).delete()
+        self.bulk_create([
+            LocationActivity(
+                location_id=location_pk,
+                active_quest_count=quests,
+                active_character_count=characters,
+                last_post_at=last_post_at,
+            )
+            for location_pk, (quests, characters, last_post_at) in stale.items()
+        ])
+        return len(stale)
+
+
+class LocationActivity(models.Model):
+    """
+    Counts of what is happening at a location, kept up to date as quests move, characters
+    join and leave, and posts are made, so the whole world can be shown with its activity
+    without counting the quests each time.
+
+    Activity is stored apart from the location so it can change without invalidating the
+    gazetteer. It can be rebuilt with the rebuild_location_activity management command.
+    """
+    location = models.OneToOneField(Location, primary_key=True, related_name='activity')
+    active_quest_count = models.IntegerField(default=0)
+    active_character_count = models.IntegerField(default=0)
+    last_post_at = models.DateTimeField(null=True, blank=True)
+
+    objects = PassThroughManager.for_queryset_class(LocationActivityManager)()
+
+    class Meta(object):
+        """
+        Meta properties
+        """
+        verbose_name_plural = 'location activity'
+
+
+def invalidate_gazetteer(sender, **kwargs):
+    """
+    Catches races, continents and locations being changed and invalidates the cached world.
+
+    :type sender: Race | Continent | Location
+    :type kwargs: {}
+    """
+    del sender, kwargs
+    from world.gazetteer import gazetteer
+    gazetteer.invalidate()
+for world_model in (Race, Continent, Location):
+    post_save.connect(invalidate_gazetteer, sender=world_model)
+    post_delete.connect(invalidate_gazetteer, sender=world_model)
+
+
+def invalidate_gazetteer_after_request(sender, **kwargs):
+    """
+    Invalidates the cached world again once a request that changed it inside a transaction has
+    finished, and the change has been committed.
+
+    :type sender: type
+    :type kwargs: {}
+    """
+    del sender, kwargs
+    from world.gazetteer import gazetteer
+    gazetteer.invalidate_pending()
+request_finished.connect(invalidate_gazetteer_after_request)
+
+
+def invalidate_gazetteer_after_commit(sender=None, **kwargs):
+    """
+    Invalidates the cached world again once a Celery task, or the process, such as a management
+    command, that changed it inside a transaction has finished, unless a transaction is still open.
+
+    :type sender: Task
+    :type kwargs: {}
+    """
+    del sender, kwargs
+    from world.gazetteer import gazetteer
+    gazetteer.invalidate_committed()
+task_postrun.connect(invalidate_gazetteer_after_commit)
+atexit.register(invalidate_gazetteer_after_commit)
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Allocates unique slugs for world models.
+
+A clashing slug gets the next free numbered suffix, e.g. the-tavern, the-tavern-2,
+the-tavern-3. The suffix is found with a single query for slugs starting with the base
+slug, which the index on the slug column can answer. Nothing is checked before saving:
+the unique constraint on the slug decides, and if another row takes the slug first the
+next free suffix is found and the save retried.
+"""
+from __future__ import unicode_literals
+import re
+from django.db import IntegrityError, transaction
+
+
+class SlugAllocator(object):
+    """
+    Finds free slugs for a model and saves instances with them.
+    """
+    max_attempts = 5
+    max_suffix_length = 6
+    suffix_pattern = re.compile(r'^(?P<base>.*?)(?:-(?P<number>\d+))?$')
+
+    def __init__(self, model, field_name='slug'):
+        """
+        :type model: type
+        :type field_name: unicode
+        """
+        super(SlugAllocator, self).__init__()
+        self.model = model
+        self.field_name = field_name
+        self.max_length = model._meta.get_field(field_name).max_length
+
+    def get_base(self, slug):
+        """
+        Returns the slug cut to fit the field, or the model name if it is empty.
+
+        :type slug: unicode
+        :rtype: unicode
+        """
+        return (slug or self.model._meta.model_name)[:self.max_length]
+
+    def next_free(self, slug):
+        """
+        Returns the slug if it is free, otherwise the slug with the next free numbered suffix.
+
+        :type slug: unicode
+        :rtype: unicode
+        """
+        base = self.get_base(slug)
+        # Suffixed slugs may have had the base cut short to fit, so look for the shortest base
+        # a suffix could leave.
+        stem = base[:self.max_length - self.max_suffix_length]
+        base_taken = False
+        numbers = [1]
+        for taken in self.model._default_manager.filter(
+            **{'{0}__startswith'.format(self.field_name): stem}
+        ).values_list(self.field_name, flat=True):
+            if taken == base:
+                base_taken = True
+                continue
+            match = self.suffix_pattern.match(taken)
+            if match.group('number') and len(match.group('base')) >= len(stem) and \
+                    base.startswith(match.group('base')):
+                numbers.append(int(match.group('number')))
+        if not base_taken:
+            return base
+        suffix = '-{0}'.format(max(numbers) + 1)
+        return base[:self.max_length - len(suffix)] + suffix
+
+    def is_taken(self, slug):
+        """
+        :type slug: unicode
+        :rtype: bool
+        """
+        return self.model._default_manager.filter(**{self.field_name: slug}).exists()
+
+    def save_with_slug(self, instance, slug, save, using=None):
+        """
+        Sets a free slug on the instance and saves it. If the slug is taken by the time the
+        row is written, the next free slug is tried.
+
+        :type instance: Model
+        :type slug: unicode
+        :param save: Callable that saves the instance
+        :type using: unicode
+        """
+        for attempt in range(self.max_attempts):
+            setattr(instance, self.field_name, self.next_free(slug))
+            try:
+                with transaction.atomic(using=using):
+                    return save()
+            except IntegrityError:
+                if not self.is_taken(getattr(instance, self.field_name)):
+                    setattr(instance, self.field_name, '')
+                    raise
+        setattr(instance, self.field_name, '')
+        raise IntegrityError('Could not allocate a slug for {0}'.format(slug))
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the world is read from the gazetteer cache.
+"""
+from celery.signals import task_postrun
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.http import Http404
+from django.test import TransactionTestCase
+from characters.forms import CharacterCreateForm
+from rpg_auth.tests.utils import CreateUserMixin
+from soj.tests.utils import MockRequest
+from world.gazetteer import Gazetteer, WorldTree, gazetteer
+from world.mixins import LocationFromRequestMixin
+from world.models import Continent, Location, Race
+
+
+class GazetteerTestCase(CreateUserMixin):
+    """
+    Tests the gazetteer.
+    """
+    fixtures = ['world-test-data.json']
+
+    def test_world_is_loaded_once(self):
+        """
+        Once loaded the world is read without querying the database.
+        """
+        continents = list(Continent.objects.order_by('pk'))
+        locations = list(Location.objects.order_by('pk'))
+        races = list(Race.objects.order_by('pk'))
+        continent_locations = list(Location.objects.filter(continent=continents[0]))
+        self.assertEquals(gazetteer.continents, continents)
+        with self.assertNumQueries(0):
+            self.assertEquals(gazetteer.locations, locations)
+            self.assertEquals(gazetteer.races, races)
+            self.assertEquals(list(gazetteer.continents[0].location_set.all()), continent_locations)
+
+    def test_saving_invalidates(self):
+        """
+        Saving a location is seen the next time the world is read.
+        """
+        self.assertRaises(Location.DoesNotExist, gazetteer.get_location, 'new-location')
+        Location.objects.create(name=u'New Location', description=u'New', continent=Continent.objects.get(pk=1))
+        self.assertEquals(gazetteer.get_location('new-location').name, u'New Location')
+
+    def test_deleting_invalidates(self):
+        """
+        Deleting a race is seen the next time the world is read.
+        """
+        count = len(gazetteer.races)
+        Race.objects.create(name=u'Race', slug=u'race-to-delete', description=u'Race').delete()
+        self.assertEquals(len(gazetteer.races), count)
+
+    def test_world_loaded_before_commit_is_replaced(self):
+        """
+        A world another process loads from the committed rows while a change is still uncommitted, and caches
+        under the new version, is replaced once the request making the change finishes.
+        """
+        committed = WorldTree.load()
+        location = Location.objects.get(pk=1)
+        location.name = u'Renamed'
+        location.save()
+        gazetteer.cache.set(gazetteer.tree_key_template.format(gazetteer.get_version()), committed)
+        self.assertNotEquals(gazetteer.get_location(location.slug).name, u'Renamed')
+        request_finished.send(sender=self.__class__)
+        self.assertEquals(gazetteer.get_location(location.slug).name, u'Renamed')
+
+    def test_invalidation_is_shared_between_processes(self):
+        """
+        Another process's copy of the world is reloaded when this one invalidates it, and
+        the reloaded world comes from the shared cache.
+        """
+        other = Gazetteer()
+        other.get_tree()
+        slug = Location.objects.get(pk=1).slug
+        Location.objects.filter(pk=1).update(name=u'Renamed')
+        gazetteer.invalidate()
+        gazetteer.get_tree()
+        with self.assertNumQueries(0):
+            self.assertEquals(other.get_location(slug).name, u'Renamed')
+
+    def test_unknown_location_is_not_found(self):
+        """
+        Views reading locations from the gazetteer 404 for unknown slugs.
+        """
+        response = self.client.get(reverse('quests:select_character', kwargs={'location_slug': 'fake-slug'}))
+        self.assertEquals(response.status_code, 404)
+
+    def test_location_queryset_is_used(self):
+        """
+        A view with a location_queryset loads its location from it, once per request, rather than the gazetteer.
+        """
+        view = LocationFromRequestMixin()
+        view.request = MockRequest()
+        view.location_queryset = Location.objects.select_related('continent')
+        expected = Location.objects.get(pk=1)
+        view.location_slug = expected.slug
+        with self.assertNumQueries(1):
+            location = view.get_location()
+            self.assertIs(view.get_location(), location)
+            self.assertEquals(location.continent.pk, expected.continent_id)
+        view.location_slug = 'fake-slug'
+        self.assertRaises(Http404, view.get_location)
+
+    def test_character_form_choices(self):
+        """
+        The character form lists and validates home towns and races from the gazetteer.
+        """
+        form = CharacterCreateForm()
+        gazetteer.get_tree()
+        with self.assertNumQueries(0):
+            choices = list(form.fields['home_town'].choices)
+        self.assertEquals([pk for pk, label in choices[1:]], [location.pk for location in gazetteer.locations])
+        form = CharacterCreateForm(data={'name': u'Name', 'home_town': 999, 'race': 1})
+        self.assertFalse(form.is_valid())
+        self.assertIn('home_town', form.errors)
+        self.assertNotIn('race', form.errors)
+
+
+class GazetteerCommitTestCase(TransactionTestCase):
+    """
+    Tests a world changed inside a transaction outside a request is invalidated once it commits.
+    """
+    fixtures = ['world-test-data.json']
+
+    def setUp(self):
+        super(GazetteerCommitTestCase, self).setUp()
+        cache.clear()
+
+    def rename_with_stale_world_cached(self):
+        """
+        Renames a location inside a transaction while another process caches the world from before it.
+        """
+        committed = WorldTree.load()
+        location = Location.objects.get(pk=1)
+        with transaction.atomic():
+            location.name = u'Renamed'
+            location.save()
+            gazetteer.cache.set(gazetteer.tree_key_template.format(gazetteer.get_version()), committed)
+        return location.slug
+
+    def test_world_is_replaced_after_task(self):
+        """
+        A change made by a task is seen once the task finishes.
+        """
+        slug = self.rename_with_stale_world_cached()
+        version = gazetteer.get_version()
+        task_postrun.send(sender=None)
+        self.assertNotEquals(gazetteer.get_version(), version)
+        self.assertEquals(gazetteer.get_location(slug).name, u'Renamed')
+
+    def test_world_is_replaced_when_next_read(self):
+        """
+        A change made outside a request or task is seen the next time the world is read outside a transaction.
+        """
+        slug = self.rename_with_stale_world_cached()
+        self.assertEquals(gazetteer.get_location(slug).name, u'Renamed')
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Tests the activity counts of locations are kept up to date.
+"""
+from StringIO import StringIO
+from django.core.management import call_command, CommandError
+from django.core.urlresolvers import reverse
+from characters.tests.utils import CharacterUtils
+from quests.models import Post, Quest
+from rpg_auth.tests.utils import CreateUserMixin
+from world.activity import ActivityBoard
+from world.gazetteer import gazetteer
+from world.models import Location, LocationActivity
+
+
+class LocationActivityTestCase(CreateUserMixin):
+    """
+    Tests the location activity counters.
+    """
+    fixtures = ['world-test-data.json']
+
+    def setUp(self):
+        super(LocationActivityTestCase, self).setUp()
+        self.location1 = Location.objects.get(pk=1)
+        self.location2 = Location.objects.get(pk=2)
+        self.quest = Quest.objects.create(title=u'Quest', gm=self.user.quest_profile)
+        self.characters = [CharacterUtils.create_character(self.user) for i in range(2)]
+
+    def get_activity(self, location):
+        """
+        Returns the stored activity as a tuple.
+        """
+        activity = ActivityBoard.load().get_activity(location)
+        return activity.active_quest_count, activity.active_character_count
+
+    def test_moving_quests_moves_counts(self):
+        """
+        Moving a quest moves it and its characters between locations.
+        """
+        self.quest.move_to_location(self.location1)
+        for character in self.characters:
+            self.quest.add_character(character)
+        self.assertEquals(self.get_activity(self.location1), (1, 2))
+        self.quest.move_to_location(self.location2)
+        self.assertEquals(self.get_activity(self.location1), (0, 0))
+        self.assertEquals(self.get_activity(self.location2), (1, 2))
+        self.quest.remove_character(self.characters[0])
+        self.assertEquals(self.get_activity(self.location2), (1, 1))
+
+    def test_posts_update_last_post_time(self):
+        """
+        The time of the latest post at a location is stored.
+        """
+        self.quest.move_to_location(self.location1)
+        post = Post.objects.create(
+            quest=self.quest, character=self.characters[0], location=self.location1, content=u'Post'
+        )
+        self.assertEquals(LocationActivity.objects.get(location=self.location1).last_post_at, post.date_created)
+        LocationActivity.objects.record_post(self.location1.pk, post.date_created.replace(year=2000))
+        self.assertEquals(LocationActivity.objects.get(location=self.location1).last_post_at, post.date_created)
+
+    def test_board_is_one_query(self):
+        """
+        Once the gazetteer is loaded the board for the whole world is a single query.
+        """
+        self.quest.move_to_location(self.location1)
+        gazetteer.get_tree()
+        with self.assertNumQueries(1):
+            rows = [
+                (location.pk, activity.active_quest_count)
+                for continent, locations in ActivityBoard.load() for location, activity in locations
+            ]
+        self.assertIn((self.location1.pk, 1), rows)
+        self.assertIn((self.location2.pk, 0), rows)
+
+    def test_location_picker_has_board(self):
+        """
+        The location picker has the activity board in its context.
+        """
+        CharacterUtils.create_character(self.user)
+        response = self.client.get(reverse('quests:select_location'))
+        self.assertIsInstance(response.context['activity_board'], ActivityBoard)
+
+    def test_rebuild_corrects_stale_counts(self):
+        """
+        Stale counts are reported by verify and corrected by rebuilding.
+        """
+        self.quest.move_to_location(self.location1)
+        self.quest.add_character(self.characters[0])
+        call_command('rebuild_location_activity', verify=True, stdout=StringIO())
+        LocationActivity.objects.update(active_quest_count=5)
+        self.assertRaises(CommandError, call_command, 'rebuild_location_activity', verify=True, stdout=StringIO())
+        call_command('rebuild_location_activity', stdout=StringIO())
+        self.assertEquals(self.get_activity(self.location1), (1, 1))
+        self.assertEquals(LocationActivity.objects.find_stale(), {})
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Tests slugs are allocated for world models.
+"""
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.test import TestCase
+from quests.models import Quest
+from world.models import Continent, Location
+from world.slugs import SlugAllocator
+
+
+class SlugAllocationTestCase(TestCase):
+    """
+    Tests the slug allocator.
+    """
+    def setUp(self):
+        super(SlugAllocationTestCase, self).setUp()
+        self.continent = Continent.objects.create(name=u'Continent', description=u'Continent')
+
+    def create_location(self, name=u'The Tavern', **kwargs):
+        """
+        Creates a location on the continent.
+        """
+        return Location.objects.create(name=name, description=u'Location', continent=self.continent, **kwargs)
+
+    def test_slug_is_made_from_name(self):
+        """
+        The slug is made from the name when none is given.
+        """
+        self.assertEquals(self.continent.slug, 'continent')
+        self.assertEquals(self.create_location(slug=u'given').slug, 'given')
+
+    def test_clashes_get_numbered_suffixes(self):
+        """
+        Each clash gets the next number.
+        """
+        slugs = [self.create_location().slug for i in range(12)]
+        self.assertEquals(slugs[:3], ['the-tavern', 'the-tavern-2', 'the-tavern-3'])
+        self.assertEquals(slugs[-1], 'the-tavern-12')
+
+    def test_similar_slugs_are_not_counted(self):
+        """
+        Slugs that only share a prefix do not affect the suffix, and the base slug is used while free.
+        """
+        self.create_location(u'The Taverns')
+        self.create_location(u'The Tavern Cellar')
+        self.assertEquals(self.create_location().slug, 'the-tavern')
+        self.assertEquals(self.create_location().slug, 'the-tavern-2')
+
+    def test_numbered_names_are_skipped(self):
+        """
+        A name that already ends in a number is skipped over rather than clashed with.
+        """
+        self.create_location(u'The Tavern 7')
+        self.assertEquals(self.create_location().slug, 'the-tavern')
+        self.assertEquals(self.create_location().slug, 'the-tavern-8')
+
+    def test_next_free_is_one_query(self):
+        """
+        Finding a free slug is a single query however many clashes there are.
+        """
+        for i in range(5):
+            self.create_location()
+        with self.assertNumQueries(1):
+            self.assertEquals(SlugAllocator(Location).next_free('the-tavern'), 'the-tavern-6')
+
+    def test_long_slugs_fit_the_field(self):
+        """
+        The base slug is cut short to make room for the suffix.
+        """
+        name = u'a' * 60
+        self.create_location(name)
+        slug = self.create_location(name).slug
+        self.assertEquals(len(slug), 50)
+        self.assertEquals(slug, u'a' * 48 + '-2')
+        self.assertEquals(self.create_location(name).slug, u'a' * 48 + '-3')
+
+    def test_save_retries_when_slug_is_taken(self):
+        """
+        If the slug is taken between finding it and saving, the next free slug is used.
+        """
+        self.create_location()
+        allocator = SlugAllocator(Location)
+        next_free = allocator.next_free
+        stale = iter(['the-tavern'])
+        allocator.next_free = lambda slug: next(stale, None) or next_free(slug)
+        location = Location(name=u'The Tavern', description=u'Location', continent=self.continent)
+        allocator.save_with_slug(location, 'the-tavern', location.save)
+        self.assertEquals(Location.objects.get(pk=location.pk).slug, 'the-tavern-2')
+
+    def test_other_integrity_errors_are_raised(self):
+        """
+        Errors not caused by the slug are not retried.
+        """
+        user = get_user_model().objects.create(pen_name='test', email='test@example.com')
+        Quest.objects.create(title=u'Quest', gm=user.quest_profile)
+        quest = Quest(title=u'Quest', gm=user.quest_profile)
+        self.assertRaises(IntegrityError, quest.save)
+        self.assertEquals(quest.slug, '')
@@ -3,25 +3,72 @@
 Views for the world.
 """
 from django.views.generic import DetailView, ListView
+from soj.conditional import ConditionalGetMixin
+from soj.replicas import ReplicaReadsMixin
+from world.activity import ActivityBoard
+from world.gazetteer import gazetteer
 from world.models import Continent, Location
 
 
-class ContinentListView(ListView):
+class ContinentListView(ReplicaReadsMixin, ListView):
     """
-    Lists the continents.
+    Lists the continents, with their locations and activity, from the gazetteer.
     """
     model = Continent
+    template_name = 'world/continent_list.html'
 
+    def get_queryset(self):
+        """
+        Returns the cached continents.
 
-class ContinentDetailView(DetailView):
+        :rtype: list[Continent]
+        """
+        return gazetteer.continents
+
+    def get_context_data(self, **kwargs):
+        """
+        Adds the activity board to the context.
+        :type kwargs: {}
+        :return: {}
+        """
+        context_data = super(ContinentListView, self).get_context_data(**kwargs)
+        context_data['activity_board'] = ActivityBoard.load()
+        return context_data
+
+
+class ContinentDetailView(ReplicaReadsMixin, ConditionalGetMixin, DetailView):
     """
     Details a continent.
     """
     model = Continent
 
+    def get_last_modified(self):
+        """
+        The last time the continent or one of its locations changed, from the gazetteer.
+
+        :rtype: datetime | None
+        """
+        try:
+            continent = gazetteer.get_continent(self.kwargs['slug'])
+        except Continent.DoesNotExist:
+            return None
+        return max([continent.date_modified] + [location.date_modified for location in continent.location_set.all()])
 
-class LocationDetailView(DetailView):
+
+class LocationDetailView(ReplicaReadsMixin, ConditionalGetMixin, DetailView):
     """
     Details a location.
     """
     model = Location
+
+    def get_last_modified(self):
+        """
+        The last time the location or its continent changed, from the gazetteer.
+
+        :rtype: datetime | None
+        """
+        try:
+            location = gazetteer.get_location(self.kwargs['slug'])
+        except Location.DoesNotExist:
+            return None
+        return max(location.date_modified, location.continent.date_modified)